@@ -20,6 +20,7 @@
 
 import copy
 import glob
+import hashlib
 import os
 import re
 import shutil
@@ -36,6 +37,7 @@ from moulinette.utils.filesystem import (
     chmod,
     chown,
     cp,
+    mkdir,
     read_file,
     read_json,
     read_toml,
@@ -49,6 +51,7 @@ from packaging import version
 from yunohost.app_catalog import (  # noqa
     APPS_CATALOG_LOGOS,
     _load_apps_catalog,
+    _load_apps_catalog_apps,
     app_catalog,
     app_search,
 )
@@ -77,6 +80,15 @@ logger = getLogger("yunohost.app")
 APPS_SETTING_PATH = "/etc/yunohost/apps/"
 APP_TMP_WORKDIRS = "/var/cache/yunohost/app_tmp_work_dirs"
 
+# Manifests of the catalog apps, keyed by git url + revision, c.f. _cache_manifest_of_revision
+APP_MANIFESTS_CACHE = "/var/cache/yunohost/app_manifests"
+APP_MANIFESTS_CACHE_MAX_AGE = 30 * 24 * 3600
+# Sources of the catalog apps, keyed by git url + revision, c.f. _add_app_sources_to_cache
+APP_SOURCES_CACHE = "/var/cache/yunohost/app_sources"
+APP_SOURCES_CACHE_MAX_SIZE = 500 * 1024 * 1024
+# Max number of app sources fetched at the same time to get their next manifest
+UPGRADABLE_APPS_FETCH_CONCURRENCY = 4
+
 re_app_instance_name = re.compile(
     r"^(?P<appid>[\w-]+?)(__(?P<appinstancenb>[1-9][0-9]*))?$"
 )
@@ -98,17 +110,37 @@ APP_FILES_TO_COPY = [
 ]
 
 PORTAL_SETTINGS_DIR = "/etc/yunohost/portal"
+# N.B. : not a .json, otherwise it would be considered as a domain's portal file
+PORTAL_ACL_INDEX = "/etc/yunohost/portal/.acl_index"
 
 
 def app_list(full=False, upgradable=False):
     """
     List installed apps
     """
+    from yunohost.permission import user_permission_list
+
+    apps = sorted(_installed_apps())
+
+    # Fetch the permissions and the catalog once for all apps, instead of
+    # once per app in app_info
+    permissions = (
+        user_permission_list(full=True, absolute_urls=True, apps=apps)["permissions"]
+        if apps
+        else {}
+    )
+    catalog = _load_apps_catalog()["apps"] if full or upgradable else {}
 
     out = []
-    for app_id in sorted(_installed_apps()):
+    for app_id in apps:
         try:
-            app_info_dict = app_info(app_id, full=full, upgradable=upgradable)
+            app_info_dict = _app_info(
+                app_id,
+                full=full,
+                upgradable=upgradable,
+                permissions=permissions,
+                catalog=catalog,
+            )
         except Exception as e:
             logger.error(f"Failed to read info for {app_id} : {e}")
             continue
@@ -124,16 +156,32 @@ def app_info(app, full=False, upgradable=False):
     """
     Get info for a specific app
     """
-    from yunohost.domain import _get_raw_domain_settings
-    from yunohost.permission import user_permission_list
 
     _assert_is_installed(app)
 
+    return _app_info(app, full=full, upgradable=upgradable)
+
+
+def _app_info(app, full=False, upgradable=False, permissions=None, catalog=None):
+    """
+    Implementation of app_info, where the permissions and the catalog's apps
+    may be provided by the caller when listing several apps
+    """
+    from yunohost.domain import _get_raw_domain_settings
+    from yunohost.permission import user_permission_list
+
     setting_path = os.path.join(APPS_SETTING_PATH, app)
     local_manifest = _get_manifest_of_app(setting_path)
-    permissions = user_permission_list(full=True, absolute_urls=True, apps=[app])[
-        "permissions"
-    ]
+    if permissions is None:
+        permissions = user_permission_list(full=True, absolute_urls=True, apps=[app])[
+            "permissions"
+        ]
+    else:
+        permissions = {
+            name: infos
+            for name, infos in permissions.items()
+            if name.split(".")[0] == app
+        }
 
     settings = _get_app_settings(app)
 
@@ -150,7 +198,9 @@ def app_info(app, full=False, upgradable=False):
         return ret
 
     absolute_app_name, _ = _parse_app_instance_name(app)
-    from_catalog = _load_apps_catalog()["apps"].get(absolute_app_name, {})
+    if catalog is None:
+        catalog = _load_apps_catalog()["apps"]
+    from_catalog = catalog.get(absolute_app_name, {})
 
     # Check if $app.png exists in the app logo folder, this is a trick to be able to easily customize the logo
     # of an app just by creating $app.png (instead of the hash.png) in the corresponding folder
@@ -1636,6 +1686,17 @@ def app_ssowatconf():
         domain_list,
     )
     from yunohost.permission import user_permission_list
+    from yunohost.utils.ldap import _get_ldap_interface
+    from yunohost.utils.system import write_to_json_if_changed
+
+    timings = {}
+    phase_start = time.time()
+
+    def end_phase(name):
+        nonlocal phase_start
+        now = time.time()
+        timings[name] = round(now - phase_start, 3)
+        phase_start = now
 
     domain_portal_dict = _get_domain_portal_dict()
 
@@ -1644,6 +1705,7 @@ def app_ssowatconf():
     all_permissions = user_permission_list(
         full=True, ignore_system_perms=True, absolute_urls=True
     )["permissions"]
+    end_phase("ldap")
 
     permissions = {
         "core_skipped": {
@@ -1665,7 +1727,8 @@ def app_ssowatconf():
     # FIXME : this could be handled by nginx's regen conf to further simplify ssowat's code ...
     redirected_urls = {}
     for domain in domains:
-        default_app = _get_raw_domain_settings(domain).get("default_app")
+        domain_settings = _get_raw_domain_settings(domain)
+        default_app = domain_settings.get("default_app")
 
         if default_app not in ["_none", None] and _is_installed(default_app):
             app_settings = _get_app_settings(default_app)
@@ -1675,22 +1738,19 @@ def app_ssowatconf():
             # Prevent infinite redirect loop...
             if domain + "/" != app_domain + app_path:
                 redirected_urls[domain + "/"] = app_domain + app_path
-        elif bool(
-            _get_raw_domain_settings(domain).get("enable_public_apps_page", False)
-        ):
+        elif bool(domain_settings.get("enable_public_apps_page", False)):
             redirected_urls[domain + "/"] = domain_portal_dict[domain]
+    end_phase("domains")
 
     # Will organize apps by portal domain
     portal_domains_apps = {domain: {} for domain in portal_domains}
 
-    # This check is to prevent an issue during postinstall if the catalog cant
-    # be initialized (because of offline postinstall) and it's not a big deal
-    # because there's no app yet (this is only used to get the default logo for
-    # the app
-    if os.path.exists("/etc/yunohost/installed"):
-        apps_catalog = _load_apps_catalog()["apps"]
-    else:
-        apps_catalog = {}
+    # The catalog is only used to get the default logo of apps displayed in
+    # the portal, so it's only loaded if there's at least one tile.
+    # The "installed" check is to prevent an issue during postinstall if the
+    # catalog cant be initialized (because of offline postinstall) and it's
+    # not a big deal because there's no app yet
+    apps_catalog = None
 
     # New permission system
     for perm_name, perm_info in all_permissions.items():
@@ -1776,6 +1836,13 @@ def app_ssowatconf():
         # FIXME : find a smarter way to get this info ? (in the settings maybe..)
         # Also ideally we should not rely on the webadmin route for this, maybe expose these through a different route in nginx idk
         # Also related to "people will want to customize those.."
+        if apps_catalog is None:
+            if os.path.exists("/etc/yunohost/installed"):
+                apps_catalog = _load_apps_catalog_apps(
+                    {name.split(".")[0].split("__")[0] for name in all_permissions}
+                )
+            else:
+                apps_catalog = {}
         app_catalog_info = apps_catalog.get(app_id.split("__")[0])
         if app_catalog_info and "logo_hash" in app_catalog_info:
             app_portal_info["logo"] = (
@@ -1783,6 +1850,7 @@ def app_ssowatconf():
             )
 
         portal_domains_apps[app_portal_domain][perm_name] = app_portal_info
+    end_phase("apps")
 
     conf_dict = {
         "cookie_secret_file": "/etc/yunohost/.ssowat_cookie_secret",
@@ -1793,7 +1861,11 @@ def app_ssowatconf():
         "permissions": permissions,
     }
 
-    write_to_json("/etc/ssowat/conf.json", conf_dict, sort_keys=True, indent=4)
+    # Files are only rewritten (atomically) when their content actually changes,
+    # such that SSOwat and the portal don't reload them for nothing
+    changed_files = []
+    if write_to_json_if_changed("/etc/ssowat/conf.json", conf_dict):
+        changed_files.append("/etc/ssowat/conf.json")
 
     # Generate a file per possible portal with available apps
     for domain, apps in portal_domains_apps.items():
@@ -1807,9 +1879,8 @@ def app_ssowatconf():
         # with domain's config panel "portal" options
         portal_settings["apps"] = apps
 
-        write_to_json(
-            str(portal_settings_path), portal_settings, sort_keys=True, indent=4
-        )
+        if write_to_json_if_changed(str(portal_settings_path), portal_settings):
+            changed_files.append(str(portal_settings_path))
 
     # Cleanup old files from possibly old domains
     for setting_file in Path(PORTAL_SETTINGS_DIR).iterdir():
@@ -1817,8 +1888,38 @@ def app_ssowatconf():
             domain = setting_file.name[: -len(".json")]
             if domain not in portal_domains_apps:
                 setting_file.unlink()
+                changed_files.append(str(setting_file))
+
+    # Precomputed ACL used by the portal API to check on every request if a
+    # user may access a domain (c.f. ldap_ynhuser.user_is_allowed_on_domain)
+    # such that it doesn't have to re-read the portal files nor query LDAP
+    snapshot = _get_ldap_interface().get_snapshot()
+    mail_domains: Dict[str, List[str]] = {}
+    for uid, user in snapshot.users.items():
+        mails = user.get("mail", [])
+        # Only users with a single address are considered, like it's always been
+        if len(mails) == 1 and "@" in mails[0]:
+            mail_domains.setdefault(mails[0].split("@")[1], []).append(uid)
+    portal_acl = {
+        "domains": {
+            domain: sorted({user for app in apps.values() for user in app["users"]})
+            for domain, apps in portal_domains_apps.items()
+        },
+        "admins": sorted(snapshot.group_members.get("admins", [])),
+        "mail_domains": {
+            domain: sorted(users) for domain, users in mail_domains.items()
+        },
+    }
+    if write_to_json_if_changed(PORTAL_ACL_INDEX, portal_acl):
+        changed_files.append(PORTAL_ACL_INDEX)
+    end_phase("write")
 
     logger.debug(m18n.n("ssowat_conf_generated"))
+    logger.debug(
+        "SSOwat conf generation timings: "
+        + ", ".join(f"{phase}={duration}s" for phase, duration in timings.items())
+        + f" (files updated: {', '.join(changed_files) or 'none'})"
+    )
 
 
 @is_unit_operation(flash=True)
@@ -2152,9 +2253,32 @@ def _parse_app_version(v):
         raise YunohostError(f"Failed to parse app version '{v}' : {e}", raw_msg=True)
 
 
+app_manifest_cache: Dict[str, Dict[str, Any]] = {}
+app_manifest_cache_timestamp: Dict[str, Tuple] = {}
+
+
 def _get_manifest_of_app(path):
     "Get app manifest stored in json or in toml"
 
+    # perf: manifests of installed apps are cached using the modification date
+    # of the manifest and doc/ folder (same idea as for app settings), because
+    # parsing the toml and globbing the doc is not free and this gets called
+    # for every tile each time the SSOwat conf is regenerated.
+    # (ctime is included because cp() may preserve the mtime during upgrades)
+    path = os.path.normpath(path)
+    cacheable = path.startswith(os.path.normpath(APPS_SETTING_PATH) + "/")
+    if cacheable:
+        manifest_timestamp = tuple(
+            (os.stat(p).st_mtime, os.stat(p).st_ctime) if os.path.exists(p) else None
+            for p in [
+                os.path.join(path, "manifest.toml"),
+                os.path.join(path, "manifest.json"),
+                os.path.join(path, "doc"),
+            ]
+        )
+        if app_manifest_cache_timestamp.get(path) == manifest_timestamp:
+            return copy.deepcopy(app_manifest_cache[path])
+
     # sample data to get an idea of what is going on
     # this toml extract:
     #
@@ -2278,6 +2402,10 @@ def _get_manifest_of_app(path):
     manifest["install"] = _set_default_ask_questions(manifest.get("install", {}))
     manifest["doc"], manifest["notifications"] = _parse_app_doc_and_notifications(path)
 
+    if cacheable:
+        app_manifest_cache[path] = copy.deepcopy(manifest)
+        app_manifest_cache_timestamp[path] = manifest_timestamp
+
     return manifest
 
 
@@ -2517,22 +2645,24 @@ def _app_quality(src: str) -> str:
     app may in fact be an app name, an url, or a path
     """
 
-    raw_app_catalog = _load_apps_catalog()["apps"]
-    if src in raw_app_catalog or _is_app_repo_url(src):
-        # If we got an app name directly (e.g. just "wordpress"), we gonna test this name
-        if src in raw_app_catalog:
-            app_name_to_test = src
+    # If we got an app name directly (e.g. just "wordpress"), we gonna test this name
+    app_from_catalog = _load_apps_catalog_apps([src]).get(src)
+    if app_from_catalog is not None or _is_app_repo_url(src):
         # If we got an url like "https://github.com/foo/bar_ynh, we want to
         # extract "bar" and test if we know this app
-        elif ("http://" in src) or ("https://" in src):
-            app_name_to_test = src.strip("/").split("/")[-1].replace("_ynh", "")
-        else:
-            # FIXME : watdo if '@' in app ?
-            return "thirdparty"
+        if app_from_catalog is None:
+            if ("http://" in src) or ("https://" in src):
+                app_name_to_test = src.strip("/").split("/")[-1].replace("_ynh", "")
+                app_from_catalog = _load_apps_catalog_apps([app_name_to_test]).get(
+                    app_name_to_test
+                )
+            else:
+                # FIXME : watdo if '@' in app ?
+                return "thirdparty"
 
-        if app_name_to_test in raw_app_catalog:
-            state = raw_app_catalog[app_name_to_test].get("state", "notworking")
-            level = raw_app_catalog[app_name_to_test].get("level", None)
+        if app_from_catalog is not None:
+            state = app_from_catalog.get("state", "notworking")
+            level = app_from_catalog.get("level", None)
             if state in ["working", "validated"]:
                 if isinstance(level, int) and level >= 5:
                     return "success"
@@ -2557,14 +2687,14 @@ def _extract_app(src: str) -> Tuple[Dict, str]:
     src may be an app name, an url, or a path
     """
 
-    raw_app_catalog = _load_apps_catalog()["apps"]
+    app_from_catalog = _load_apps_catalog_apps([src]).get(src)
 
     # App is an appname in the catalog
-    if src in raw_app_catalog:
-        if "git" not in raw_app_catalog[src]:
+    if app_from_catalog is not None:
+        if "git" not in app_from_catalog:
             raise YunohostValidationError("app_unsupported_remote_type")
 
-        app_info = raw_app_catalog[src]
+        app_info = app_from_catalog
         url = app_info["git"]["url"]
         branch = app_info["git"]["branch"]
         revision = str(app_info["git"]["revision"])
@@ -2645,19 +2775,19 @@ def _extract_app_from_folder(path: str) -> Tuple[Dict, str]:
 def _extract_app_from_gitrepo(
     url: str, branch: Optional[str] = None, revision: str = "HEAD", app_info: Dict = {}
 ) -> Tuple[Dict, str]:
-    logger.debug("Checking default branch")
+    if not branch:
+        logger.debug("Checking default branch")
 
-    try:
-        git_ls_remote = check_output(
-            ["git", "ls-remote", "--symref", url, "HEAD"],
-            env={"GIT_TERMINAL_PROMPT": "0", "LC_ALL": "C"},
-            shell=False,
-        )
-    except Exception as e:
-        logger.error(str(e))
-        raise YunohostError("app_sources_fetch_failed")
+        try:
+            git_ls_remote = check_output(
+                ["git", "ls-remote", "--symref", url, "HEAD"],
+                env={"GIT_TERMINAL_PROMPT": "0", "LC_ALL": "C"},
+                shell=False,
+            )
+        except Exception as e:
+            logger.error(str(e))
+            raise YunohostError("app_sources_fetch_failed")
 
-    if not branch:
         default_branch = None
         try:
             for line in git_ls_remote.split("\n"):
@@ -2681,32 +2811,47 @@ def _extract_app_from_gitrepo(
             else:
                 branch = default_branch
 
-    logger.debug(m18n.n("downloading"))
-
     extracted_app_folder = _make_tmp_workdir_for_app()
 
-    # Download only this commit
-    try:
-        # We don't use git clone because, git clone can't download
-        # a specific revision only
-        ref = branch if revision == "HEAD" else revision
-        run_commands([["git", "init", extracted_app_folder]], shell=False)
-        run_commands(
-            [
-                ["git", "remote", "add", "origin", url],
-                ["git", "fetch", "--depth=1", "origin", ref],
-                ["git", "reset", "--hard", "FETCH_HEAD"],
-            ],
-            cwd=extracted_app_folder,
-            shell=False,
-        )
-    except subprocess.CalledProcessError:
-        raise YunohostError("app_sources_fetch_failed")
+    # A specific revision (i.e. coming from the catalog) may already have been
+    # fetched recently, e.g. for an app_manifest preceding the install
+    if revision != "HEAD" and _copy_app_sources_from_cache(
+        url, revision, extracted_app_folder
+    ):
+        logger.debug(f"Using the cached sources of {url} at revision {revision}")
     else:
-        logger.debug(m18n.n("done"))
+        logger.debug(m18n.n("downloading"))
+
+        # Download only this commit
+        try:
+            # We don't use git clone because, git clone can't download
+            # a specific revision only
+            ref = branch if revision == "HEAD" else revision
+            run_commands([["git", "init", extracted_app_folder]], shell=False)
+            run_commands(
+                [
+                    ["git", "remote", "add", "origin", url],
+                    ["git", "fetch", "--depth=1", "origin", ref],
+                    ["git", "reset", "--hard", "FETCH_HEAD"],
+                ],
+                cwd=extracted_app_folder,
+                shell=False,
+            )
+        except subprocess.CalledProcessError:
+            raise YunohostError("app_sources_fetch_failed")
+        else:
+            logger.debug(m18n.n("done"))
+
+        if revision != "HEAD":
+            _add_app_sources_to_cache(url, revision, extracted_app_folder)
 
     manifest = _get_manifest_of_app(extracted_app_folder)
 
+    # A given revision of an app won't change, so keep its manifest around
+    # (e.g. for the pre-upgrade notifications of _list_upgradable_apps)
+    if revision != "HEAD":
+        _cache_manifest_of_revision(url, revision, manifest)
+
     # Store remote repository info into the returned manifest
     manifest["remote"] = {"type": "git", "url": url, "branch": branch}
     if revision == "HEAD":
@@ -2730,13 +2875,163 @@ def _extract_app_from_gitrepo(
     return manifest, extracted_app_folder
 
 
+def _app_sources_cache_path(url: str, revision: str) -> str:
+    key = hashlib.sha256(f"{url}#{revision}".encode()).hexdigest()
+    return f"{APP_SOURCES_CACHE}/{key}"
+
+
+def _copy_app_sources_from_cache(url: str, revision: str, dest: str) -> bool:
+    """
+    Copy the cached sources of an app revision (if any) into dest.
+
+    N.B. : reflinks are used when the filesystem supports it, but not
+    hardlinks, because the app scripts may modify files of their workdir
+    in place.
+    """
+
+    cached_sources = _app_sources_cache_path(url, revision)
+    if not os.path.isdir(cached_sources):
+        return False
+
+    try:
+        # Used recently, evict it last
+        os.utime(cached_sources)
+        run_commands(
+            [["cp", "-a", "--reflink=auto", f"{cached_sources}/.", dest]],
+            shell=False,
+        )
+    except (OSError, subprocess.CalledProcessError) as e:
+        logger.debug(f"Failed to use the cached sources of {url} at {revision} : {e}")
+        # Don't leave a partial copy behind
+        for entry in os.listdir(dest):
+            rm(os.path.join(dest, entry), recursive=True, force=True)
+        return False
+
+    return True
+
+
+def _add_app_sources_to_cache(url: str, revision: str, sources: str) -> None:
+    cached_sources = _app_sources_cache_path(url, revision)
+    if os.path.exists(cached_sources):
+        return
+
+    tmp_dir = None
+    try:
+        if not os.path.exists(APP_SOURCES_CACHE):
+            mkdir(APP_SOURCES_CACHE, mode=0o700, parents=True, uid="root")
+
+        # Copy then rename, such that the cache never contains partial sources
+        tmp_dir = tempfile.mkdtemp(prefix=".tmp_", dir=APP_SOURCES_CACHE)
+        run_commands(
+            [["cp", "-a", "--reflink=auto", f"{sources}/.", tmp_dir]], shell=False
+        )
+        os.rename(tmp_dir, cached_sources)
+    except Exception as e:
+        logger.debug(f"Failed to cache the sources of {url} at {revision} : {e}")
+        if tmp_dir:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+        return
+
+    _prune_app_sources_cache()
+
+
+def _prune_app_sources_cache() -> None:
+    """
+    Remove the least recently used sources until the cache fits in
+    APP_SOURCES_CACHE_MAX_SIZE
+    """
+
+    def size_of(path):
+        size = 0
+        for root, dirs, files in os.walk(path):
+            for name in files + dirs:
+                try:
+                    size += os.lstat(os.path.join(root, name)).st_size
+                except FileNotFoundError:
+                    pass
+        return size
+
+    now = time.time()
+    entries = []
+    for entry in os.scandir(APP_SOURCES_CACHE):
+        mtime = entry.stat(follow_symlinks=False).st_mtime
+        # Leftovers of interrupted copies
+        if entry.name.startswith("."):
+            if mtime < now - 3600:
+                shutil.rmtree(entry.path, ignore_errors=True)
+            continue
+        entries.append((mtime, size_of(entry.path), entry.path))
+
+    total_size = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total_size <= APP_SOURCES_CACHE_MAX_SIZE:
+            break
+        logger.debug(f"Removing {path} from the app sources cache")
+        shutil.rmtree(path, ignore_errors=True)
+        total_size -= size
+
+
+def _app_manifest_cache_path(url: str, revision: str) -> str:
+    key = hashlib.sha256(f"{url}#{revision}".encode()).hexdigest()
+    return f"{APP_MANIFESTS_CACHE}/{key}.json"
+
+
+def _get_cached_manifest_of_revision(url: str, revision: str) -> Optional[Dict]:
+    cache_file = _app_manifest_cache_path(url, revision)
+    try:
+        manifest = read_json(cache_file)
+        # Used recently, don't let it expire
+        os.utime(cache_file)
+    except Exception:
+        return None
+
+    return manifest
+
+
+def _cache_manifest_of_revision(url: str, revision: str, manifest: Dict) -> None:
+    try:
+        if not os.path.exists(APP_MANIFESTS_CACHE):
+            mkdir(APP_MANIFESTS_CACHE, mode=0o750, parents=True, uid="root")
+
+        # Cleanup manifests of revisions not used in a long time
+        now = time.time()
+        for entry in os.scandir(APP_MANIFESTS_CACHE):
+            if entry.stat().st_mtime < now - APP_MANIFESTS_CACHE_MAX_AGE:
+                os.remove(entry.path)
+
+        write_to_json(_app_manifest_cache_path(url, revision), manifest)
+    except Exception as e:
+        logger.debug(f"Failed to cache the manifest of {url} at {revision} : {e}")
+
+
 def _list_upgradable_apps():
+    from multiprocessing.pool import ThreadPool
+
     upgradable_apps = list(app_list(upgradable=True)["apps"])
+    catalog = _load_apps_catalog_apps(
+        {_parse_app_instance_name(app["id"])[0] for app in upgradable_apps}
+    )
 
-    # Retrieve next manifest pre_upgrade notifications
-    for app in upgradable_apps:
+    def get_next_manifest(app):
         absolute_app_name, _ = _parse_app_instance_name(app["id"])
+        git = catalog.get(absolute_app_name, {}).get("git")
+        if git:
+            manifest = _get_cached_manifest_of_revision(
+                git["url"], str(git["revision"])
+            )
+            if manifest is not None:
+                return manifest
+
         manifest, extracted_app_folder = _extract_app(absolute_app_name)
+        shutil.rmtree(extracted_app_folder)
+        return manifest
+
+    # Retrieve next manifest pre_upgrade notifications
+    # (the sources of the apps are only fetched if their manifest isn't cached)
+    with ThreadPool(UPGRADABLE_APPS_FETCH_CONCURRENCY) as pool:
+        next_manifests = pool.map(get_next_manifest, upgradable_apps)
+
+    for app, manifest in zip(upgradable_apps, next_manifests):
         app["notifications"] = {}
         if manifest["notifications"]["PRE_UPGRADE"]:
             app["notifications"]["PRE_UPGRADE"] = _filter_and_hydrate_notifications(
@@ -2745,7 +3040,6 @@ def _list_upgradable_apps():
                 app["settings"],
             )
         del app["settings"]
-        shutil.rmtree(extracted_app_folder)
 
     return upgradable_apps
 
@@ -3166,8 +3460,8 @@ def _next_instance_number_for_app(app):
 
 def _make_tmp_workdir_for_app(app=None):
     # Create parent dir if it doesn't exists yet
-    if not os.path.exists(APP_TMP_WORKDIRS):
-        os.makedirs(APP_TMP_WORKDIRS)
+    # (exist_ok, since apps may be backed up concurrently)
+    os.makedirs(APP_TMP_WORKDIRS, exist_ok=True)
 
     now = int(time.time())
 
@@ -3182,8 +3476,12 @@ def _make_tmp_workdir_for_app(app=None):
         # script itself is running in one of those dir...
         # It could be that there are other edge cases
         # such as app-install-during-app-install
-        if os.stat(path).st_mtime < now - 12 * 3600:
-            shutil.rmtree(path)
+        try:
+            if os.stat(path).st_mtime < now - 12 * 3600:
+                shutil.rmtree(path)
+        except FileNotFoundError:
+            # Already cleaned up by a concurrent call
+            pass
     tmpdir = tempfile.mkdtemp(prefix="app_", dir=APP_TMP_WORKDIRS)
 
     # Copy existing app scripts, conf, ... if an app arg was provided
@@ -19,13 +19,16 @@
 #
 
 import hashlib
+import json
 import os
 import re
+import sqlite3
+import tempfile
+import time
 from logging import getLogger
 
 from moulinette import m18n
 from moulinette.utils.filesystem import mkdir, read_json, read_yaml, write_to_json
-from moulinette.utils.network import download_json
 
 from yunohost.utils.error import YunohostError
 from yunohost.utils.i18n import _value_for_locale
@@ -33,6 +36,9 @@ from yunohost.utils.i18n import _value_for_locale
 logger = getLogger("yunohost.app_catalog")
 
 APPS_CATALOG_CACHE = "/var/cache/yunohost/repo"
+# N.B. : not in APPS_CATALOG_CACHE which is only meant to contain the catalogs json
+APPS_CATALOG_INDEX = "/var/cache/yunohost/apps_catalog_index.sqlite"
+APPS_CATALOG_VALIDATORS = "/var/cache/yunohost/apps_catalog_validators.json"
 APPS_CATALOG_LOGOS = "/usr/share/yunohost/applogos"
 APPS_CATALOG_CONF = "/etc/yunohost/apps_catalog.yml"
 APPS_CATALOG_API_VERSION = 3
@@ -47,23 +53,33 @@ def app_catalog(full=False, with_categories=False, with_antifeatures=False):
 
     from yunohost.app import _installed_apps
 
-    # Get app list from catalog cache
-    catalog = _load_apps_catalog()
-    installed_apps = set(_installed_apps())
-
-    # Trim info for apps if not using --full
-    for app, infos in catalog["apps"].items():
-        infos["installed"] = app in installed_apps
-
-        infos["manifest"]["description"] = _value_for_locale(
-            infos["manifest"]["description"]
-        )
-
-        if not full:
-            catalog["apps"][app] = {
-                "description": infos["manifest"]["description"],
-                "level": infos["level"],
+    # Get app list from the catalog index
+    index = _get_apps_catalog_index()
+    try:
+        catalog = {
+            "categories": json.loads(_index_meta(index, "categories")),
+            "antifeatures": json.loads(_index_meta(index, "antifeatures")),
+        }
+        if full:
+            installed_apps = set(_installed_apps())
+            catalog["apps"] = {}
+            for app, record in index.execute(
+                "SELECT id, record FROM apps ORDER BY position"
+            ):
+                infos = json.loads(record)
+                infos["installed"] = app in installed_apps
+                infos["manifest"]["description"] = _value_for_locale(
+                    infos["manifest"]["description"]
+                )
+                catalog["apps"][app] = infos
+        else:
+            # Trim info for apps if not using --full
+            catalog["apps"] = {
+                app: {"description": description, "level": level}
+                for app, level, description in _index_apps_descriptions(index)
             }
+    finally:
+        index.close()
 
     _catalog = {"apps": catalog["apps"]}
 
@@ -103,16 +119,31 @@ def app_search(string):
     Return a dict of apps whose description or name match the search string
     """
 
-    # Retrieve a simple dict listing all apps
-    catalog_of_apps = app_catalog()
+    # Fail early (and the same way as re.search) on invalid patterns
+    pattern = re.compile(string, flags=re.IGNORECASE)
 
     # Selecting apps according to a match in app name or description
-    matching_apps = {"apps": {}}
-    for app in catalog_of_apps["apps"].items():
-        if re.search(string, app[0], flags=re.IGNORECASE) or re.search(
-            string, app[1]["description"], flags=re.IGNORECASE
-        ):
-            matching_apps["apps"][app[0]] = app[1]
+    # (using the descriptions pre-localized in the catalog index)
+    index = _get_apps_catalog_index()
+    try:
+        # N.B. : 'X REGEXP Y' calls regexp(Y, X)
+        index.create_function(
+            "REGEXP",
+            2,
+            lambda _, value: value is not None and pattern.search(value) is not None,
+        )
+        matching_apps = {
+            "apps": {
+                app: {"description": description, "level": level}
+                for app, level, description in _index_apps_descriptions(
+                    index,
+                    where="id REGEXP ? OR description REGEXP ?",
+                    args=(string, string),
+                )
+            }
+        }
+    finally:
+        index.close()
 
     return matching_apps
 
@@ -157,8 +188,18 @@ def _update_apps_catalog():
 
     And store it in :
         /var/cache/yunohost/repo/default.json
+
+    The ETag / Last-Modified of each downloaded json are kept in
+    APPS_CATALOG_VALIDATORS, such that the next update only downloads and
+    rewrites a catalog if it changed on the server side.
+
+    Returns some stats about what was fetched.
     """
 
+    from multiprocessing.pool import ThreadPool
+
+    import requests
+
     apps_catalog_list = _read_apps_catalog_list()
 
     logger.info(m18n.n("apps_catalog_updating"))
@@ -171,16 +212,51 @@ def _update_apps_catalog():
     if not os.path.exists(APPS_CATALOG_LOGOS):
         mkdir(APPS_CATALOG_LOGOS, mode=0o755, parents=True, uid="root")
 
+    validators = _read_apps_catalog_validators()
+    stats = {"bytes": 0, "duration": 0, "skipped": [], "updated": [], "logos": 0}
+    start_time = time.time()
+
+    # A single session (i.e. kept-alive connections) for the catalogs and logos
+    session = requests.Session()
+    session.mount(
+        "https://", requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=8)
+    )
+
     for apps_catalog in apps_catalog_list:
         if apps_catalog["url"] is None:
             continue
 
         apps_catalog_id = apps_catalog["id"]
         actual_api_url = _actual_apps_catalog_api_url(apps_catalog["url"])
+        cache_file = f"{APPS_CATALOG_CACHE}/{apps_catalog_id}.json"
+
+        # Only ask for changes if we still have (a usable copy of) what we
+        # previously fetched, otherwise a broken cache would never be repaired
+        headers = {}
+        previous = validators.pop(apps_catalog_id, None)
+        if (
+            previous
+            and previous["url"] == actual_api_url
+            and _apps_catalog_cache_is_usable(cache_file)
+        ):
+            if previous.get("etag"):
+                headers["If-None-Match"] = previous["etag"]
+            if previous.get("last_modified"):
+                headers["If-Modified-Since"] = previous["last_modified"]
 
         # Fetch the json
         try:
-            apps_catalog_content = download_json(actual_api_url)
+            r = session.get(actual_api_url, headers=headers, timeout=30)
+            if r.status_code == 304 and headers:
+                logger.debug(f"Apps catalog {apps_catalog_id} didn't change")
+                stats["skipped"].append(apps_catalog_id)
+                validators[apps_catalog_id] = previous
+                continue
+            elif r.status_code != 200:
+                raise Exception(f"Got status code {r.status_code}, expected 200")
+
+            stats["bytes"] += len(r.content)
+            apps_catalog_content = r.json()
         except Exception as e:
             raise YunohostError(
                 "apps_catalog_failed_to_download",
@@ -192,7 +268,6 @@ def _update_apps_catalog():
         apps_catalog_content["from_api_version"] = APPS_CATALOG_API_VERSION
 
         # Save the apps_catalog data in the cache
-        cache_file = f"{APPS_CATALOG_CACHE}/{apps_catalog_id}.json"
         try:
             write_to_json(cache_file, apps_catalog_content)
         except Exception as e:
@@ -200,6 +275,7 @@ def _update_apps_catalog():
                 f"Unable to write cache data for {apps_catalog_id} apps_catalog : {e}",
                 raw_msg=True,
             )
+        stats["updated"].append(apps_catalog_id)
 
         # Download missing app logos
         logos_to_download = []
@@ -214,13 +290,9 @@ def _update_apps_catalog():
                 f"(Will fetch {len(logos_to_download)} logos, this may take a couple minutes)"
             )
 
-        from multiprocessing.pool import ThreadPool
-
-        import requests
-
         def fetch_logo(logo_hash):
             try:
-                r = requests.get(
+                r = session.get(
                     f"{apps_catalog['url']}/v{APPS_CATALOG_API_VERSION}/logos/{logo_hash}.png",
                     timeout=10,
                 )
@@ -232,18 +304,76 @@ def _update_apps_catalog():
                         f"Found inconsistent hash while downloading logo {logo_hash}"
                     )
                 open(f"{APPS_CATALOG_LOGOS}/{logo_hash}.png", "wb").write(r.content)
-                return True
+                return len(r.content)
             except Exception as e:
                 logger.debug(f"Failed to download logo {logo_hash} : {e}")
-                return False
+                return None
+
+        with ThreadPool(8) as pool:
+            results = list(pool.imap_unordered(fetch_logo, logos_to_download))
+
+        stats["logos"] += len([size for size in results if size is not None])
+        stats["bytes"] += sum(size for size in results if size is not None)
 
-        results = ThreadPool(8).imap_unordered(fetch_logo, logos_to_download)
-        for result in results:
-            # Is this even needed to iterate on the results ?
-            pass
+        # If some logos couldn't be fetched, don't keep the validators, such
+        # that they're tried again on the next update
+        if None not in results:
+            validators[apps_catalog_id] = {
+                "url": actual_api_url,
+                "etag": r.headers.get("ETag"),
+                "last_modified": r.headers.get("Last-Modified"),
+            }
+
+    session.close()
+    _write_apps_catalog_validators(validators)
+
+    stats["duration"] = round(time.time() - start_time, 3)
+    logger.debug(f"Apps catalog fetch stats : {stats}")
+
+    # Build the catalog index right away rather than on the next query
+    # (unless some catalog has no cache, which _load_apps_catalog would
+    # attempt to fetch again)
+    if all(
+        os.path.exists(f"{APPS_CATALOG_CACHE}/{apps_catalog['id']}.json")
+        for apps_catalog in apps_catalog_list
+    ):
+        try:
+            _get_apps_catalog_index().close()
+        except Exception as e:
+            logger.warning(f"Failed to build the apps catalog index : {e}")
 
     logger.success(m18n.n("apps_catalog_update_success"))
 
+    return stats
+
+
+def _read_apps_catalog_validators():
+    try:
+        return read_json(APPS_CATALOG_VALIDATORS) or {}
+    except Exception:
+        return {}
+
+
+def _apps_catalog_cache_is_usable(cache_file):
+    try:
+        content = read_json(cache_file) if os.path.exists(cache_file) else None
+    except Exception as e:
+        logger.debug(f"Unable to read cache {cache_file} : {e}")
+        return False
+
+    return (
+        isinstance(content, dict)
+        and "apps" in content
+        and content.get("from_api_version") == APPS_CATALOG_API_VERSION
+    )
+
+
+def _write_apps_catalog_validators(validators):
+    try:
+        write_to_json(APPS_CATALOG_VALIDATORS, validators)
+    except Exception as e:
+        logger.debug(f"Failed to save the apps catalog validators : {e}")
+
 
 def _load_apps_catalog():
     """
@@ -305,3 +435,175 @@ def _load_apps_catalog():
         merged_catalog["antifeatures"] += apps_catalog_content.get("antifeatures", [])
 
     return merged_catalog
+
+
+def _load_apps_catalog_apps(apps):
+    """
+    Return the catalog infos of the given apps only (as found in
+    _load_apps_catalog()["apps"]), apps not in the catalog being left out
+    """
+
+    apps = list(apps)
+    if not apps:
+        return {}
+
+    index = _get_apps_catalog_index()
+    try:
+        placeholders = ", ".join("?" * len(apps))
+        return {
+            app: json.loads(record)
+            for app, record in index.execute(
+                f"SELECT id, record FROM apps WHERE id IN ({placeholders})", apps
+            )
+        }
+    finally:
+        index.close()
+
+
+#
+# The catalog index is an sqlite database built from the merged catalog, such
+# that listing/searching the apps or getting the infos of a few apps doesn't
+# imply parsing and merging the whole catalog json files (several MB).
+#
+# It contains :
+# - an 'apps' table with, for each app (in the order of the merged catalog),
+#   its level, its fallback description and its full record as json
+# - a 'descriptions' table with the description of each app for each locale
+# - a 'meta' table with the categories, antifeatures and the 'sources' the
+#   index was built from (api version + mtime of each catalog cache file),
+#   used to detect that the index is outdated.
+#
+
+
+def _apps_catalog_index_sources():
+    sources = []
+    for apps_catalog_id in [L["id"] for L in _read_apps_catalog_list()]:
+        cache_file = f"{APPS_CATALOG_CACHE}/{apps_catalog_id}.json"
+        mtime = os.path.getmtime(cache_file) if os.path.exists(cache_file) else None
+        sources.append([apps_catalog_id, mtime])
+
+    return json.dumps([APPS_CATALOG_API_VERSION, sources])
+
+
+def _index_meta(index, key):
+    row = index.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+    return row[0] if row else None
+
+
+def _index_apps_descriptions(index, where="1", args=()):
+    """
+    Yield (app, level, description) from the index, with the description
+    translated like _value_for_locale would
+    """
+
+    query = f"""
+        SELECT id, level, description FROM (
+            SELECT apps.id AS id, apps.position AS position, apps.level AS level,
+                   COALESCE(
+                       locale.description,
+                       default_locale.description,
+                       apps.description
+                   ) AS description
+            FROM apps
+            LEFT JOIN descriptions AS locale
+                ON locale.app = apps.id AND locale.locale = ?
+            LEFT JOIN descriptions AS default_locale
+                ON default_locale.app = apps.id AND default_locale.locale = ?
+        )
+        WHERE {where}
+        ORDER BY position
+    """
+
+    yield from index.execute(query, [m18n.locale, m18n.default_locale, *args])
+
+
+def _open_apps_catalog_index(sources):
+    if not os.path.exists(APPS_CATALOG_INDEX):
+        return None
+
+    try:
+        index = sqlite3.connect(f"file:{APPS_CATALOG_INDEX}?mode=ro", uri=True)
+        if _index_meta(index, "sources") == sources:
+            return index
+        index.close()
+    except sqlite3.Error as e:
+        logger.debug(f"Failed to read the apps catalog index : {e}")
+
+    return None
+
+
+def _build_apps_catalog_index(index, catalog, sources):
+    index.executescript("""
+        CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT);
+        CREATE TABLE apps (
+            id TEXT PRIMARY KEY, position INTEGER, level INTEGER,
+            description TEXT, record TEXT
+        );
+        CREATE TABLE descriptions (
+            app TEXT, locale TEXT, description TEXT, PRIMARY KEY (app, locale)
+        );
+        """)
+
+    apps = []
+    descriptions = []
+    for position, (app, infos) in enumerate(catalog["apps"].items()):
+        description = infos.get("manifest", {}).get("description")
+        if isinstance(description, dict):
+            descriptions += [(app, k, v) for k, v in description.items()]
+            description = list(description.values())[0] if description else None
+        apps.append((app, position, infos.get("level"), description, json.dumps(infos)))
+
+    with index:
+        index.executemany("INSERT INTO apps VALUES (?, ?, ?, ?, ?)", apps)
+        index.executemany("INSERT INTO descriptions VALUES (?, ?, ?)", descriptions)
+        index.executemany(
+            "INSERT INTO meta VALUES (?, ?)",
+            [
+                ("categories", json.dumps(catalog["categories"])),
+                ("antifeatures", json.dumps(catalog["antifeatures"])),
+                ("sources", sources),
+            ],
+        )
+
+
+def _get_apps_catalog_index():
+    """
+    Return a (read-only) connection to the catalog index, (re)building it
+    if it's missing or outdated. The caller is responsible for closing it.
+    """
+
+    index = _open_apps_catalog_index(_apps_catalog_index_sources())
+    if index is not None:
+        return index
+
+    # N.B. : this may update the catalog cache if it's obsolete (which in turn
+    # builds the index)
+    catalog = _load_apps_catalog()
+    sources = _apps_catalog_index_sources()
+    index = _open_apps_catalog_index(sources)
+    if index is not None:
+        return index
+
+    logger.debug("Building the apps catalog index")
+    try:
+        fd, tmp_path = tempfile.mkstemp(
+            dir=os.path.dirname(APPS_CATALOG_INDEX), prefix=".apps_catalog_index."
+        )
+        os.close(fd)
+        try:
+            tmp_index = sqlite3.connect(tmp_path)
+            _build_apps_catalog_index(tmp_index, catalog, sources)
+            tmp_index.close()
+            os.chmod(tmp_path, 0o640)
+            os.replace(tmp_path, APPS_CATALOG_INDEX)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+    except (OSError, sqlite3.Error) as e:
+        # e.g. not allowed to write in the cache folder : just work in memory
+        logger.debug(f"Failed to write the apps catalog index : {e}")
+        index = sqlite3.connect(":memory:")
+        _build_apps_catalog_index(index, catalog, sources)
+        return index
+
+    return sqlite3.connect(f"file:{APPS_CATALOG_INDEX}?mode=ro", uri=True)
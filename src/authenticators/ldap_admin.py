@@ -22,7 +22,6 @@ import hashlib
 import logging
 import os
 import time
-from pathlib import Path
 
 import jwt
 import ldap
@@ -33,6 +32,7 @@ from moulinette.utils.text import random_ascii
 
 from yunohost.utils.error import YunohostAuthenticationError, YunohostError
 from yunohost.utils.ldap import _get_ldap_interface
+from yunohost.utils.sessions import SessionStore
 
 logger = logging.getLogger("yunohost.authenticators.ldap_admin")
 
@@ -50,6 +50,7 @@ def SESSION_SECRET():
 SESSION_SECRET.value = None  # type: ignore
 SESSION_FOLDER = "/var/cache/yunohost/sessions"
 SESSION_VALIDITY = 3 * 24 * 3600  # 3 days
+SESSION_STORE = SessionStore(SESSION_FOLDER, SESSION_VALIDITY)
 
 LDAP_URI = "ldap://localhost:389"
 ADMIN_GROUP = "cn=admins,ou=groups"
@@ -169,8 +170,7 @@ class Authenticator(BaseAuthenticator):
         )
 
         # Create the session file (expiration mechanism)
-        session_file = f'{SESSION_FOLDER}/{infos["id"]}'
-        os.system(f'touch "{session_file}"')
+        SESSION_STORE.create(infos["id"])
 
     def get_session_cookie(self, raise_if_no_session_exists=True):
         from bottle import request, response
@@ -189,15 +189,11 @@ class Authenticator(BaseAuthenticator):
         if not infos:
             raise YunohostAuthenticationError("unable_authenticate")
 
-        self.purge_expired_session_files()
-        session_file = f'{SESSION_FOLDER}/{infos["id"]}'
-        if not os.path.exists(session_file):
+        # Check the session exists and didn't expire, and extend its validity
+        if not SESSION_STORE.touch(infos["id"]):
             response.delete_cookie("yunohost.admin", path="/yunohost/api")
             raise YunohostAuthenticationError("session_expired")
 
-        # Otherwise, we 'touch' the file to extend the validity
-        os.system(f'touch "{session_file}"')
-
         return infos
 
     def delete_session_cookie(self):
@@ -205,8 +201,7 @@ class Authenticator(BaseAuthenticator):
 
         try:
             infos = self.get_session_cookie()
-            session_file = f'{SESSION_FOLDER}/{infos["id"]}'
-            os.remove(session_file)
+            SESSION_STORE.delete(infos["id"])
         except Exception as e:
             logger.debug(
                 f"User logged out, but failed to properly invalidate the session : {e}"
@@ -216,18 +211,9 @@ class Authenticator(BaseAuthenticator):
 
     def purge_expired_session_files(self):
 
-        for session_file in Path(SESSION_FOLDER).iterdir():
-            if abs(session_file.stat().st_mtime - time.time()) > SESSION_VALIDITY:
-                try:
-                    session_file.unlink()
-                except Exception as e:
-                    logger.debug(f"Failed to delete session file {session_file} ? {e}")
+        SESSION_STORE.purge_expired(force=True)
 
     @staticmethod
     def invalidate_all_sessions_for_user(user):
 
-        for file in Path(SESSION_FOLDER).glob(f"{short_hash(user)}*"):
-            try:
-                file.unlink()
-            except Exception as e:
-                logger.debug(f"Failed to delete session file {file} ? {e}")
+        SESSION_STORE.invalidate_all_with_prefix(short_hash(user))
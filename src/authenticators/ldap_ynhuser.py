@@ -22,7 +22,6 @@ import base64
 import hashlib
 import logging
 import os
-import time
 from pathlib import Path
 
 import jwt
@@ -38,6 +37,7 @@ from moulinette.utils.text import random_ascii
 
 from yunohost.utils.error import YunohostAuthenticationError, YunohostError
 from yunohost.utils.ldap import _get_ldap_interface
+from yunohost.utils.sessions import SessionStore
 
 logger = logging.getLogger("yunohostportal.authenticators.ldap_ynhuser")
 
@@ -57,13 +57,43 @@ def SESSION_SECRET():
 SESSION_SECRET.value = None  # type: ignore
 SESSION_FOLDER = "/var/cache/yunohost-portal/sessions"
 SESSION_VALIDITY = 3 * 24 * 3600  # 3 days
+SESSION_STORE = SessionStore(SESSION_FOLDER, SESSION_VALIDITY)
 
 URI = "ldap://localhost:389"
 USERDN = "uid={username},ou=users,dc=yunohost,dc=org"
 
-# Cache on-disk settings to RAM for faster access
-DOMAIN_USER_ACL_DICT: dict[str, dict] = {}
-PORTAL_SETTINGS_DIR = "/etc/yunohost/portal"
+# Cache on-disk ACL index to RAM for faster access
+PORTAL_ACL: dict = {}
+PORTAL_ACL_INDEX = "/etc/yunohost/portal/.acl_index"
+
+
+def _get_portal_acl() -> dict:
+    """
+    Load the ACL index generated by app_ssowatconf (only re-read when its
+    mtime changes - compared by equality since the clock may have changed)
+    """
+
+    try:
+        mtime = os.stat(PORTAL_ACL_INDEX).st_mtime
+    except FileNotFoundError:
+        logger.error(
+            f"{PORTAL_ACL_INDEX} doesn't exist, please run 'yunohost app ssowatconf'"
+        )
+        return {}
+
+    if PORTAL_ACL.get("mtime") != mtime:
+        index = read_json(PORTAL_ACL_INDEX)
+        PORTAL_ACL.clear()
+        PORTAL_ACL["mtime"] = mtime
+        PORTAL_ACL["domains"] = {
+            domain: set(users) for domain, users in index["domains"].items()
+        }
+        PORTAL_ACL["admins"] = set(index["admins"])
+        PORTAL_ACL["mail_domains"] = {
+            domain: set(users) for domain, users in index["mail_domains"].items()
+        }
+
+    return PORTAL_ACL
 
 
 # Should a user have *minimal* access to a domain?
@@ -71,80 +101,28 @@ PORTAL_SETTINGS_DIR = "/etc/yunohost/portal"
 # - if the user is an admin, yes
 # - if the user has an email on the domain, yes
 # - otherwise, no
+# (subdomains without their own portal are handled by their parent's portal)
 def user_is_allowed_on_domain(user: str, domain: str) -> bool:
 
     assert "/" not in domain
 
-    portal_settings_path = Path(PORTAL_SETTINGS_DIR) / f"{domain}.json"
+    acl = _get_portal_acl()
+    if not acl:
+        return False
 
-    if not portal_settings_path.exists():
+    while domain not in acl["domains"]:
         if "." not in domain:
             return False
-        parent_domain = domain.split(".", 1)[-1]
-        return user_is_allowed_on_domain(user, parent_domain)
-
-    # Check that the domain permissions haven't changed on-disk since we read them
-    # by comparing file mtime. If we haven't read the file yet, read it for the first time.
-    # We compare mtime by equality not superiority because maybe the system clock has changed.
-    mtime = portal_settings_path.stat().st_mtime
-    if (
-        domain not in DOMAIN_USER_ACL_DICT
-        or DOMAIN_USER_ACL_DICT[domain]["mtime"] != mtime
-    ):
-        users: set[str] = set()
-        for infos in read_json(str(portal_settings_path))["apps"].values():
-            users = users.union(infos["users"])
-        DOMAIN_USER_ACL_DICT[domain] = {}
-        DOMAIN_USER_ACL_DICT[domain]["mtime"] = mtime
-        DOMAIN_USER_ACL_DICT[domain]["users"] = users
-
-    if user in DOMAIN_USER_ACL_DICT[domain]["users"]:
-        # A user with explicit permission to an application is certainly welcome
-        return True
+        domain = domain.split(".", 1)[-1]
 
-    ADMIN_GROUP = "cn=admins,ou=groups"
-    try:
-        admins = (
-            _get_ldap_interface()
-            .search(ADMIN_GROUP, attrs=["memberUid"])[0]
-            .get("memberUid", [])
-        )
-    except Exception as e:
-        logger.error(f"Failed to list admin users: {e}")
-        return False
-    if user in admins:
+    return (
+        # A user with explicit permission to an application is certainly welcome
+        user in acl["domains"][domain]
         # Admins can access everything
-        return True
-
-    try:
-        user_result = _get_ldap_interface().search("ou=users", f"uid={user}", ["mail"])
-        if len(user_result) != 1:
-            logger.error(
-                f"User not found or many users found for {user}. How is this possible after so much validation?"
-            )
-            return False
-
-        user_mail = user_result[0]["mail"]
-        if len(user_mail) != 1:
-            logger.error(
-                f"User {user} found, but has the wrong number of email addresses: {user_mail}"
-            )
-            return False
-
-        user_mail = user_mail[0]
-        if "@" not in user_mail:
-            logger.error(f"Invalid email address for {user}: {user_mail}")
-            return False
-
-        if user_mail.split("@")[1] == domain:
-            # A user from that domain is welcome
-            return True
-
-        # Users from other domains don't belong here
-        return False
-    except Exception as e:
-        logger.error(f"Failed to get email info for {user}: {e}")
-        return False
+        or user in acl["admins"]
+        # A user from that domain is welcome
+        or user in acl["mail_domains"].get(domain, set())
+    )
 
 
 # We want to save the password in the cookie, but we should do so in an encrypted fashion
@@ -277,8 +255,7 @@ class Authenticator(BaseAuthenticator):
         )
 
         # Create the session file (expiration mechanism)
-        session_file = f'{SESSION_FOLDER}/{infos["id"]}'
-        os.system(f'touch "{session_file}"')
+        SESSION_STORE.create(infos["id"])
 
     def get_session_cookie(self, decrypt_pwd=False):
         from bottle import request, response
@@ -303,15 +280,11 @@ class Authenticator(BaseAuthenticator):
         if not user_is_allowed_on_domain(infos["user"], infos["host"]):
             raise YunohostAuthenticationError("unable_authenticate")
 
-        self.purge_expired_session_files()
-        session_file = Path(SESSION_FOLDER) / infos["id"]
-        if not session_file.exists():
+        # Check the session exists and didn't expire, and extend its validity
+        if not SESSION_STORE.touch(infos["id"]):
             response.delete_cookie("yunohost.portal", path="/")
             raise YunohostAuthenticationError("session_expired")
 
-        # Otherwise, we 'touch' the file to extend the validity
-        session_file.touch()
-
         is_dev = Path("/etc/yunohost/.portal-api-allowed-cors-origins").exists()
 
         # We also re-set the cookie such that validity is also extended on browser side
@@ -339,8 +312,7 @@ class Authenticator(BaseAuthenticator):
 
         try:
             infos = self.get_session_cookie()
-            session_file = Path(SESSION_FOLDER) / infos["id"]
-            session_file.unlink()
+            SESSION_STORE.delete(infos["id"])
         except Exception as e:
             logger.debug(
                 f"User logged out, but failed to properly invalidate the session : {e}"
@@ -350,19 +322,9 @@ class Authenticator(BaseAuthenticator):
 
     def purge_expired_session_files(self):
 
-        for session_file in Path(SESSION_FOLDER).iterdir():
-            print(session_file.stat().st_mtime - time.time())
-            if abs(session_file.stat().st_mtime - time.time()) > SESSION_VALIDITY:
-                try:
-                    session_file.unlink()
-                except Exception as e:
-                    logger.debug(f"Failed to delete session file {session_file} ? {e}")
+        SESSION_STORE.purge_expired(force=True)
 
     @staticmethod
     def invalidate_all_sessions_for_user(user):
 
-        for file in Path(SESSION_FOLDER).glob(f"{short_hash(user)}*"):
-            try:
-                file.unlink()
-            except Exception as e:
-                logger.debug(f"Failed to delete session file {file} ? {e}")
+        SESSION_STORE.invalidate_all_with_prefix(short_hash(user))
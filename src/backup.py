@@ -19,17 +19,19 @@
 #
 
 import csv
+import hashlib
 import json
 import os
 import re
 import shutil
+import stat
 import subprocess
 import tarfile
 import tempfile
 import time
 from collections import OrderedDict
 from datetime import datetime
-from functools import reduce
+from functools import lru_cache, reduce
 from glob import glob
 from logging import getLogger
 
@@ -78,7 +80,7 @@ from yunohost.utils.system import (
     binary_to_human,
     free_space_in_directory,
     get_ynh_package_version,
-    space_used_by_directory,
+    space_used_by_paths,
 )
 
 BACKUP_PATH = "/home/yunohost.backup"
@@ -87,9 +89,42 @@ APP_MARGIN_SPACE_SIZE = 100  # In MB
 CONF_MARGIN_SPACE_SIZE = 10  # IN MB
 POSTINSTALL_ESTIMATE_SPACE_SIZE = 5  # In MB
 MB_ALLOWED_TO_ORGANIZE = 10
+# c.f. _read_archive_index
+ARCHIVE_INDEX_VERSION = 1
+# c.f. DedupBackupMethod
+BACKUP_REPOSITORY_PATH = f"{BACKUP_PATH}/repository"
+DEDUP_MANIFEST_VERSION = 1
+DEDUP_CHUNK_MIN_SIZE = 256 * 1024
+DEDUP_CHUNK_MAX_SIZE = 4 * 1024 * 1024
 logger = getLogger("yunohost.backup")
 
 
+class _PrefixTrie:
+    """
+    Map string prefixes to values, lookup() returning the value of the
+    longest prefix of a string (or None)
+    """
+
+    def __init__(self):
+        self.root = {}
+
+    def insert(self, prefix, value):
+        node = self.root
+        for char in prefix:
+            node = node.setdefault(char, {})
+        node[None] = value
+
+    def lookup(self, string):
+        node = self.root
+        value = node.get(None)
+        for char in string:
+            node = node.get(char)
+            if node is None:
+                break
+            value = node.get(None, value)
+        return value
+
+
 class BackupRestoreTargetsManager:
     """
     BackupRestoreTargetsManager manage the targets
@@ -287,6 +322,7 @@ class BackupManager:
         self.system_return = {}
         self.paths_to_backup = []
         self.size_details = {"system": {}, "apps": {}}
+        self.sizes_by_source = {}
         self.targets = BackupRestoreTargetsManager()
 
         # Define backup name if needed
@@ -672,12 +708,37 @@ class BackupManager:
             self.targets.set_result("system", part, "Error")
 
     def _collect_apps_files(self):
-        """Prepare backup for each selected apps"""
+        """
+        Prepare backup for each selected apps
+
+        Up to 'misc.backup.backup_apps_concurrency' app backup scripts are run
+        at once. Their results are then merged in the order of the targets,
+        such that the list of files to backup doesn't depend on which script
+        finished first.
+        """
+        from yunohost.settings import settings_get
 
         apps_targets = self.targets.list("apps", exclude=["Skipped"])
+        concurrency = min(
+            settings_get("misc.backup.backup_apps_concurrency") or 1,
+            len(apps_targets),
+        )
+
+        if concurrency <= 1:
+            for app_instance_name in apps_targets:
+                self._collect_app_files(app_instance_name)
+            return
+
+        from multiprocessing.pool import ThreadPool
+
+        def run(app):
+            return self._run_app_backup_script(app, log_prefix=f"[{app}] ")
+
+        with ThreadPool(concurrency) as pool:
+            results = pool.map(run, apps_targets, chunksize=1)
 
-        for app_instance_name in apps_targets:
-            self._collect_app_files(app_instance_name)
+        for app_instance_name, result in zip(apps_targets, results):
+            self._merge_app_files(app_instance_name, *result)
 
     def _collect_app_files(self, app):
         """
@@ -704,7 +765,18 @@ class BackupManager:
         Args:
         app -- (string) an app instance name (already installed) to backup
         """
-        from yunohost.permission import user_permission_list
+        self._merge_app_files(app, *self._run_app_backup_script(app))
+
+    def _run_app_backup_script(self, app, log_prefix=""):
+        """
+        Run the backup script of an app, which may run concurrently with the
+        ones of other apps : it only touches its own apps/<app> subfolder of
+        the work dir, its own temporary CSV and its own temporary workdir
+
+        Return:
+            (tuple) The environment of the script, the exception it raised
+            if any and its duration in seconds
+        """
 
         app_setting_path = os.path.join("/etc/yunohost/apps/", app)
 
@@ -717,6 +789,7 @@ class BackupManager:
         settings_dir = os.path.join(self.work_dir, "apps", app, "settings")
 
         logger.info(m18n.n("app_start_backup", app=app))
+        started_at = time.monotonic()
         tmp_workdir_for_app = _make_tmp_workdir_for_app(app=app)
         try:
             # Prepare backup directory for the app
@@ -730,7 +803,29 @@ class BackupManager:
                 raise_on_error=True,
                 chdir=tmp_app_bkp_dir,
                 env=env_dict,
+                log_prefix=log_prefix,
             )[0]
+        except Exception as e:
+            error = e
+        else:
+            error = None
+        finally:
+            shutil.rmtree(tmp_workdir_for_app)
+
+        return env_dict, error, time.monotonic() - started_at
+
+    def _merge_app_files(self, app, env_dict, error, duration):
+        """
+        Add the files listed by the backup script of an app to the
+        paths_to_backup list, backup its permissions and its info
+        """
+        from yunohost.permission import user_permission_list
+
+        settings_dir = os.path.join(self.work_dir, "apps", app, "settings")
+
+        try:
+            if error is not None:
+                raise error
 
             self._import_to_list_to_backup(env_dict["YNH_BACKUP_CSV"])
 
@@ -753,12 +848,12 @@ class BackupManager:
                 "version": i["version"],
                 "name": i["name"],
                 "description": i["description"],
+                "backup_duration": round(duration, 1),
             }
             self.targets.set_result("apps", app, "Success")
 
         # Remove tmp files in all situations
         finally:
-            shutil.rmtree(tmp_workdir_for_app)
             rm(env_dict["YNH_BACKUP_CSV"], force=True)
 
     #
@@ -791,7 +886,11 @@ class BackupManager:
         Compute backup global size and details size for each apps and system
         parts
 
-        Update self.size and self.size_details
+        Update self.size, self.size_details and self.sizes_by_source
+
+        All the sources are scanned in a single pass (c.f.
+        space_used_by_paths), and each one is attributed to the app or system
+        part whose dest is the longest prefix of its own dest.
 
         Note: currently, these sizes are the size in this archive, not really
         the size of needed to restore the archive. To know the size needed to
@@ -806,32 +905,25 @@ class BackupManager:
         # FIXME Some archive will set up dependencies, those are not in this
         # size info
         self.size = 0
+        owners = _PrefixTrie()
         for system_key in self.system_return:
             self.size_details["system"][system_key] = 0
+            owners.insert(system_key.replace("_", "/"), ("system", system_key))
         for app_key in self.apps_return:
             self.size_details["apps"][app_key] = 0
+            # Trailing slash such that apps/foo doesn't match apps/foo__2
+            owners.insert(f"apps/{app_key}/", ("apps", app_key))
 
-        for row in self.paths_to_backup:
-            if row["dest"] == "info.json":
-                continue
-
-            size = space_used_by_directory(row["source"], follow_symlinks=False)
+        rows = [row for row in self.paths_to_backup if row["dest"] != "info.json"]
+        self.sizes_by_source = space_used_by_paths([row["source"] for row in rows])
 
-            # Add size to apps details
-            splitted_dest = row["dest"].split("/")
-            category = splitted_dest[0]
-            if category == "apps":
-                for app_key in self.apps_return:
-                    if row["dest"].startswith("apps/" + app_key):
-                        self.size_details["apps"][app_key] += size
-                        break
+        for row in rows:
+            size = self.sizes_by_source[row["source"]]
 
-            # OR Add size to the correct system element
-            elif category == "data" or category == "conf":
-                for system_key in self.system_return:
-                    if row["dest"].startswith(system_key.replace("_", "/")):
-                        self.size_details["system"][system_key] += size
-                        break
+            owner = owners.lookup(row["dest"] + "/")
+            if owner is not None:
+                category, key = owner
+                self.size_details[category][key] += size
 
             self.size += size
 
@@ -891,6 +983,9 @@ class RestoreManager:
 
         self.archive_path = self.info["path"]
         self.name = name
+        # Backups of the deduplicated repository can only be mounted by it
+        if self.archive_path.endswith(".dedup"):
+            method = "dedup"
         self.method = BackupMethod.create(method, self)
         self.targets = BackupRestoreTargetsManager()
 
@@ -1695,6 +1790,45 @@ class BackupMethod:
         """
         pass
 
+    def _members_to_restore(self, members, leading_dot=""):
+        """
+        Return the set of members of the archive (i.e. paths relative to the
+        root of the archive) needed to restore the targets of the
+        RestoreManager : info.json, backup.csv, the restore hooks, the system
+        parts and the apps
+        """
+
+        # N.B. : old backup archive have no backup.csv file
+        to_restore = {leading_dot + "info.json", leading_dot + "backup.csv"}
+
+        # Extract system parts backup
+        prefixes = [leading_dot + "hooks/restore/"]
+        conf_extracted = False
+
+        system_targets = self.manager.targets.list("system", exclude=["Skipped"])
+        apps_targets = self.manager.targets.list("apps", exclude=["Skipped"])
+
+        for system_part in system_targets:
+            # Caution: conf_ynh_currenthost helpers put its files in
+            # conf/ynh
+            if system_part.startswith("conf_"):
+                if conf_extracted:
+                    continue
+                system_part = "conf/"
+                conf_extracted = True
+            else:
+                system_part = system_part.replace("_", "/") + "/"
+            prefixes.append(leading_dot + system_part)
+
+        # Extract apps backup
+        for app in apps_targets:
+            prefixes.append(leading_dot + "apps/" + app)
+
+        to_restore.update(
+            member for member in members if member.startswith(tuple(prefixes))
+        )
+        return to_restore
+
     def clean(self):
         """
         Umount sub directories of working dirextories and delete it if temporary
@@ -1808,11 +1942,16 @@ class BackupMethod:
         # It could be just for some small files on different filesystems or due
         # to mounting error
 
-        # Compute size to copy
-        size = sum(
-            space_used_by_directory(path["source"], follow_symlinks=False)
+        # Compute size to copy, reusing the sizes computed by the manager
+        sizes = self.manager.sizes_by_source
+        missing = [
+            path["source"]
             for path in paths_needed_to_be_copied
-        )
+            if path["source"] not in sizes
+        ]
+        if missing:
+            sizes = {**sizes, **space_used_by_paths(missing)}
+        size = sum(sizes[path["source"]] for path in paths_needed_to_be_copied)
         size /= 1024 * 1024  # Convert bytes to megabytes
 
         # Ask confirmation for copying
@@ -1899,9 +2038,153 @@ class CopyBackupMethod(BackupMethod):
         shutil.copy(file, target)
 
 
+class _ArchiveStream:
+    """
+    Write-only file object used as output of the tar stream, which:
+
+    - compresses the data (if compress=True) as independent gzip members of a
+      few MB each, compressed in a pool of threads (zlib releases the GIL).
+      Concatenated gzip members are a regular gzip file (that's what pigz
+      does), hence readable by tarfile "r:gz", gzip, tar -z ...
+    - keeps track of the amount of (uncompressed) data written, for throughput
+      reporting, and reports the progress every 10s if given the total size
+      (including in the middle of a big file, unlike reporting between files)
+    - keeps track of where each gzip member starts, in the uncompressed and
+      compressed data, which are points where decompression can be started
+      from (c.f. _iter_archive_index_ranges)
+    - fsyncs the file only once, when closed
+
+    It writes either into a new file (if given a path) or into a file object,
+    which may be a pipe (c.f. backup_create --stream)
+    """
+
+    CHUNK_SIZE = 8 * 1024 * 1024
+
+    PROGRESS_REPORT_INTERVAL = 10
+
+    def __init__(
+        self, file, compress=False, workers=None, compresslevel=6, total_size=None
+    ):
+        self.file = open(file, "wb") if isinstance(file, str) else file
+        self.bytes_written = 0
+        self.total_size = total_size
+        self.start = self.last_progress_report = time.time()
+        self.compressed_bytes_written = 0
+        self.compresslevel = compresslevel
+        self.buffer = bytearray()
+        self.pending = []
+        self.seek_points = []
+        self.chunk_offset = 0
+        self.pool = None
+        if compress:
+            from multiprocessing.pool import ThreadPool
+
+            self.workers = workers or os.cpu_count() or 1
+            self.pool = ThreadPool(self.workers)
+
+    def write(self, data):
+        self.bytes_written += len(data)
+        if self.total_size is not None:
+            self._report_progress()
+        if not self.pool:
+            self.file.write(data)
+            return len(data)
+
+        self.buffer += data
+        while len(self.buffer) >= self.CHUNK_SIZE:
+            self._compress(bytes(self.buffer[: self.CHUNK_SIZE]))
+            del self.buffer[: self.CHUNK_SIZE]
+        return len(data)
+
+    def _report_progress(self):
+        now = time.time()
+        if now - self.last_progress_report <= self.PROGRESS_REPORT_INTERVAL:
+            return
+        self.last_progress_report = now
+        speed = self.bytes_written / (now - self.start)
+        logger.info(
+            m18n.n(
+                "backup_archive_progress",
+                done=binary_to_human(self.bytes_written) + "B",
+                total=binary_to_human(self.total_size) + "B",
+                speed=binary_to_human(int(speed)) + "B",
+            )
+        )
+
+    def _compress(self, chunk):
+        import gzip
+
+        self.pending.append(
+            (
+                self.chunk_offset,
+                self.pool.apply_async(gzip.compress, (chunk, self.compresslevel)),
+            )
+        )
+        self.chunk_offset += len(chunk)
+        # Write the compressed chunks in order, and don't keep more than a
+        # couple of chunks per worker in memory
+        while len(self.pending) > 2 * self.workers:
+            self._write_compressed(*self.pending.pop(0))
+
+    def _write_compressed(self, offset, result):
+        # Pipes can't tell() their position, hence the counter
+        self.seek_points.append((offset, self.compressed_bytes_written))
+        data = result.get()
+        self.file.write(data)
+        self.compressed_bytes_written += len(data)
+
+    def close(self):
+        try:
+            if self.pool:
+                if self.buffer:
+                    self._compress(bytes(self.buffer))
+                    self.buffer = bytearray()
+                for offset, result in self.pending:
+                    self._write_compressed(offset, result)
+                self.pending = []
+            self.file.flush()
+            if stat.S_ISREG(os.fstat(self.file.fileno()).st_mode):
+                os.fsync(self.file.fileno())
+        finally:
+            if self.pool:
+                self.pool.terminate()
+            self.file.close()
+
+    def abort(self):
+        if self.pool:
+            self.pool.terminate()
+        self.file.close()
+
+
+class _IndexedTarFile(tarfile.TarFile):
+    """
+    TarFile keeping track of the (name, start, end, size) of the members it
+    writes, start and end being their offsets in the tar stream, headers
+    included. c.f. TarBackupMethod._write_archive_index
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.members_offsets = []
+
+    def addfile(self, tarinfo, *args, **kwargs):
+        start = self.offset
+        super().addfile(tarinfo, *args, **kwargs)
+        self.members_offsets.append((tarinfo.name, start, self.offset, tarinfo.size))
+
+
 class TarBackupMethod(BackupMethod):
     method_name = "tar"
 
+    def __init__(self, manager, repo=None, fileobj=None, **kwargs):
+        """
+        Args:
+           fileobj -- (file|None) If given, the archive is streamed into this
+                      file object instead of being written into the repo
+        """
+        super().__init__(manager, repo, **kwargs)
+        self.fileobj = fileobj
+
     @property
     def _archive_file(self):
         from yunohost.settings import settings_get
@@ -1925,45 +2208,72 @@ class TarBackupMethod(BackupMethod):
 
         It adds the info.json in /home/yunohost.backup/archives and if the
         compress archive isn't located here, add a symlink to the archive to.
+
+        If the archive is streamed into a file object instead, nothing is kept
+        locally (and no free space is needed for the archive)
         """
+        from yunohost.settings import settings_get
 
-        if not os.path.exists(self.repo):
-            mkdir(self.repo, 0o750, parents=True)
+        if self.fileobj is not None:
+            archive_file = "<stream>"
+            compress = settings_get("misc.backup.backup_compress_tar_archives")
+        else:
+            archive_file = self._archive_file
+            compress = archive_file.endswith(".gz")
 
-        # Check free space in output
-        self._check_is_enough_free_space()
+            if not os.path.exists(self.repo):
+                mkdir(self.repo, 0o750, parents=True)
+
+            # Check free space in output
+            self._check_is_enough_free_space()
 
         # Open archive file for writing
+        # The tar is streamed into the file, compressed in parallel if needed
+        # (c.f. _ArchiveStream), which is still a regular .tar(.gz)
         try:
-            tar = tarfile.open(
-                self._archive_file,
-                "w:gz" if self._archive_file.endswith(".gz") else "w",
+            stream = _ArchiveStream(
+                self.fileobj if self.fileobj is not None else archive_file,
+                compress=compress,
+                total_size=self.manager.size or 0,
             )
+            tar = _IndexedTarFile.open(fileobj=stream, mode="w|")
         except Exception:
-            logger.debug(
-                "unable to open '%s' for writing", self._archive_file, exc_info=1
-            )
+            logger.debug("unable to open '%s' for writing", archive_file, exc_info=1)
             raise YunohostError("backup_archive_open_failed")
 
-        # Add files to the archive
+        # Add files to the archive (the progress is reported by the stream)
+        start = time.time()
         try:
             for path in self.manager.paths_to_backup:
                 # Add the "source" into the archive and transform the path into
                 # "dest"
                 tar.add(path["source"], arcname=path["dest"])
+            tar.close()
+            stream.close()
         except IOError:
             logger.error(
                 m18n.n(
                     "backup_archive_writing_error",
                     source=path["source"],
-                    archive=self._archive_file,
+                    archive=archive_file,
                     dest=path["dest"],
                 ),
                 exc_info=1,
             )
+            stream.abort()
             raise YunohostError("backup_creation_failed")
-        finally:
-            tar.close()
+        except BaseException:
+            stream.abort()
+            raise
+
+        duration = max(time.time() - start, 0.001)
+        logger.debug(
+            f"Wrote {binary_to_human(stream.bytes_written)}B to {archive_file} "
+            f"in {round(duration, 1)}s ({binary_to_human(int(stream.bytes_written / duration))}B/s)"
+        )
+
+        if self.fileobj is not None:
+            return
 
         # Move info file
         shutil.copy(
@@ -1971,12 +2281,39 @@ class TarBackupMethod(BackupMethod):
             os.path.join(ARCHIVES_PATH, self.name + ".info.json"),
         )
 
+        self._write_archive_index(tar, stream)
+
         # If backuped to a non-default location, keep a symlink of the archive
         # to that location
         link = os.path.join(ARCHIVES_PATH, self.name + ".tar")
         if not os.path.isfile(link):
             os.symlink(self._archive_file, link)
 
+    def _write_archive_index(self, tar, stream):
+        """
+        Write, next to the info.json, the index of the members of the archive
+        and of the points where its decompression can be started from, such
+        that restoring only some parts of it doesn't require to decompress
+        and scan the whole archive. c.f. _read_archive_index
+        """
+
+        index = {
+            "version": ARCHIVE_INDEX_VERSION,
+            "archive_size": os.path.getsize(self._archive_file),
+            "compression": "gzip" if self._archive_file.endswith(".gz") else None,
+            "seek_points": stream.seek_points,
+            "size": sum(size for _, _, _, size in tar.members_offsets),
+            "members": tar.members_offsets,
+        }
+
+        try:
+            with open(_archive_index_path(self.name), "w") as f:
+                json.dump(index, f)
+        except Exception as e:
+            # Not a big deal, the archive will just be scanned when needed
+            logger.warning(f"Could not write the index of the archive : {e}")
+            rm(_archive_index_path(self.name), force=True)
+
     def mount(self):
         """
         Mount the archive. We avoid intermediate copies to be able to restore on system with low free space.
@@ -1985,88 +2322,81 @@ class TarBackupMethod(BackupMethod):
 
         # Mount the tarball
         logger.debug(m18n.n("restore_extracting"))
-        try:
-            tar = tarfile.open(
-                self._archive_file,
-                "r:gz" if self._archive_file.endswith(".gz") else "r",
-            )
-        except Exception:
-            logger.debug(
-                "cannot open backup archive '%s'", self._archive_file, exc_info=1
-            )
-            raise YunohostError("backup_archive_open_failed")
 
-        try:
-            files_in_archive = tar.getnames()
-        except (IOError, EOFError, tarfile.ReadError) as e:
-            raise YunohostError(
-                "backup_archive_corrupted", archive=self._archive_file, error=str(e)
-            )
+        # If the archive has an index, we know where the members are without
+        # having to scan it, and only the needed parts are read
+        index = _read_archive_index(self.name, self._archive_file)
+        if index is not None:
+            tar = None
+            files_in_archive = [member[0] for member in index["members"]]
+        else:
+            try:
+                tar = tarfile.open(
+                    self._archive_file,
+                    "r:gz" if self._archive_file.endswith(".gz") else "r",
+                )
+            except Exception:
+                logger.debug(
+                    "cannot open backup archive '%s'", self._archive_file, exc_info=1
+                )
+                raise YunohostError("backup_archive_open_failed")
 
-        if "info.json" in tar.getnames():
+            try:
+                files_in_archive = tar.getnames()
+            except (IOError, EOFError, tarfile.ReadError) as e:
+                tar.close()
+                raise YunohostError(
+                    "backup_archive_corrupted", archive=self._archive_file, error=str(e)
+                )
+
+        if "info.json" in files_in_archive:
             leading_dot = ""
-            tar.extract("info.json", path=self.work_dir)
         elif "./info.json" in files_in_archive:
             leading_dot = "./"
-            tar.extract("./info.json", path=self.work_dir)
         else:
             logger.debug(
                 "unable to retrieve 'info.json' inside the archive", exc_info=1
             )
-            tar.close()
+            if tar is not None:
+                tar.close()
             raise YunohostError(
                 "backup_archive_cant_retrieve_info_json", archive=self._archive_file
             )
 
-        if "backup.csv" in files_in_archive:
-            tar.extract("backup.csv", path=self.work_dir)
-        elif "./backup.csv" in files_in_archive:
-            tar.extract("./backup.csv", path=self.work_dir)
-        else:
-            # Old backup archive have no backup.csv file
-            pass
+        to_extract = self._members_to_restore(files_in_archive, leading_dot)
 
-        # Extract system parts backup
-        conf_extracted = False
-
-        system_targets = self.manager.targets.list("system", exclude=["Skipped"])
-        apps_targets = self.manager.targets.list("apps", exclude=["Skipped"])
-
-        for system_part in system_targets:
-            # Caution: conf_ynh_currenthost helpers put its files in
-            # conf/ynh
-            if system_part.startswith("conf_"):
-                if conf_extracted:
-                    continue
-                system_part = "conf/"
-                conf_extracted = True
+        # Everything is extracted in a single pass over the archive
+        try:
+            if tar is not None:
+                tar.extractall(
+                    members=[m for m in tar.getmembers() if m.name in to_extract],
+                    path=self.work_dir,
+                )
             else:
-                system_part = system_part.replace("_", "/") + "/"
-            subdir_and_files = [
-                tarinfo
-                for tarinfo in tar.getmembers()
-                if tarinfo.name.startswith(leading_dot + system_part)
-            ]
-            tar.extractall(members=subdir_and_files, path=self.work_dir)
-        subdir_and_files = [
-            tarinfo
-            for tarinfo in tar.getmembers()
-            if tarinfo.name.startswith(leading_dot + "hooks/restore/")
-        ]
-        tar.extractall(members=subdir_and_files, path=self.work_dir)
-
-        # Extract apps backup
-        for app in apps_targets:
-            subdir_and_files = [
-                tarinfo
-                for tarinfo in tar.getmembers()
-                if tarinfo.name.startswith(leading_dot + "apps/" + app)
-            ]
-            tar.extractall(members=subdir_and_files, path=self.work_dir)
-
-        tar.close()
+                for tar_range, members in _iter_archive_index_ranges(
+                    self._archive_file, index, to_extract
+                ):
+                    tar_range.extractall(members=members, path=self.work_dir)
+        except (IOError, EOFError, tarfile.ReadError) as e:
+            raise YunohostError(
+                "backup_archive_corrupted", archive=self._archive_file, error=str(e)
+            )
+        finally:
+            if tar is not None:
+                tar.close()
 
     def copy(self, file, target):
+        index = _read_archive_index(self.name, self._archive_file)
+        if index is not None:
+            for tar, members in _iter_archive_index_ranges(
+                self._archive_file, index, {file}
+            ):
+                for file_to_extract in members:
+                    # Remove the path
+                    file_to_extract.name = os.path.basename(file_to_extract.name)
+                    tar.extract(file_to_extract, path=target)
+            return
+
         tar = tarfile.open(
             self._archive_file, "r:gz" if self._archive_file.endswith(".gz") else "r"
         )
@@ -2077,6 +2407,235 @@ class TarBackupMethod(BackupMethod):
         tar.close()
 
 
+class DedupBackupMethod(BackupMethod):
+    """
+    This class stores the files in a local repository (BACKUP_REPOSITORY_PATH)
+    of content-defined chunks shared by all the backups made with this
+    method, plus a manifest per backup listing its files and their chunks.
+
+    Files which didn't change since the previous backup aren't even read
+    again, and only the chunks which aren't already in the repository are
+    written, such that successive backups of mostly unchanged data are cheap,
+    in time and in space.
+
+    The manifests are linked from /home/yunohost.backup/archives/<name>.dedup
+    such that those backups are listed, restored and deleted like the others.
+    The chunks which aren't used by any backup anymore are deleted by
+    backup_prune.
+    """
+
+    method_name = "dedup"
+
+    def __init__(self, manager, repo=None, **kwargs):
+        # N.B. : the output directory, if any, is only used to prepare the
+        # files, the repository being always the local one
+        super(DedupBackupMethod, self).__init__(manager, BACKUP_REPOSITORY_PATH)
+
+    @property
+    def _manifest_file(self):
+        if isinstance(self.manager, RestoreManager):
+            return self.manager.archive_path
+        return os.path.join(self.repo, "manifests", self.name + ".dedup")
+
+    def backup(self):
+        """
+        Add the prepared files to the repository, and write the manifest of
+        the backup
+
+        N.B. : the free space isn't checked beforehand, since only the data
+        that changed since the previous backup will be written
+        """
+        from multiprocessing.pool import ThreadPool
+
+        for folder in ["chunks", "manifests"]:
+            if not os.path.isdir(os.path.join(self.repo, folder)):
+                mkdir(os.path.join(self.repo, folder), 0o700, parents=True)
+
+        # Files are compared to the ones of the latest backup, whose chunks
+        # are known to be in the repository
+        self._previous = {}
+        self._known_chunks = set()
+        latest = _list_dedup_manifests()[-1:]
+        if latest:
+            for entry in _read_dedup_manifest(latest[0])["entries"]:
+                self._previous[entry[0]] = entry
+                if entry[1] == "f":
+                    self._known_chunks.update(entry[-1])
+
+        self.stats = {
+            "files": 0,
+            "unchanged_files": 0,
+            "chunks": 0,
+            "new_chunks": 0,
+            "bytes_written": 0,
+        }
+        entries = []
+
+        start = time.time()
+        # Chunks are compressed and written in a pool of threads, while the
+        # next ones are read and hashed (zlib and hashlib release the GIL)
+        self._workers = os.cpu_count() or 1
+        with ThreadPool(self._workers) as pool:
+            self._pool = pool
+            self._pending = []
+            for path in self.manager.paths_to_backup:
+                try:
+                    self._add(path["source"], path["dest"].lstrip("/"), entries)
+                    self._wait_for_pending_chunks()
+                except IOError:
+                    logger.error(
+                        m18n.n(
+                            "backup_archive_writing_error",
+                            source=path["source"],
+                            archive=self.repo,
+                            dest=path["dest"],
+                        ),
+                        exc_info=1,
+                    )
+                    raise YunohostError("backup_creation_failed")
+
+        # Make sure the chunks are on disk before the manifest using them is
+        # written, rather than fsyncing each of them
+        os.sync()
+
+        manifest = {
+            "version": DEDUP_MANIFEST_VERSION,
+            "name": self.name,
+            "created_at": self.manager.created_at,
+            "entries": entries,
+        }
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(self._manifest_file))
+        with os.fdopen(fd, "w") as f:
+            json.dump(manifest, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self._manifest_file)
+
+        duration = max(time.time() - start, 0.001)
+        logger.debug(
+            f"Added {self.stats['files']} files to {self.repo} in {round(duration, 1)}s : "
+            f"{self.stats['unchanged_files']} unchanged since the last backup, "
+            f"{self.stats['new_chunks']} new chunks out of {self.stats['chunks']} "
+            f"({binary_to_human(self.stats['bytes_written'])}B written)"
+        )
+
+        # Move info file
+        shutil.copy(
+            os.path.join(self.work_dir, "info.json"),
+            os.path.join(ARCHIVES_PATH, self.name + ".info.json"),
+        )
+
+        # Link the manifest from the archives folder, such that this backup
+        # is listed with the others
+        link = os.path.join(ARCHIVES_PATH, self.name + ".dedup")
+        if not os.path.lexists(link):
+            os.symlink(self._manifest_file, link)
+
+    def _add(self, source, dest, entries):
+        """
+        Add a file, symlink or (recursively) a folder to the entries of the
+        manifest, c.f. _read_dedup_manifest for the format of the entries
+        """
+
+        st = os.lstat(source)
+        entry = [
+            dest,
+            None,
+            stat.S_IMODE(st.st_mode),
+            st.st_uid,
+            st.st_gid,
+            _user_name(st.st_uid),
+            _group_name(st.st_gid),
+            st.st_mtime_ns,
+            0,
+            st.st_ctime_ns,
+            None,
+        ]
+
+        if stat.S_ISDIR(st.st_mode):
+            entry[1] = "d"
+            entries.append(entry)
+            for name in sorted(os.listdir(source)):
+                self._add(os.path.join(source, name), f"{dest}/{name}", entries)
+        elif stat.S_ISLNK(st.st_mode):
+            entry[1] = "l"
+            entry[-1] = os.readlink(source)
+            entries.append(entry)
+        elif stat.S_ISREG(st.st_mode):
+            entry[1] = "f"
+            entry[8] = st.st_size
+            self.stats["files"] += 1
+            previous = self._previous.get(dest)
+            # Same criterias as borg : if the size, mtime and ctime didn't
+            # change, the content didn't either
+            if (
+                previous is not None
+                and previous[1] == "f"
+                and previous[7:10] == entry[7:10]
+            ):
+                entry[-1] = previous[-1]
+                self.stats["unchanged_files"] += 1
+            else:
+                entry[-1] = self._add_file_chunks(source)
+            entries.append(entry)
+        else:
+            logger.warning(f"Ignoring {source}, which is not a regular file")
+
+    def _add_file_chunks(self, source):
+        chunks = []
+        with open(source, "rb") as f:
+            for chunk in _iter_dedup_chunks(f):
+                sha256 = hashlib.sha256(chunk).hexdigest()
+                chunks.append(sha256)
+                self.stats["chunks"] += 1
+                if sha256 in self._known_chunks:
+                    continue
+                self._known_chunks.add(sha256)
+                chunk_file = _dedup_chunk_path(sha256)
+                if os.path.exists(chunk_file):
+                    continue
+                self.stats["new_chunks"] += 1
+                self._pending.append(
+                    self._pool.apply_async(_write_dedup_chunk, (chunk_file, chunk))
+                )
+                # Don't keep more than a couple of chunks per worker in memory
+                while len(self._pending) > 2 * self._workers:
+                    self.stats["bytes_written"] += self._pending.pop(0).get()
+        return chunks
+
+    def _wait_for_pending_chunks(self):
+        for result in self._pending:
+            self.stats["bytes_written"] += result.get()
+        self._pending = []
+
+    def mount(self):
+        """
+        Recreate in the working directory the files of the backup needed for
+        the restoration
+        """
+        super(DedupBackupMethod, self).mount()
+
+        manifest = _read_dedup_manifest(self._manifest_file)
+        members = [entry[0] for entry in manifest["entries"]]
+        if "info.json" not in members:
+            raise YunohostError(
+                "backup_archive_cant_retrieve_info_json", archive=self._manifest_file
+            )
+
+        _restore_dedup_entries(
+            manifest, self._members_to_restore(members), self.work_dir
+        )
+
+    def copy(self, file, target):
+        manifest = _read_dedup_manifest(self._manifest_file)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            _restore_dedup_entries(manifest, {file}, tmp_dir)
+            shutil.move(
+                os.path.join(tmp_dir, file),
+                os.path.join(target, os.path.basename(file)),
+            )
+
+
 class CustomBackupMethod(BackupMethod):
     """
     This class use a bash script/hook "backup_method" to do the
@@ -2169,6 +2728,7 @@ def backup_create(
     system=[],
     apps=[],
     dry_run=False,
+    stream=False,
 ):
     """
     Create a backup local archive
@@ -2180,6 +2740,8 @@ def backup_create(
         output_directory -- Output directory for the backup
         system -- List of system elements to backup
         apps -- List of application names to backup
+        stream -- Write the tar archive to the standard output instead of
+                  keeping it locally (command line only)
     """
 
     # TODO: Add a 'clean' argument to clean output directory
@@ -2214,6 +2776,14 @@ def backup_create(
         elif os.path.isdir(output_directory) and os.listdir(output_directory):
             raise YunohostValidationError("backup_output_directory_not_empty")
 
+    if stream:
+        if Moulinette.interface.type == "api":
+            raise YunohostValidationError("backup_stream_cli_only")
+        if set(methods) != {"tar"}:
+            raise YunohostValidationError("backup_stream_only_tar")
+        if os.isatty(1):
+            raise YunohostValidationError("backup_stream_output_is_a_terminal")
+
     # If no --system or --apps given, backup everything
     if system is None and apps is None:
         system = []
@@ -2223,6 +2793,8 @@ def backup_create(
     # Intialize                                                             #
     #
 
+    output = _open_stdout_for_archive() if stream and not dry_run else None
+
     operation_logger.start()
 
     # Create yunohost archives directory if it does not exists
@@ -2233,6 +2805,10 @@ def backup_create(
     backup_manager = BackupManager(
         name, description, methods=methods, work_dir=output_directory
     )
+    if output is not None:
+        backup_manager.methods = [
+            BackupMethod.create("tar", backup_manager, fileobj=output)
+        ]
 
     # Add backup targets (system and apps)
 
@@ -2266,6 +2842,16 @@ def backup_create(
     )
     backup_manager.backup()
 
+    # A streamed archive isn't kept locally, hence can't be listed nor looked
+    # up by its name afterwards
+    if output is not None:
+        logger.success(m18n.n("backup_streamed"))
+        operation_logger.success()
+        return {
+            "size": backup_manager.size,
+            "results": backup_manager.targets.results,
+        }
+
     logger.success(m18n.n("backup_created", name=backup_manager.name))
     operation_logger.success()
 
@@ -2359,7 +2945,11 @@ def backup_list(with_info=False, human_readable=False):
     """
     # Get local archives sorted according to last modification time
     # (we do a realpath() to resolve symlinks)
-    archives = glob(f"{ARCHIVES_PATH}/*.tar.gz") + glob(f"{ARCHIVES_PATH}/*.tar")
+    archives = (
+        glob(f"{ARCHIVES_PATH}/*.tar.gz")
+        + glob(f"{ARCHIVES_PATH}/*.tar")
+        + glob(f"{ARCHIVES_PATH}/*.dedup")
+    )
     archives = {os.path.realpath(archive) for archive in archives}
     archives = {archive for archive in archives if os.path.exists(archive)}
     archives = sorted(archives, key=lambda x: os.path.getctime(x))
@@ -2368,6 +2958,8 @@ def backup_list(with_info=False, human_readable=False):
     def remove_extension(f):
         if f.endswith(".tar.gz"):
             return os.path.basename(f)[: -len(".tar.gz")]
+        elif f.endswith(".dedup"):
+            return os.path.basename(f)[: -len(".dedup")]
         else:
             return os.path.basename(f)[: -len(".tar")]
 
@@ -2392,17 +2984,24 @@ def backup_list(with_info=False, human_readable=False):
 
 
 def backup_download(name):
-    if Moulinette.interface.type != "api":
-        logger.error(
-            "This option is only meant for the API/webadmin and doesn't make sense for the command line."
-        )
-        return
+    """
+    Download a local backup archive, through the API (with support of range
+    requests, to resume interrupted downloads) or to the standard output
+
+    Backups of the deduplicated repository don't exist as a single file, they
+    are downloaded as a tar archive generated on the fly from their manifest
+
+    Keyword arguments:
+        name -- Name of the local backup archive
+    """
 
     archive_file = f"{ARCHIVES_PATH}/{name}.tar"
 
     # Check file exist (even if it's a broken symlink)
     if not os.path.lexists(archive_file):
         archive_file += ".gz"
+        if not os.path.lexists(archive_file):
+            archive_file = f"{ARCHIVES_PATH}/{name}.dedup"
         if not os.path.lexists(archive_file):
             raise YunohostValidationError("backup_archive_name_unknown", name=name)
 
@@ -2416,12 +3015,63 @@ def backup_download(name):
                 "backup_archive_broken_link", path=archive_file
             )
 
+    if archive_file.endswith(".dedup"):
+        manifest = _read_dedup_manifest(archive_file)
+        download_name = f"{name}.tar"
+    else:
+        manifest = None
+        download_name = os.path.basename(archive_file)
+
+    if Moulinette.interface.type != "api":
+        if os.isatty(1):
+            raise YunohostValidationError("backup_stream_output_is_a_terminal")
+        with _open_stdout_for_archive() as output:
+            if manifest is not None:
+                for data in _iter_dedup_archive(manifest):
+                    output.write(data)
+            else:
+                with open(archive_file, "rb") as f:
+                    shutil.copyfileobj(f, output, 1024 * 1024)
+        return
+
     # We return a raw bottle HTTPresponse (instead of serializable data like
     # list/dict, ...), which is gonna be picked and used directly by moulinette
-    from bottle import static_file
+    from bottle import HTTPResponse, parse_range_header, request, static_file
+
+    # static_file already deals with range requests
+    if manifest is None:
+        archive_folder, archive_file_name = archive_file.rsplit("/", 1)
+        return static_file(archive_file_name, archive_folder, download=download_name)
+
+    size = sum(length for length, _ in _dedup_archive_segments(manifest))
+    mtime = os.stat(archive_file).st_mtime
+    headers = {
+        "Content-Type": "application/x-tar",
+        "Content-Disposition": f'attachment; filename="{download_name}"',
+        "Accept-Ranges": "bytes",
+        "Last-Modified": time.strftime("%a, %d %b %Y %H:%M:%S GMT", time.gmtime(mtime)),
+        # The generated archive only depends on the manifest, which is never
+        # modified once written
+        "ETag": hashlib.sha1(f"{archive_file}:{mtime}:{size}".encode()).hexdigest(),
+    }
+
+    range_header = request.environ.get("HTTP_RANGE")
+    if not range_header:
+        headers["Content-Length"] = str(size)
+        return HTTPResponse(_iter_dedup_archive(manifest), **headers)
+
+    ranges = list(parse_range_header(range_header, size))
+    if not ranges:
+        return HTTPResponse(
+            "Requested Range Not Satisfiable",
+            status=416,
+            **{"Content-Range": f"bytes */{size}"},
+        )
 
-    archive_folder, archive_file_name = archive_file.rsplit("/", 1)
-    return static_file(archive_file_name, archive_folder, download=archive_file_name)
+    start, end = ranges[0]
+    headers["Content-Range"] = f"bytes {start}-{end - 1}/{size}"
+    headers["Content-Length"] = str(end - start)
+    return HTTPResponse(_iter_dedup_archive(manifest, start, end), 206, **headers)
 
 
 def backup_info(name, with_details=False, human_readable=False):
@@ -2440,12 +3090,16 @@ def backup_info(name, with_details=False, human_readable=False):
         name = name[: -len(".tar.gz")]
     elif name.endswith(".tar"):
         name = name[: -len(".tar")]
+    elif name.endswith(".dedup"):
+        name = name[: -len(".dedup")]
 
     archive_file = f"{ARCHIVES_PATH}/{name}.tar"
 
     # Check file exist (even if it's a broken symlink)
     if not os.path.lexists(archive_file):
         archive_file += ".gz"
+        if not os.path.lexists(archive_file):
+            archive_file = f"{ARCHIVES_PATH}/{name}.dedup"
         if not os.path.lexists(archive_file):
             # Maybe the user provided a path to the backup?
             archive_file = original_name
@@ -2464,26 +3118,57 @@ def backup_info(name, with_details=False, human_readable=False):
 
     info_file = f"{ARCHIVES_PATH}/{name}.info.json"
 
-    if not os.path.exists(info_file):
-        tar = tarfile.open(
-            archive_file, "r:gz" if archive_file.endswith(".gz") else "r"
-        )
-        info_dir = info_file + ".d"
+    index = _read_archive_index(name, archive_file)
+    manifest = None
 
+    if not os.path.exists(info_file) and archive_file.endswith(".dedup"):
+        manifest = _read_dedup_manifest(archive_file)
+        info_dir = info_file + ".d"
         try:
-            files_in_archive = tar.getnames()
-        except (IOError, EOFError, tarfile.ReadError) as e:
+            _restore_dedup_entries(manifest, {"info.json"}, info_dir)
+            shutil.move(os.path.join(info_dir, "info.json"), info_file)
+        except (IOError, YunohostError):
+            logger.debug(
+                "unable to retrieve '%s' from the manifest", info_file, exc_info=1
+            )
             raise YunohostError(
-                "backup_archive_corrupted", archive=archive_file, error=str(e)
+                "backup_archive_cant_retrieve_info_json", archive=archive_file
+            )
+        finally:
+            shutil.rmtree(info_dir, ignore_errors=True)
+    elif not os.path.exists(info_file):
+        info_dir = info_file + ".d"
+
+        if index is not None:
+            tar = None
+            files_in_archive = [member[0] for member in index["members"]]
+        else:
+            tar = tarfile.open(
+                archive_file, "r:gz" if archive_file.endswith(".gz") else "r"
             )
+            try:
+                files_in_archive = tar.getnames()
+            except (IOError, EOFError, tarfile.ReadError) as e:
+                tar.close()
+                raise YunohostError(
+                    "backup_archive_corrupted", archive=archive_file, error=str(e)
+                )
 
         try:
             if "info.json" in files_in_archive:
-                tar.extract("info.json", path=info_dir)
+                member = "info.json"
             elif "./info.json" in files_in_archive:
-                tar.extract("./info.json", path=info_dir)
+                member = "./info.json"
             else:
                 raise KeyError
+
+            if tar is not None:
+                tar.extract(member, path=info_dir)
+            else:
+                for tar_range, members in _iter_archive_index_ranges(
+                    archive_file, index, {member}
+                ):
+                    tar_range.extractall(members=members, path=info_dir)
         except KeyError:
             logger.debug(
                 "unable to retrieve '%s' inside the archive", info_file, exc_info=1
@@ -2494,7 +3179,8 @@ def backup_info(name, with_details=False, human_readable=False):
         else:
             shutil.move(os.path.join(info_dir, "info.json"), info_file)
         finally:
-            tar.close()
+            if tar is not None:
+                tar.close()
         os.rmdir(info_dir)
 
     try:
@@ -2509,7 +3195,12 @@ def backup_info(name, with_details=False, human_readable=False):
 
     # Retrieve backup size
     size = info.get("size", 0)
-    if not size:
+    if not size and index is not None:
+        size = index["size"]
+    elif not size and archive_file.endswith(".dedup"):
+        manifest = manifest or _read_dedup_manifest(archive_file)
+        size = sum(entry[8] for entry in manifest["entries"])
+    elif not size:
         tar = tarfile.open(
             archive_file, "r:gz" if archive_file.endswith(".gz") else "r"
         )
@@ -2573,9 +3264,15 @@ def backup_delete(name):
     archive_file = f"{ARCHIVES_PATH}/{name}.tar"
     if not os.path.exists(archive_file) and os.path.exists(archive_file + ".gz"):
         archive_file += ".gz"
+    elif not os.path.exists(archive_file) and os.path.lexists(
+        f"{ARCHIVES_PATH}/{name}.dedup"
+    ):
+        # N.B. : the chunks of the backup are deleted by backup_prune, if they
+        # are not used by other backups
+        archive_file = f"{ARCHIVES_PATH}/{name}.dedup"
     info_file = f"{ARCHIVES_PATH}/{name}.info.json"
 
-    files_to_delete = [archive_file, info_file]
+    files_to_delete = [archive_file, info_file, _archive_index_path(name)]
 
     # To handle the case where archive_file is in fact a symlink
     if os.path.islink(archive_file):
@@ -2596,11 +3293,137 @@ def backup_delete(name):
     logger.success(m18n.n("backup_deleted", name=name))
 
 
+@is_unit_operation(flash=True)
+def backup_prune(keep_last=None):
+    """
+    Delete the oldest backups of the deduplicated repository, then the data
+    which isn't used by the remaining ones
+
+    Keyword arguments:
+        keep_last -- Number of most recent backups of the repository to keep
+
+    """
+
+    if keep_last is not None and keep_last < 0:
+        raise YunohostValidationError("backup_prune_keep_last_negative")
+
+    deleted = []
+    manifests = _list_dedup_manifests()
+    if keep_last is not None:
+        for manifest_file in manifests[: max(len(manifests) - keep_last, 0)]:
+            name = os.path.basename(manifest_file)[: -len(".dedup")]
+            if os.path.lexists(f"{ARCHIVES_PATH}/{name}.dedup"):
+                backup_delete(name)
+            else:
+                os.remove(manifest_file)
+            deleted.append(name)
+
+    # N.B. : the chunks written by a backup in progress aren't referenced by
+    # a manifest yet, but operations can't run at the same time
+    used_chunks = set()
+    for manifest_file in _list_dedup_manifests():
+        for entry in _read_dedup_manifest(manifest_file)["entries"]:
+            if entry[1] == "f":
+                used_chunks.update(entry[-1])
+
+    freed = 0
+    for chunk_file in glob(f"{BACKUP_REPOSITORY_PATH}/chunks/*/*"):
+        # (.tmp files are leftovers of interrupted backups)
+        if os.path.basename(chunk_file) in used_chunks:
+            continue
+        freed += os.path.getsize(chunk_file)
+        os.remove(chunk_file)
+
+    logger.success(
+        m18n.n(
+            "backup_repository_pruned",
+            nb_backups=len(deleted),
+            size=binary_to_human(freed) + "B",
+        )
+    )
+    return {"deleted": deleted, "freed": freed}
+
+
+def backup_check(name=None):
+    """
+    Check that the data used by the backups of the deduplicated repository
+    (or by the given one) is available and not corrupted
+
+    Keyword arguments:
+        name -- Name of the backup to check (all by default)
+
+    """
+    from multiprocessing.pool import ThreadPool
+
+    if name:
+        manifest_file = os.path.realpath(f"{ARCHIVES_PATH}/{name}.dedup")
+        if not os.path.exists(manifest_file):
+            raise YunohostValidationError("backup_archive_name_unknown", name=name)
+        manifests = [manifest_file]
+    else:
+        manifests = _list_dedup_manifests()
+
+    chunks = {}
+    for manifest_file in manifests:
+        backup_name = os.path.basename(manifest_file)[: -len(".dedup")]
+        for entry in _read_dedup_manifest(manifest_file)["entries"]:
+            if entry[1] == "f":
+                for sha256 in entry[-1]:
+                    chunks.setdefault(sha256, set()).add(backup_name)
+
+    def check(sha256):
+        try:
+            _read_dedup_chunk(sha256)
+        except YunohostError as e:
+            logger.debug(str(e))
+            return sha256, False
+        return sha256, True
+
+    with ThreadPool(os.cpu_count() or 1) as pool:
+        broken_chunks = [
+            sha256 for sha256, ok in pool.imap_unordered(check, chunks) if not ok
+        ]
+
+    broken_backups = sorted(
+        {backup for sha256 in broken_chunks for backup in chunks[sha256]}
+    )
+    if broken_chunks:
+        logger.error(
+            m18n.n(
+                "backup_repository_check_failed",
+                nb=len(broken_chunks),
+                backups=", ".join(broken_backups),
+            )
+        )
+    else:
+        logger.success(m18n.n("backup_repository_check_ok", nb=len(chunks)))
+
+    return {
+        "chunks": len(chunks),
+        "broken_chunks": sorted(broken_chunks),
+        "broken_backups": broken_backups,
+    }
+
+
 #
 # Misc helpers                                                              #
 #
 
 
+def _open_stdout_for_archive():
+    """
+    Return a binary file object writing to the standard output, which is then
+    itself redirected to the standard error, such that the messages and the
+    result of the command don't end up in the middle of the archive
+    """
+    import sys
+
+    sys.stdout.flush()
+    fileobj = os.fdopen(os.dup(1), "wb")
+    os.dup2(2, 1)
+    return fileobj
+
+
 def _create_archive_dir():
     """Create the YunoHost archives directory if doesn't exist"""
     if not os.path.isdir(ARCHIVES_PATH):
@@ -2612,6 +3435,353 @@ def _create_archive_dir():
         mkdir(ARCHIVES_PATH, mode=0o770, parents=True, gid="admins")
 
 
+def _archive_index_path(name):
+    if name.endswith(".tar.gz"):
+        name = name[: -len(".tar.gz")]
+    elif name.endswith(".tar"):
+        name = name[: -len(".tar")]
+    return f"{ARCHIVES_PATH}/{name}.index.json"
+
+
+def _read_archive_index(name, archive_file):
+    """
+    Return the index of an archive, c.f. TarBackupMethod._write_archive_index,
+    or None if it has none (e.g. it was created by an older version, or
+    copied from another server) or the index doesn't match the archive
+    """
+
+    index_file = _archive_index_path(name)
+    if not os.path.exists(index_file):
+        return None
+
+    try:
+        with open(index_file) as f:
+            index = json.load(f)
+    except Exception:
+        logger.debug("unable to load '%s'", index_file, exc_info=1)
+        return None
+
+    if index.get("version") != ARCHIVE_INDEX_VERSION or index.get(
+        "archive_size"
+    ) != os.path.getsize(archive_file):
+        logger.debug(f"Ignoring {index_file} which doesn't match the archive")
+        return None
+
+    return index
+
+
+def _iter_archive_index_ranges(archive_file, index, names):
+    """
+    Using the index of an archive, yield a (tar, members) for each part of
+    the archive containing some of the given members. tar is a stream
+    TarFile, starting at the beginning of that part, and members iterates
+    over the wanted members of that part (to be extracted as they come).
+
+    Only those parts of the archive are read, and for a compressed archive,
+    decompression starts from the closest gzip member before each part.
+    """
+
+    import bisect
+    import gzip
+
+    # Parts of the (uncompressed) tar stream to read. Close members are read
+    # in one go, rather than restarting the decompression for each of them
+    ranges = []
+    for name, start, end, _ in index["members"]:
+        if name not in names:
+            continue
+        if ranges and start - ranges[-1][1] < _ArchiveStream.CHUNK_SIZE:
+            ranges[-1][1] = end
+        else:
+            ranges.append([start, end])
+
+    seek_points = index["seek_points"]
+    uncompressed_offsets = [offset for offset, _ in seek_points]
+
+    for start, end in ranges:
+        with open(archive_file, "rb") as f:
+            if index["compression"] == "gzip":
+                i = bisect.bisect_right(uncompressed_offsets, start) - 1
+                uncompressed_offset, compressed_offset = seek_points[i]
+                f.seek(compressed_offset)
+                stream = gzip.GzipFile(fileobj=f, mode="rb")
+                stream.seek(start - uncompressed_offset)
+            else:
+                f.seek(start)
+                stream = f
+
+            with tarfile.open(fileobj=stream, mode="r|") as tar:
+
+                def members():
+                    for tarinfo in tar:
+                        # Offsets are relative to the start of the part
+                        if tarinfo.offset >= end - start:
+                            break
+                        if tarinfo.name in names:
+                            yield tarinfo
+
+                yield tar, members()
+
+
+def _list_dedup_manifests():
+    """Return the manifests of the deduplicated repository, oldest first"""
+    return sorted(
+        glob(f"{BACKUP_REPOSITORY_PATH}/manifests/*.dedup"), key=os.path.getmtime
+    )
+
+
+def _read_dedup_manifest(manifest_file):
+    """
+    Load the manifest of a backup of the deduplicated repository, which
+    entries are lists of:
+
+    path, type ("d", "f" or "l"), mode, uid, gid, user, group, mtime (ns),
+    size, ctime (ns), and the list of chunks (for a file) or the target (for
+    a symlink)
+    """
+
+    try:
+        with open(manifest_file) as f:
+            manifest = json.load(f)
+    except Exception as e:
+        raise YunohostError(
+            "backup_archive_corrupted", archive=manifest_file, error=str(e)
+        )
+
+    if manifest.get("version") != DEDUP_MANIFEST_VERSION:
+        raise YunohostError(
+            "backup_archive_corrupted",
+            archive=manifest_file,
+            error=f"unsupported manifest version {manifest.get('version')}",
+        )
+    return manifest
+
+
+# Chunk boundaries are put after the first run of 20 bytes which all belong to
+# one half of the possible byte values (picked in a fixed, pseudo-random way),
+# i.e. every MB on average for random data. Those boundaries only depend on
+# the content around them, such that adding or removing data in a file only
+# changes the chunks around the modification. And they can be found with
+# bytes.translate() and bytes.find(), instead of looping over each byte.
+_DEDUP_BOUNDARY_TABLE = bytes(
+    hashlib.sha256(bytes([i])).digest()[0] & 1 for i in range(256)
+)
+_DEDUP_BOUNDARY_RUN = b"\x01" * 20
+
+
+def _iter_dedup_chunks(f):
+    """Yield the content-defined chunks of a file"""
+
+    buffer = b""
+    while True:
+        data = f.read(DEDUP_CHUNK_MAX_SIZE)
+        buffer += data
+        while len(buffer) >= DEDUP_CHUNK_MAX_SIZE or (buffer and not data):
+            mask = buffer[:DEDUP_CHUNK_MAX_SIZE].translate(_DEDUP_BOUNDARY_TABLE)
+            boundary = mask.find(
+                _DEDUP_BOUNDARY_RUN, DEDUP_CHUNK_MIN_SIZE - len(_DEDUP_BOUNDARY_RUN)
+            )
+            if boundary == -1:
+                boundary = DEDUP_CHUNK_MAX_SIZE
+            else:
+                boundary += len(_DEDUP_BOUNDARY_RUN)
+            yield buffer[:boundary]
+            buffer = buffer[boundary:]
+        if not data:
+            return
+
+
+def _dedup_chunk_path(sha256):
+    return os.path.join(BACKUP_REPOSITORY_PATH, "chunks", sha256[:2], sha256)
+
+
+def _write_dedup_chunk(chunk_file, chunk):
+    import zlib
+
+    data = zlib.compress(chunk, 3)
+    if not os.path.isdir(os.path.dirname(chunk_file)):
+        os.makedirs(os.path.dirname(chunk_file), mode=0o700, exist_ok=True)
+    with open(chunk_file + ".tmp", "wb") as f:
+        f.write(data)
+    os.replace(chunk_file + ".tmp", chunk_file)
+    return len(data)
+
+
+def _read_dedup_chunk(sha256):
+    import zlib
+
+    try:
+        with open(_dedup_chunk_path(sha256), "rb") as f:
+            chunk = zlib.decompress(f.read())
+    except (IOError, zlib.error) as e:
+        raise YunohostError(
+            "backup_archive_corrupted",
+            archive=BACKUP_REPOSITORY_PATH,
+            error=f"chunk {sha256} : {e}",
+        )
+
+    if hashlib.sha256(chunk).hexdigest() != sha256:
+        raise YunohostError(
+            "backup_archive_corrupted",
+            archive=BACKUP_REPOSITORY_PATH,
+            error=f"chunk {sha256} doesn't match its checksum",
+        )
+    return chunk
+
+
+def _dedup_archive_segments(manifest):
+    """
+    Yield the segments of the tar archive equivalent to a backup of the
+    deduplicated repository, as (length, function yielding its data), such
+    that the size of the archive and the position of each part of it are
+    known without reading any chunk
+    """
+
+    def blocks(data):
+        return lambda: [data]
+
+    def chunks(name, size, sha256s):
+        def read():
+            length = 0
+            for sha256 in sha256s:
+                chunk = _read_dedup_chunk(sha256)
+                length += len(chunk)
+                if length > size:
+                    break
+                yield chunk
+            if length != size:
+                raise YunohostError(
+                    "backup_archive_corrupted",
+                    archive=BACKUP_REPOSITORY_PATH,
+                    error=f"unexpected size of {name}",
+                )
+
+        return read
+
+    types = {"d": tarfile.DIRTYPE, "f": tarfile.REGTYPE, "l": tarfile.SYMTYPE}
+    for entry in manifest["entries"]:
+        name, type_, mode, uid, gid, user, group, mtime, size, _, data = entry
+
+        tarinfo = tarfile.TarInfo(name)
+        tarinfo.type = types[type_]
+        tarinfo.mode = mode
+        tarinfo.uid, tarinfo.gid = uid, gid
+        tarinfo.uname, tarinfo.gname = user or "", group or ""
+        tarinfo.mtime = mtime // 10**9
+        if type_ == "l":
+            tarinfo.linkname = data
+        elif type_ == "f":
+            tarinfo.size = size
+
+        header = tarinfo.tobuf(tarfile.PAX_FORMAT, "utf-8", "surrogateescape")
+        yield len(header), blocks(header)
+        if type_ == "f" and size:
+            yield size, chunks(name, size, data)
+            padding = -size % tarfile.BLOCKSIZE
+            if padding:
+                yield padding, blocks(bytes(padding))
+
+    # End of archive : (at least) two empty blocks
+    yield tarfile.RECORDSIZE, blocks(bytes(tarfile.RECORDSIZE))
+
+
+def _iter_dedup_archive(manifest, start=0, end=None):
+    """
+    Yield the data from start to end (excluded) of the tar archive equivalent
+    to a backup of the deduplicated repository, generated on the fly : only a
+    chunk at a time is kept in memory
+    """
+
+    offset = 0
+    for length, read in _dedup_archive_segments(manifest):
+        if end is not None and offset >= end:
+            return
+        if offset + length <= start:
+            offset += length
+            continue
+
+        for data in read():
+            lower = max(start - offset, 0)
+            upper = len(data) if end is None else min(len(data), end - offset)
+            if upper > lower:
+                yield data[lower:upper]
+            offset += len(data)
+            if end is not None and offset >= end:
+                return
+
+
+@lru_cache(maxsize=None)
+def _user_name(uid):
+    import pwd
+
+    try:
+        return pwd.getpwuid(uid).pw_name
+    except KeyError:
+        return None
+
+
+@lru_cache(maxsize=None)
+def _group_name(gid):
+    import grp
+
+    try:
+        return grp.getgrgid(gid).gr_name
+    except KeyError:
+        return None
+
+
+def _restore_dedup_entries(manifest, names, path):
+    """
+    Recreate in path the entries of a manifest which are in names. Like
+    tarfile, owners are restored by name if they exist, by id otherwise.
+    """
+    import grp
+    import pwd
+
+    def owner(uid, gid, user, group):
+        try:
+            uid = pwd.getpwnam(user).pw_uid if user else uid
+        except KeyError:
+            pass
+        try:
+            gid = grp.getgrnam(group).gr_gid if group else gid
+        except KeyError:
+            pass
+        return uid, gid
+
+    directories = []
+    for entry in manifest["entries"]:
+        name, type_, mode, uid, gid, user, group, mtime, _, _, data = entry
+        if name not in names:
+            continue
+
+        target = os.path.join(path, name)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        uid, gid = owner(uid, gid, user, group)
+        if type_ == "d":
+            os.makedirs(target, exist_ok=True)
+            directories.append((target, mode, uid, gid, mtime))
+            continue
+        elif type_ == "l":
+            os.symlink(data, target)
+            os.lchown(target, uid, gid)
+            continue
+
+        with open(target, "wb") as f:
+            for sha256 in data:
+                f.write(_read_dedup_chunk(sha256))
+        os.chown(target, uid, gid)
+        os.chmod(target, mode)
+        os.utime(target, ns=(mtime, mtime))
+
+    # Like tarfile, the attributes of the folders are set at the end (adding
+    # files to a folder changes its mtime), the deepest ones first
+    for target, mode, uid, gid, mtime in reversed(directories):
+        os.chown(target, uid, gid)
+        os.chmod(target, mode)
+        os.utime(target, ns=(mtime, mtime))
+
+
 def _call_for_each_path(self, callback, csv_path=None):
     """Call a callback for each path in csv"""
     if csv_path is None:
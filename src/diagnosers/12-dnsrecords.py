@@ -37,6 +37,7 @@ from yunohost.domain import _get_maindomain, domain_list
 from yunohost.utils.dns import (
     YNH_DYNDNS_DOMAINS,
     dig,
+    dig_many,
     is_special_use_tld,
     is_yunohost_dyndns_domain,
 )
@@ -53,12 +54,37 @@ class MyDiagnoser(Diagnoser):
         main_domain = _get_maindomain()
 
         major_domains = domain_list(exclude_subdomains=True)["domains"]
+
+        # Compute the expected conf of every domain first, such that all the
+        # records can be fetched at once and concurrently, instead of doing
+        # one dig after the other
+        expected_configurations = {}
+        for domain in major_domains:
+            if is_special_use_tld(domain):
+                continue
+            base_dns_zone = _get_dns_zone_for_domain(domain)
+            expected_configurations[domain] = (
+                base_dns_zone,
+                _build_dns_conf(domain, include_empty_AAAA_if_no_ipv6=True),
+            )
+
+        dig_many(
+            [
+                (fqdn, r["type"])
+                for domain, (base_dns_zone, conf) in expected_configurations.items()
+                for records in conf.values()
+                for r, fqdn in self.records_to_check(domain, base_dns_zone, records)
+            ],
+            resolvers="force_external",
+        )
+
         for domain in major_domains:
             logger.debug("Diagnosing DNS conf for %s" % domain)
 
             for report in self.check_domain(
                 domain,
                 domain == main_domain,
+                *expected_configurations.get(domain, (None, None)),
             ):
                 yield report
 
@@ -76,7 +102,25 @@ class MyDiagnoser(Diagnoser):
         for report in self.check_expiration_date(domains_from_registrar):
             yield report
 
-    def check_domain(self, domain, is_main_domain):
+    def records_to_check(self, domain, base_dns_zone, records):
+        for r in records:
+            fqdn = r["name"] + "." + base_dns_zone if r["name"] != "@" else domain
+
+            # Ugly hack to not check mail records for subdomains stuff,
+            # otherwise will end up in a shitstorm of errors for people with many subdomains...
+            # Should find a cleaner solution in the suggested conf...
+            if r["type"] in ["MX", "TXT"] and fqdn not in [
+                domain,
+                f"mail._domainkey.{domain}",
+                f"_dmarc.{domain}",
+            ]:
+                continue
+
+            yield r, fqdn
+
+    def check_domain(
+        self, domain, is_main_domain, base_dns_zone=None, expected_configuration=None
+    ):
         if is_special_use_tld(domain):
             yield dict(
                 meta={"domain": domain},
@@ -86,12 +130,14 @@ class MyDiagnoser(Diagnoser):
             )
             return
 
-        base_dns_zone = _get_dns_zone_for_domain(domain)
+        if base_dns_zone is None:
+            base_dns_zone = _get_dns_zone_for_domain(domain)
         basename = _get_relative_name_for_dns_zone(domain, base_dns_zone)
 
-        expected_configuration = _build_dns_conf(
-            domain, include_empty_AAAA_if_no_ipv6=True
-        )
+        if expected_configuration is None:
+            expected_configuration = _build_dns_conf(
+                domain, include_empty_AAAA_if_no_ipv6=True
+            )
 
         categories = ["basic", "mail", "extra"]
 
@@ -100,19 +146,8 @@ class MyDiagnoser(Diagnoser):
             discrepancies = []
             results = {}
 
-            for r in records:
+            for r, fqdn in self.records_to_check(domain, base_dns_zone, records):
                 id_ = r["type"] + ":" + r["name"]
-                fqdn = r["name"] + "." + base_dns_zone if r["name"] != "@" else domain
-
-                # Ugly hack to not check mail records for subdomains stuff,
-                # otherwise will end up in a shitstorm of errors for people with many subdomains...
-                # Should find a cleaner solution in the suggested conf...
-                if r["type"] in ["MX", "TXT"] and fqdn not in [
-                    domain,
-                    f"mail._domainkey.{domain}",
-                    f"_dmarc.{domain}",
-                ]:
-                    continue
 
                 r["current"] = self.get_current_record(fqdn, r["type"])
                 if r["value"] == "@":
@@ -179,7 +214,7 @@ class MyDiagnoser(Diagnoser):
             yield output
 
     def get_current_record(self, fqdn, type_):
-        success, answers = dig(fqdn, type_, resolvers="force_external")
+        success, answers = dig(fqdn, type_, resolvers="force_external", cache=True)
 
         if success != "ok":
             return None
@@ -248,8 +283,8 @@ class MyDiagnoser(Diagnoser):
             expire_date = self.get_domain_expiration(domain)
 
             if isinstance(expire_date, str):
-                status_ns, _ = dig(domain, "NS", resolvers="force_external")
-                status_a, _ = dig(domain, "A", resolvers="force_external")
+                status_ns, _ = dig(domain, "NS", resolvers="force_external", cache=True)
+                status_a, _ = dig(domain, "A", resolvers="force_external", cache=True)
                 if "ok" not in [status_ns, status_a]:
                     # i18n: diagnosis_domain_not_found_details
                     details["not_found"].append(
@@ -30,6 +30,8 @@ class MyDiagnoser(Diagnoser):
     id_ = os.path.splitext(os.path.basename(__file__))[0].split("-")[1]
     cache_duration = 600
     dependencies: List[str] = ["ip"]
+    # c.f. the dnsrecords report read to know whether IPv6 matters
+    run_after: List[str] = ["dnsrecords"]
 
     def run(self):
         # TODO: report a warning if port 53 or 5353 is exposed to the outside world...
@@ -31,7 +31,7 @@ import dns.resolver
 from yunohost.diagnosis import Diagnoser
 from yunohost.domain import _get_maindomain, domain_list
 from yunohost.settings import settings_get
-from yunohost.utils.dns import dig
+from yunohost.utils.dns import dig, dig_many
 
 DEFAULT_DNS_BLACKLIST = "/usr/share/yunohost/dnsbl_list.yml"
 
@@ -172,7 +172,7 @@ class MyDiagnoser(Diagnoser):
                 query += ".ip6.arpa"
 
             # Do the DNS Query
-            status, value = dig(query, "PTR", resolvers="force_external")
+            status, value = dig(query, "PTR", resolvers="force_external", cache=True)
             if status == "nok":
                 yield dict(
                     meta={"test": "mail_fcrdns", "ipversion": ipversion},
@@ -209,6 +209,7 @@ class MyDiagnoser(Diagnoser):
         """
 
         dns_blacklists = read_yaml(DEFAULT_DNS_BLACKLIST)
+        checks = []
         for item in self.ips + self.mail_domains:
             for blacklist in dns_blacklists:
                 item_type = "domain"
@@ -226,40 +227,44 @@ class MyDiagnoser(Diagnoser):
                     rev = dns.reversename.from_address(item)
                     subdomain = str(rev.split(3)[0])
                 query = subdomain + "." + blacklist["dns_server"]
+                checks.append((item, blacklist, query))
 
-                # Do the DNS Query
-                status, answers = dig(query, "A")
-                if status != "ok" or (
-                    answers
-                    and set(answers) <= set(blacklist["non_blacklisted_return_code"])
-                ):
-                    continue
+        # Do the DNS Queries, all at once
+        answers_by_query = dig_many([(query, "A") for _, _, query in checks])
 
-                # Try to get the reason
-                details = []
-                status, answers = dig(query, "TXT")
-                reason = "-"
-                if status == "ok":
-                    reason = ", ".join(answers)
-                    details.append("diagnosis_mail_blacklist_reason")
+        for item, blacklist, query in checks:
+            status, answers = answers_by_query[(query, "A")]
+            if status != "ok" or (
+                answers
+                and set(answers) <= set(blacklist["non_blacklisted_return_code"])
+            ):
+                continue
 
-                details.append("diagnosis_mail_blacklist_website")
+            # Try to get the reason
+            details = []
+            status, answers = dig(query, "TXT", cache=True)
+            reason = "-"
+            if status == "ok":
+                reason = ", ".join(answers)
+                details.append("diagnosis_mail_blacklist_reason")
 
-                yield dict(
-                    meta={
-                        "test": "mail_blacklist",
-                        "item": item,
-                        "blacklist": blacklist["dns_server"],
-                    },
-                    data={
-                        "blacklist_name": blacklist["name"],
-                        "blacklist_website": blacklist["website"],
-                        "reason": reason,
-                    },
-                    status="ERROR",
-                    summary="diagnosis_mail_blacklist_listed_by",
-                    details=details,
-                )
+            details.append("diagnosis_mail_blacklist_website")
+
+            yield dict(
+                meta={
+                    "test": "mail_blacklist",
+                    "item": item,
+                    "blacklist": blacklist["dns_server"],
+                },
+                data={
+                    "blacklist_name": blacklist["name"],
+                    "blacklist_website": blacklist["website"],
+                    "reason": reason,
+                },
+                status="ERROR",
+                summary="diagnosis_mail_blacklist_listed_by",
+                details=details,
+            )
 
     def check_queue(self):
         """
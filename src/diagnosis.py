@@ -18,12 +18,17 @@
 # along with this program. If not, see <http://www.gnu.org/licenses/>.
 #
 
+import copy
 import glob
+import json
 import os
 import re
+import tempfile
+import threading
 import time
 from importlib import import_module
 from logging import getLogger
+from typing import Any, Dict, List, Tuple
 
 from moulinette import Moulinette, m18n
 from moulinette.utils.filesystem import (
@@ -41,6 +46,21 @@ logger = getLogger("yunohost.diagnosis")
 DIAGNOSIS_CACHE = "/var/cache/yunohost/diagnosis/"
 DIAGNOSIS_CONFIG_FILE = "/etc/yunohost/diagnosis.yml"
 DIAGNOSIS_SERVER = "diagnosis.yunohost.org"
+# Max number of diagnosers running at the same time, can be overriden with
+# a 'concurrency' key in DIAGNOSIS_CONFIG_FILE
+DIAGNOSIS_CONCURRENCY = 4
+
+# Reports, as loaded from DIAGNOSIS_CACHE : id -> (mtime, report, items by meta)
+# c.f. _get_diagnosis_report
+diagnosis_reports_cache: Dict[str, Tuple[float, Dict[str, Any], Dict[str, Any]]] = {}
+# Rendered summaries / details : (locale, remove_html_tags, key, args) -> str
+# c.f. Diagnoser.i18n
+diagnosis_rendered_strings_cache: Dict[Tuple[str, bool, str, str], str] = {}
+DIAGNOSIS_RENDERED_STRINGS_CACHE_SIZE = 4096
+
+# c.f. Diagnoser.remote_diagnosis
+_forced_ipversion = threading.local()
+_getaddrinfo_patch_lock = threading.Lock()
 
 
 def diagnosis_list():
@@ -103,6 +123,7 @@ def diagnosis_show(
         if not full:
             del report["timestamp"]
             del report["cached_for"]
+            report.pop("duration", None)
             report["items"] = [item for item in report["items"] if not item["ignored"]]
             for item in report["items"]:
                 del item["meta"]
@@ -181,36 +202,24 @@ def diagnosis_run(
 
     operation_logger.start()
 
+    concurrency = _diagnosis_read_configuration().get(
+        "concurrency", DIAGNOSIS_CONCURRENCY
+    )
+    results = _run_diagnosers(categories, force=force, concurrency=concurrency)
+
     issues = []
-    # Call the hook ...
-    diagnosed_categories = []
     for category in categories:
-        logger.debug(f"Running diagnosis for {category} ...")
-
-        diagnoser = _load_diagnoser(category)
-
-        try:
-            code, report = diagnoser.diagnose(force=force)
-        except Exception:
-            import traceback
-
-            logger.error(
-                m18n.n(
-                    "diagnosis_failed_for_category",
-                    category=category,
-                    error="\n" + traceback.format_exc(),
-                )
+        if results[category] is None:
+            continue
+        code, report = results[category]
+        if report != {}:
+            issues.extend(
+                [
+                    item
+                    for item in report["items"]
+                    if item["status"] in ["WARNING", "ERROR"]
+                ]
             )
-        else:
-            diagnosed_categories.append(category)
-            if report != {}:
-                issues.extend(
-                    [
-                        item
-                        for item in report["items"]
-                        if item["status"] in ["WARNING", "ERROR"]
-                    ]
-                )
 
     if email:
         _email_diagnosis_issues()
@@ -371,6 +380,40 @@ def issue_matches_criterias(issue, criterias):
     return True
 
 
+def _diagnosis_meta_key(meta):
+    return json.dumps(meta, sort_keys=True, default=str)
+
+
+def _get_diagnosis_report(id_):
+    """
+    Return the (mtime, report, items indexed by meta) of the cached report of
+    a category, or None if it never ran. Reports are only (re)loaded from disk
+    when their file changed. The returned objects are shared, and should not
+    be modified.
+    """
+
+    cache_file = Diagnoser.cache_file(id_)
+    try:
+        mtime = os.path.getmtime(cache_file)
+    except FileNotFoundError:
+        diagnosis_reports_cache.pop(id_, None)
+        return None
+
+    cached = diagnosis_reports_cache.get(id_)
+    if cached is None or cached[0] != mtime:
+        cached = _index_diagnosis_report(mtime, read_json(cache_file))
+        diagnosis_reports_cache[id_] = cached
+    return cached
+
+
+def _index_diagnosis_report(mtime, report):
+    index: Dict[str, Any] = {}
+    for item in report["items"]:
+        # Several items may have the same meta, the first one wins
+        index.setdefault(_diagnosis_meta_key(item.get("meta")), item)
+    return (mtime, report, index)
+
+
 def add_ignore_flag_to_issues(report):
     """
     Iterate over issues in a report, and flag them as ignored if they match an
@@ -398,6 +441,11 @@ def add_ignore_flag_to_issues(report):
 
 
 class Diagnoser:
+    # Categories which, when diagnosed at the same time, have to be done before
+    # this one because it reads their report, yet without preventing this one
+    # to run if they have errors (unlike dependencies)
+    run_after: List[str] = []
+
     def __init__(self):
         self.cache_file = Diagnoser.cache_file(self.id_)
         self.description = Diagnoser.get_description(self.id_)
@@ -409,8 +457,24 @@ class Diagnoser:
 
     def write_cache(self, report):
         if not os.path.exists(DIAGNOSIS_CACHE):
-            os.makedirs(DIAGNOSIS_CACHE)
-        return write_to_json(self.cache_file, report)
+            os.makedirs(DIAGNOSIS_CACHE, exist_ok=True)
+
+        # Write to a temporary file first, such that readers never see a
+        # partially written report
+        fd, tmp = tempfile.mkstemp(dir=DIAGNOSIS_CACHE, prefix=f".{self.id_}.")
+        os.close(fd)
+        try:
+            write_to_json(tmp, report)
+            os.chmod(tmp, 0o644)
+            os.replace(tmp, self.cache_file)
+        except Exception:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+
+        diagnosis_reports_cache[self.id_] = _index_diagnosis_report(
+            os.path.getmtime(self.cache_file), copy.deepcopy(report)
+        )
 
     def diagnose(self, force=False):
         if not force and self.cached_time_ago() < self.cache_duration:
@@ -440,13 +504,20 @@ class Diagnoser:
                 )
                 return 1, {}
 
+        start = time.time()
         items = list(self.run())
+        duration = round(time.time() - start, 3)
 
         for item in items:
             if "details" in item and not item["details"]:
                 del item["details"]
 
-        new_report = {"id": self.id_, "cached_for": self.cache_duration, "items": items}
+        new_report = {
+            "id": self.id_,
+            "cached_for": self.cache_duration,
+            "duration": duration,
+            "items": items,
+        }
 
         logger.debug(f"Updating cache {self.cache_file}")
         self.write_cache(new_report)
@@ -525,22 +596,26 @@ class Diagnoser:
 
     @staticmethod
     def get_cached_report(id_, item=None, warn_if_no_cache=True):
-        cache_file = Diagnoser.cache_file(id_)
-        if not os.path.exists(cache_file):
+        cached = _get_diagnosis_report(id_)
+        if cached is None:
             if warn_if_no_cache:
                 logger.warning(m18n.n("diagnosis_no_cache", category=id_))
-            report = {"id": id_, "cached_for": -1, "timestamp": -1, "items": []}
-        else:
-            report = read_json(cache_file)
-            report["timestamp"] = int(os.path.getmtime(cache_file))
+            return (
+                {}
+                if item
+                else {"id": id_, "cached_for": -1, "timestamp": -1, "items": []}
+            )
 
+        mtime, report, index = cached
         if item:
-            for report_item in report["items"]:
-                if report_item.get("meta") == item:
-                    return report_item
-            return {}
-        else:
-            return report
+            return copy.deepcopy(index.get(_diagnosis_meta_key(item), {}))
+
+        # Callers (e.g. diagnosis_show) add, replace or delete the keys of the
+        # report and its items, but never modify the values in place
+        report = dict(report)
+        report["items"] = [dict(report_item) for report_item in report["items"]]
+        report["timestamp"] = int(mtime)
+        return report
 
     @staticmethod
     def get_description(id_):
@@ -558,6 +633,9 @@ class Diagnoser:
 
         report["description"] = Diagnoser.get_description(report["id"])
 
+        remove_html_tags = Moulinette.interface.type != "api" or force_remove_html_tags
+        html_tags = re.compile(r"<[^>]+>")
+
         for item in report["items"]:
             # For the summary and each details, we want to call
             # m18n() on the string, with the appropriate data for string
@@ -569,15 +647,26 @@ class Diagnoser:
             meta_data = item.get("meta", {}).copy()
             meta_data.update(item.get("data", {}))
 
-            html_tags = re.compile(r"<[^>]+>")
-
             def m18n_(info):
                 if not isinstance(info, tuple) and not isinstance(info, list):
                     info = (info, {})
-                info[1].update(meta_data)
-                s = m18n.n(info[0], **(info[1]))
+                # N.B. : the report may be shared with the reports cache,
+                # hence we don't update info[1] in place
+                args = dict(info[1])
+                args.update(meta_data)
+
+                cache_key = (
+                    m18n.locale,
+                    remove_html_tags,
+                    info[0],
+                    json.dumps(args, sort_keys=True, default=str),
+                )
+                if cache_key in diagnosis_rendered_strings_cache:
+                    return diagnosis_rendered_strings_cache[cache_key]
+
+                s = m18n.n(info[0], **args)
                 # In cli, we remove the html tags
-                if Moulinette.interface.type != "api" or force_remove_html_tags:
+                if remove_html_tags:
                     s = s.replace("<cmd>", "'").replace("</cmd>", "'")
                     s = html_tags.sub("", s.replace("<br>", "\n"))
                 else:
@@ -588,6 +677,13 @@ class Diagnoser:
                     s = s.replace(
                         "<a href=", "<a target='_blank' rel='noopener noreferrer' href="
                     )
+
+                if (
+                    len(diagnosis_rendered_strings_cache)
+                    >= DIAGNOSIS_RENDERED_STRINGS_CACHE_SIZE
+                ):
+                    diagnosis_rendered_strings_cache.clear()
+                diagnosis_rendered_strings_cache[cache_key] = s
                 return s
 
             item["summary"] = m18n_(item["summary"])
@@ -605,28 +701,31 @@ class Diagnoser:
         # Monkey patch socket.getaddrinfo to force request() to happen in ipv4
         # or 6 ...
         # Inspired by https://stackoverflow.com/a/50044152
-        old_getaddrinfo = socket.getaddrinfo
-
-        def getaddrinfo_ipv4_only(*args, **kwargs):
-            responses = old_getaddrinfo(*args, **kwargs)
-            return [response for response in responses if response[0] == socket.AF_INET]
-
-        def getaddrinfo_ipv6_only(*args, **kwargs):
-            responses = old_getaddrinfo(*args, **kwargs)
-            return [
-                response for response in responses if response[0] == socket.AF_INET6
-            ]
+        # N.B. : the forced ip version is per-thread, since diagnosers may run
+        # concurrently (c.f. _run_diagnosers), hence the patch is only done once
+        # and never reverted
+        with _getaddrinfo_patch_lock:
+            if not getattr(socket.getaddrinfo, "honors_forced_ipversion", False):
+                old_getaddrinfo = socket.getaddrinfo
+
+                def getaddrinfo_with_forced_ipversion(*args, **kwargs):
+                    responses = old_getaddrinfo(*args, **kwargs)
+                    family = {4: socket.AF_INET, 6: socket.AF_INET6}.get(
+                        getattr(_forced_ipversion, "value", None)
+                    )
+                    if family is None:
+                        return responses
+                    return [response for response in responses if response[0] == family]
 
-        if ipversion == 4:
-            socket.getaddrinfo = getaddrinfo_ipv4_only
-        elif ipversion == 6:
-            socket.getaddrinfo = getaddrinfo_ipv6_only
+                getaddrinfo_with_forced_ipversion.honors_forced_ipversion = True  # type: ignore[attr-defined]
+                socket.getaddrinfo = getaddrinfo_with_forced_ipversion
 
         url = f"https://{DIAGNOSIS_SERVER}/{uri}"
+        _forced_ipversion.value = ipversion
         try:
             r = requests.post(url, json=data, timeout=timeout)
         finally:
-            socket.getaddrinfo = old_getaddrinfo
+            _forced_ipversion.value = None
 
         if r.status_code not in [200, 400]:
             raise Exception(
@@ -645,6 +744,89 @@ class Diagnoser:
         return r
 
 
+def _run_diagnosers(categories, force=False, concurrency=DIAGNOSIS_CONCURRENCY):
+    """
+    Run the diagnosers of the given categories in a pool of threads (most of
+    them are just waiting for DNS or the remote diagnosis server). A diagnoser
+    is only started once the categories it depends on or has to run after, if
+    they are also to be run, are done, since it relies on their freshly cached
+    report.
+
+    Returns a dict category -> (code, report), or None if the diagnoser crashed
+    """
+    import functools
+    import queue
+    import traceback
+    from multiprocessing.pool import ThreadPool
+
+    diagnosers = {category: _load_diagnoser(category) for category in categories}
+    waiting_for = {
+        category: {
+            dep
+            for dep in diagnosers[category].dependencies
+            + diagnosers[category].run_after
+            if dep in diagnosers
+        }
+        for category in categories
+    }
+
+    def run(category):
+        logger.debug(f"Running diagnosis for {category} ...")
+        start = time.time()
+        try:
+            result = diagnosers[category].diagnose(force=force)
+        except Exception:
+            logger.error(
+                m18n.n(
+                    "diagnosis_failed_for_category",
+                    category=category,
+                    error="\n" + traceback.format_exc(),
+                )
+            )
+            result = None
+        logger.debug(f"Diagnosis for {category} took {round(time.time() - start, 3)}s")
+        return category, result
+
+    def crashed(category, e):
+        # e.g. logging the error failed, the main loop still has to know it's
+        # done, otherwise it waits forever
+        try:
+            logger.error(
+                m18n.n("diagnosis_failed_for_category", category=category, error=e)
+            )
+        finally:
+            finished.put((category, None))
+
+    results = {}
+    finished: queue.Queue = queue.Queue()
+    running = 0
+    with ThreadPool(max(1, int(concurrency))) as pool:
+        while waiting_for or running:
+            ready = [category for category, deps in waiting_for.items() if not deps]
+            if not ready and not running:
+                raise YunohostError(
+                    f"Circular dependencies between diagnosers {', '.join(waiting_for)}",
+                    raw_msg=True,
+                )
+            for category in ready:
+                del waiting_for[category]
+                pool.apply_async(
+                    run,
+                    (category,),
+                    callback=finished.put,
+                    error_callback=functools.partial(crashed, category),
+                )
+                running += 1
+
+            category, result = finished.get()
+            running -= 1
+            results[category] = result
+            for deps in waiting_for.values():
+                deps.discard(category)
+
+    return results
+
+
 def _list_diagnosis_categories():
     paths = glob.glob(os.path.dirname(__file__) + "/diagnosers/??-*.py")
     names = [
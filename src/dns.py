@@ -31,6 +31,7 @@ from moulinette.utils.filesystem import mkdir, read_file, read_toml, write_to_fi
 from yunohost.domain import (
     _assert_domain_exists,
     _get_domain_settings,
+    _get_domains_settings,
     _get_parent_domain_of,
     _list_subdomains_of,
     _set_domain_settings,
@@ -148,10 +149,7 @@ def _build_dns_conf(base_domain, include_empty_AAAA_if_no_ipv6=False):
     else:
         subdomains = _list_subdomains_of(base_domain)
 
-    domains_settings = {
-        domain: domain_config_get(domain, export=True)
-        for domain in [base_domain] + subdomains
-    }
+    domains_settings = _get_domains_settings([base_domain] + subdomains)
 
     base_dns_zone = _get_dns_zone_for_domain(base_domain)
 
@@ -417,13 +415,23 @@ def _get_dns_zone_for_domain(domain):
     # We don't wan't to do A NS request on the tld
     for parent in parent_list[0:-1]:
         # Check if there's a NS record for that domain
-        answer = dig(parent, rdtype="NS", full_answers=True, resolvers="force_external")
+        answer = dig(
+            parent,
+            rdtype="NS",
+            full_answers=True,
+            resolvers="force_external",
+            cache=True,
+        )
 
         if answer[0] != "ok":
             # Some domains have a SOA configured but NO NS record !!!
             # See https://github.com/YunoHost/issues/issues/1980
             answer = dig(
-                parent, rdtype="SOA", full_answers=True, resolvers="force_external"
+                parent,
+                rdtype="SOA",
+                full_answers=True,
+                resolvers="force_external",
+                cache=True,
             )
 
         if answer[0] == "ok":
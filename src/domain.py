@@ -23,7 +23,7 @@ import time
 from collections import OrderedDict
 from logging import getLogger
 from pathlib import Path
-from typing import TYPE_CHECKING, Any, List, Optional, Union
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple, Union
 
 from moulinette import Moulinette, m18n
 from moulinette.core import MoulinetteError
@@ -60,6 +60,10 @@ main_domain_cache: Optional[str] = None
 main_domain_cache_timestamp = 0
 DOMAIN_CACHE_DURATION = 15
 
+# Defaulted feature settings of each domain, along with the mtimes of the files
+# they're read from, c.f. _get_domains_settings
+domains_settings_cache: Dict[str, Tuple[Tuple, dict]] = {}
+
 
 def _get_maindomain():
     global main_domain_cache
@@ -146,12 +150,12 @@ def domain_list(exclude_subdomains=False, tree=False, features=[]):
     main = _get_maindomain()
 
     if features:
-        domains_filtered = []
-        for domain in domains:
-            config = domain_config_get(domain, key="feature", export=True)
-            if any(config.get(feature) == 1 for feature in features):
-                domains_filtered.append(domain)
-        domains = domains_filtered
+        domains_settings = _get_domains_settings(domains)
+        domains = [
+            domain
+            for domain in domains
+            if any(domains_settings[domain].get(feature) == 1 for feature in features)
+        ]
 
     if not tree:
         return {"domains": domains, "main": main}
@@ -335,6 +339,7 @@ def domain_add(
         finally:
             global domain_list_cache
             domain_list_cache = []
+            domains_settings_cache.pop(domain, None)
 
         # Don't regen these conf if we're still in postinstall
         if os.path.exists("/etc/yunohost/installed"):
@@ -512,6 +517,7 @@ def domain_remove(
     finally:
         global domain_list_cache
         domain_list_cache = []
+        domains_settings_cache.pop(domain, None)
 
     # If a password is provided, delete the DynDNS record
     if dyndns:
@@ -676,6 +682,43 @@ def _get_raw_domain_settings(domain):
     return {}
 
 
+def _get_domains_settings(domains=None):
+    """
+    Get the settings of the 'feature' panel of several domains (all domains by
+    default), with default values included, i.e. what
+    `domain config get <domain> feature --export` returns.
+
+    The 'dns' and 'cert' panels are left out since building them implies
+    querying the registrar and certificate status of each domain.
+
+    Results are cached per domain and invalidated when the settings files
+    change, such that building the conf of N domains doesn't imply N config
+    panels builds each time.
+    """
+
+    if domains is None:
+        domains = _get_domains()
+
+    result = {}
+    for domain in domains:
+        # NB: those correspond to save_path_tpl and the custom css handled in DomainConfigPanel
+        mtimes = tuple(
+            os.path.getmtime(path) if os.path.exists(path) else None
+            for path in [
+                f"{DOMAIN_SETTINGS_DIR}/{domain}.yml",
+                f"/usr/share/yunohost/portal/customassets/{domain}.custom.css",
+            ]
+        )
+        cached = domains_settings_cache.get(domain)
+        if cached is None or cached[0] != mtimes:
+            cached = (mtimes, domain_config_get(domain, key="feature", export=True))
+            domains_settings_cache[domain] = cached
+
+        result[domain] = dict(cached[1])
+
+    return result
+
+
 def domain_config_get(domain, key="", full=False, export=False):
     """
     Display a domain configuration
@@ -729,8 +772,10 @@ def _get_DomainConfigPanel():
             # TODO add mechanism to share some settings with other domains on the same zone
             raw_config = super()._get_raw_config()
 
-            any_filter = all(self.filter_key)
             panel_id, section_id, option_id = self.filter_key
+            # Filtering on any panel (e.g. 'feature', as _get_domains_settings
+            # does) is enough to skip building the dns and cert panels
+            any_filter = panel_id is not None
 
             # Portal settings are only available on "topest" domains
             if _get_parent_domain_of(self.entity, topest=True) is not None:
@@ -902,6 +947,7 @@ def _get_DomainConfigPanel():
             super()._apply(
                 form, config, previous_settings, exclude={"recovery_password"}
             )
+            domains_settings_cache.pop(self.entity, None)
 
             # Also remove `managed_dns_records_hashes` in settings which are not handled by the config panel
             if remove_auto_dns_feature:
@@ -322,6 +322,7 @@ def hook_exec(
     env=None,
     user="root",
     return_format="yaml",
+    log_prefix="",
 ):
     """
     Execute hook from a file with arguments
@@ -333,6 +334,8 @@ def hook_exec(
         chdir -- The directory from where the script will be executed
         env -- Dictionnary of environment variables to export
         user -- User with which to run the command
+        log_prefix -- Prepended to each line of output of the script, to tell
+                      apart the output of scripts running concurrently
     """
 
     # Validate hook path
@@ -391,13 +394,13 @@ def hook_exec(
 
     # Define output loggers and call command
     loggers = (
-        lambda l: logger.debug(l.rstrip() + "\r"),
+        lambda l: logger.debug(log_prefix + l.rstrip() + "\r"),
         lambda l: (
-            logger.warning(l.rstrip())
+            logger.warning(log_prefix + l.rstrip())
             if is_relevant_warning(l.rstrip())
-            else logger.debug(l.rstrip())
+            else logger.debug(log_prefix + l.rstrip())
         ),
-        lambda l: logger.info(l.rstrip()),
+        lambda l: logger.info(log_prefix + l.rstrip()),
     )
 
     # Check the type of the hook (bash by default)
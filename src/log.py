@@ -22,11 +22,12 @@ import copy
 import glob
 import os
 import re
+import sqlite3
 import time
-from datetime import datetime, timedelta
+from datetime import datetime
 from logging import FileHandler, getLogger, Formatter, INFO
 from io import IOBase
-from typing import List, Any
+from typing import List
 
 import psutil
 import yaml
@@ -41,6 +42,8 @@ from yunohost.utils.system import get_ynh_package_version
 logger = getLogger("yunohost.log")
 
 OPERATIONS_PATH = "/var/log/yunohost/operations/"
+OPERATIONS_INDEX_PATH = OPERATIONS_PATH + ".index.db"
+OPERATIONS_INDEX_VERSION = 1
 
 BORING_LOG_LINES = [
     r"set [+-]x$",
@@ -82,59 +85,80 @@ BORING_LOG_LINES = [
 ]
 
 
-def _update_log_cache_symlinks():
+def _operations_index():
+    """
+    Open the operation log index, which is a small SQLite database keeping
+    track of the name, parent, status and author of every operation, such that
+    log_list doesn't have to glob/stat/parse all the metadata files each time
+    """
 
-    one_year_ago = time.time() - 365 * 24 * 3600
+    if not os.path.exists(OPERATIONS_PATH):
+        os.makedirs(OPERATIONS_PATH)
 
-    logs = glob.iglob(OPERATIONS_PATH + "*.yml")
-    for log_md in logs:
-        if os.path.getctime(log_md) < one_year_ago:
-            # Let's ignore files older than one year because hmpf reading a shitload of yml is not free
-            continue
+    db = sqlite3.connect(OPERATIONS_INDEX_PATH, timeout=10)
+    db.execute(
+        "CREATE TABLE IF NOT EXISTS operations ("
+        "name TEXT PRIMARY KEY, parent TEXT, success INTEGER, started_by TEXT, ctime REAL)"
+    )
+    db.execute(
+        "CREATE INDEX IF NOT EXISTS operations_parent ON operations (parent, name)"
+    )
+    return db
 
-        name = log_md.split("/")[-1][: -len(".yml")]
-        parent_symlink = os.path.join(OPERATIONS_PATH, f".{name}.parent.yml")
-        success_symlink = os.path.join(OPERATIONS_PATH, f".{name}.success")
-        if os.path.islink(parent_symlink) and (
-            os.path.islink(success_symlink)
-            and os.path.getmtime(success_symlink) < os.path.getmtime(log_md)
-        ):
-            continue
 
-        try:
-            metadata = (
-                read_yaml(log_md) or {}
-            )  # Making sure this is a dict and not  None..?
-        except Exception as e:
-            # If we can't read the yaml for some reason, report an error and ignore this entry...
-            logger.error(m18n.n("log_corrupted_md_file", md_file=log_md, error=e))
-            continue
-
-        if not os.path.islink(success_symlink) or os.path.getctime(
-            success_symlink
-        ) > os.path.getctime(log_md):
-            success = metadata.get("success", "?")
-            if success is True:
-                success_target = "/usr/bin/true"
-            elif success is False:
-                success_target = "/usr/bin/false"
-            else:
-                success_target = "/dev/null"
-            try:
-                os.symlink(success_target, success_symlink)
-            except Exception as e:
-                logger.warning(f"Failed to create symlink {parent_symlink} ? {e}")
+def _index_operation(db, name, metadata, ctime):
 
-        if not os.path.islink(parent_symlink):
-            parent = metadata.get("parent")
-            parent = parent + ".yml" if parent else "/dev/null"
-            try:
-                os.symlink(parent, parent_symlink)
-            except Exception as e:
-                logger.warning(f"Failed to create symlink {parent_symlink} ? {e}")
+    success = metadata.get("success", "?")
+    db.execute(
+        "INSERT OR REPLACE INTO operations VALUES (?, ?, ?, ?, ?)",
+        (
+            name,
+            metadata.get("parent"),
+            success if isinstance(success, bool) else None,
+            metadata.get("started_by"),
+            ctime,
+        ),
+    )
 
 
-log_list_cache: dict[str, dict[str, Any]] = {}
+def _success_from_index(success):
+    return "?" if success is None else bool(success)
+
+
+def log_rebuild_index():
+    """
+    Rebuild the operation log index from the metadata files
+    """
+
+    db = _operations_index()
+    try:
+        with db:
+            db.execute("DELETE FROM operations")
+            for md_path in glob.iglob(OPERATIONS_PATH + "*.yml"):
+                name = md_path.split("/")[-1][: -len(".yml")]
+                try:
+                    metadata = (
+                        read_yaml(md_path) or {}
+                    )  # Making sure this is a dict and not  None..?
+                except Exception as e:
+                    # If we can't read the yaml for some reason, report an error and ignore this entry...
+                    logger.error(
+                        m18n.n("log_corrupted_md_file", md_file=md_path, error=e)
+                    )
+                    continue
+                _index_operation(db, name, metadata, os.path.getctime(md_path))
+            db.execute(f"PRAGMA user_version = {OPERATIONS_INDEX_VERSION}")
+    finally:
+        db.close()
+
+    # Get rid of the symlinks previously used as a poor man's cache
+    for legacy_symlink in glob.glob(OPERATIONS_PATH + ".*.parent.yml") + glob.glob(
+        OPERATIONS_PATH + ".*.success"
+    ):
+        if os.path.islink(legacy_symlink):
+            os.unlink(legacy_symlink)
+
+    logger.success(m18n.n("log_index_rebuilt"))
 
 
 def log_list(
@@ -146,99 +170,71 @@ def log_list(
     Keyword argument:
         limit -- Maximum number of logs
         with_details -- Include details (e.g. if the operation was a success).
-        Likely to increase the command time as it needs to open and parse the
-        metadata file for each log...
         with_suboperations -- Include operations that are not the "main"
         operation but are sub-operations triggered by another ongoing operation
         ... (e.g. initializing groups/permissions when installing an app)
     """
 
-    global log_list_cache
-
     operations = {}
 
-    _update_log_cache_symlinks()
-
-    since = time.time() - since_days_ago * 24 * 3600
-    logs = [
-        x.split("/")[-1]
-        for x in glob.iglob(OPERATIONS_PATH + "*.yml")
-        if os.path.getctime(x) > since
-    ]
-    logs = list(reversed(sorted(logs)))
-
-    if not with_suboperations:
-
-        def parent_symlink_points_to_dev_null(log):
-            name = log[: -len(".yml")]
-            parent_symlink = os.path.join(OPERATIONS_PATH, f".{name}.parent.yml")
-            return (
-                os.path.islink(parent_symlink)
-                and os.path.realpath(parent_symlink) == "/dev/null"
-            )
-
-        logs = [log for log in logs if parent_symlink_points_to_dev_null(log)]
-
-    if limit is not None:
-        logs = logs[:limit]
+    db = _operations_index()
+    try:
+        if db.execute("PRAGMA user_version").fetchone()[0] != OPERATIONS_INDEX_VERSION:
+            db.close()
+            log_rebuild_index()
+            db = _operations_index()
+
+        since = time.time() - since_days_ago * 24 * 3600
+        query = (
+            "SELECT name, parent, success, started_by FROM operations WHERE ctime > ?"
+        )
+        if not with_suboperations:
+            query += " AND parent IS NULL"
+        query += " ORDER BY name DESC"
+
+        # Rows are fetched lazily, such that we only look at ~limit entries
+        # (unless some of them turn out to be stale because the files got removed)
+        stale = []
+        cursor = db.execute(query, (since,))
+        for name, parent, success, started_by in cursor:
+            if limit is not None and len(operations) >= limit:
+                break
 
-    for log in logs:
-        name = log[: -len(".yml")]
-        md_path = os.path.join(OPERATIONS_PATH, log)
+            md_path = os.path.join(OPERATIONS_PATH, name + ".yml")
+            if not os.path.exists(md_path):
+                stale.append(name)
+                continue
 
-        entry = {
-            "name": name,
-            "path": md_path,
-            "description": _get_description_from_name(name),
-        }
+            entry = {
+                "name": name,
+                "path": md_path,
+                "description": _get_description_from_name(name),
+                "success": _success_from_index(success),
+            }
 
-        success_symlink = os.path.join(OPERATIONS_PATH, f".{name}.success")
-        entry["success"] = "?"
-        if os.path.islink(success_symlink):
-            success_target = os.path.realpath(success_symlink)
-            if success_target == "/usr/bin/false":
-                entry["success"] = False
-            elif success_target == "/usr/bin/true":
-                entry["success"] = True
+            try:
+                entry["started_at"] = _get_datetime_from_name(name)
+            except ValueError:
+                pass
 
-        try:
-            entry["started_at"] = _get_datetime_from_name(name)
-        except ValueError:
-            pass
+            if with_details:
+                entry["parent"] = parent
+                entry["started_by"] = started_by
 
-        if with_details or with_suboperations:
-            if (
-                name in log_list_cache
-                and os.path.getmtime(md_path) == log_list_cache[name]["time"]
-            ):
-                metadata = log_list_cache[name]["metadata"]
-            else:
-                try:
-                    metadata = (
-                        read_yaml(md_path) or {}
-                    )  # Making sure this is a dict and not  None..?
-                except Exception as e:
-                    # If we can't read the yaml for some reason, report an error and ignore this entry...
-                    logger.error(
-                        m18n.n("log_corrupted_md_file", md_file=md_path, error=e)
-                    )
-                    continue
-                else:
-                    log_list_cache[name] = {
-                        "time": os.path.getmtime(md_path),
-                        "metadata": metadata,
-                    }
-
-        if with_details:
-            entry["success"] = metadata.get("success", "?")
-            entry["parent"] = metadata.get("parent")
-            entry["started_by"] = metadata.get("started_by")
+            if with_suboperations:
+                entry["parent"] = parent
+                entry["suboperations"] = []
 
-        if with_suboperations:
-            entry["parent"] = metadata.get("parent")
-            entry["suboperations"] = []
+            operations[name] = entry
+        cursor.close()
 
-        operations[name] = entry
+        if stale:
+            with db:
+                db.executemany(
+                    "DELETE FROM operations WHERE name = ?", [(n,) for n in stale]
+                )
+    finally:
+        db.close()
 
     # When displaying suboperations, we build a tree-like structure where
     # "suboperations" is a list of suboperations (each of them may also have a list of
@@ -254,9 +250,6 @@ def log_list(
     else:
         operations = [o for o in operations.values()]
 
-    if limit:
-        operations = operations[:limit]
-
     operations = list(reversed(sorted(operations, key=lambda o: o["name"])))
     # Reverse the order of log when in cli, more comfortable to read (avoid
     # unecessary scrolling)
@@ -289,12 +282,13 @@ def log_show(
         if last.group("position") is not None:
             position += int(last.group("position"))
 
-        logs = list(log_list()["operation"])
+        logs = log_list(limit=position)["operation"]
 
         if position > len(logs):
             raise YunohostValidationError("There isn't that many logs", raw_msg=True)
 
-        path = logs[-position]["path"]
+        # The oldest among the 'position' most recent logs
+        path = min(logs, key=lambda o: o["name"])["path"]
 
     if share:
         filter_irrelevant = True
@@ -379,44 +373,21 @@ def log_show(
                 log_path = metadata["log_path"]
 
             if with_suboperations:
-
-                def suboperations():
-                    try:
-                        log_start = _get_datetime_from_name(base_filename)
-                    except ValueError:
-                        return
-
-                    for filename in os.listdir(OPERATIONS_PATH):
-                        if not filename.endswith(".yml"):
-                            continue
-
-                        # We first retrict search to a ~48h time window to limit the number
-                        # of .yml we look into
-                        try:
-                            date = _get_datetime_from_name(base_filename)
-                        except ValueError:
-                            continue
-                        if (date < log_start) or (
-                            date > log_start + timedelta(hours=48)
-                        ):
-                            continue
-
-                        try:
-                            submetadata = read_yaml(
-                                os.path.join(OPERATIONS_PATH, filename)
-                            )
-                        except Exception:
-                            continue
-
-                        if submetadata and submetadata.get("parent") == base_filename:
-                            name = filename[: -len(".yml")]
-                            yield {
-                                "name": name,
-                                "description": _get_description_from_name(name),
-                                "success": submetadata.get("success", "?"),
-                            }
-
-                metadata["suboperations"] = list(suboperations())
+                db = _operations_index()
+                try:
+                    metadata["suboperations"] = [
+                        {
+                            "name": name,
+                            "description": _get_description_from_name(name),
+                            "success": _success_from_index(success),
+                        }
+                        for name, success in db.execute(
+                            "SELECT name, success FROM operations WHERE parent = ? ORDER BY name",
+                            (base_filename,),
+                        )
+                    ]
+                finally:
+                    db.close()
 
     # Display logs if exist
     if os.path.exists(log_path):
@@ -471,7 +442,7 @@ def is_unit_operation(
     """
 
     def decorate(
-        func: Callable[Concatenate["OperationLogger", Param], RetType]
+        func: Callable[Concatenate["OperationLogger", Param], RetType],
     ) -> Callable[Param, RetType]:
         def func_wrapper(*args, **kwargs):
 
@@ -786,6 +757,20 @@ class OperationLogger:
         with open(self.md_path, "w") as outfile:
             outfile.write(dump)
 
+        # Keep the operation log index up to date, such that log_list doesn't
+        # have to go through all the metadata files
+        try:
+            db = _operations_index()
+            try:
+                with db:
+                    _index_operation(
+                        db, self.name, metadata, os.path.getctime(self.md_path)
+                    )
+            finally:
+                db.close()
+        except Exception as e:
+            logger.warning(f"Failed to update the operation log index ? {e}")
+
     @property
     def name(self):
         """
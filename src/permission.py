@@ -49,24 +49,9 @@ def user_permission_list(
 
     # Fetch relevant informations
     from yunohost.app import _installed_apps, app_setting
-    from yunohost.utils.ldap import _get_ldap_interface, _ldap_path_extract
+    from yunohost.utils.ldap import _get_ldap_interface
 
-    ldap = _get_ldap_interface()
-    permissions_infos = ldap.search(
-        "ou=permission",
-        "(objectclass=permissionYnh)",
-        [
-            "cn",
-            "groupPermission",
-            "inheritPermission",
-            "URL",
-            "additionalUrls",
-            "authHeader",
-            "label",
-            "showTile",
-            "isProtected",
-        ],
-    )
+    snapshot = _get_ldap_interface().get_snapshot()
 
     # Parse / organize information to be outputed
     installed_apps = sorted(_installed_apps())
@@ -81,8 +66,7 @@ def user_permission_list(
     }
 
     permissions = {}
-    for infos in permissions_infos:
-        name = infos["cn"][0]
+    for name, infos in snapshot.permissions.items():
         app = name.split(".")[0]
 
         if ignore_system_perms and app in SYSTEM_PERMS:
@@ -91,14 +75,10 @@ def user_permission_list(
             continue
 
         perm = {}
-        perm["allowed"] = [
-            _ldap_path_extract(p, "cn") for p in infos.get("groupPermission", [])
-        ]
+        perm["allowed"] = list(snapshot.permission_allowed[name])
 
         if full:
-            perm["corresponding_users"] = [
-                _ldap_path_extract(p, "uid") for p in infos.get("inheritPermission", [])
-            ]
+            perm["corresponding_users"] = list(snapshot.permission_inherited[name])
             perm["auth_header"] = infos.get("authHeader", [False])[0] == "TRUE"
             perm["label"] = infos.get("label", [None])[0]
             perm["show_tile"] = infos.get("showTile", [False])[0] == "TRUE"
@@ -592,8 +572,10 @@ def permission_url(
     except Exception as e:
         raise YunohostError("permission_update_failed", permission=permission, error=e)
 
+    _mark_for_sync(permissions=[permission], ssowat=True)
+
     if sync_perm:
-        permission_sync_to_user()
+        _sync_dirty_permissions()
 
     logger.debug(m18n.n("permission_updated", permission=permission))
     return user_permission_info(permission)
@@ -635,8 +617,10 @@ def permission_delete(operation_logger, permission, force=False, sync_perm=True)
             "permission_deletion_failed", permission=permission, error=e
         )
 
+    _mark_for_sync(ssowat=True)
+
     if sync_perm:
-        permission_sync_to_user()
+        _sync_dirty_permissions()
     logger.debug(m18n.n("permission_deleted", permission=permission))
 
 
@@ -645,26 +629,82 @@ def permission_sync_to_user():
     Sychronise the inheritPermission attribut in the permission object from the
     user<->group link and the group<->permission link
     """
+
+    _sync_permissions(only_dirty=False)
+
+
+def _mark_for_sync(groups=[], permissions=[], ssowat=False):
+    """
+    Record that some groups (members) or permissions (allowed groups) were
+    touched, such that the next _sync_dirty_permissions only has to recompute
+    the corresponding permissions. 'ssowat' is meant for changes that require
+    to regen the SSOwat conf even if no user set changes (urls, labels, tiles, ...)
+    """
+
+    global _ssowat_conf_outdated
+
+    _dirty_groups.update(groups)
+    _dirty_permissions.update(permissions)
+    _ssowat_conf_outdated = _ssowat_conf_outdated or ssowat
+
+
+def _sync_dirty_permissions():
+    """
+    Same as permission_sync_to_user, but only for the permissions impacted by
+    what was recorded with _mark_for_sync. The SSOwat conf regen and nscd
+    invalidation are skipped if nothing actually changed.
+    """
+
+    _sync_permissions(only_dirty=True)
+
+
+# Groups and permissions touched since the last sync (c.f. _mark_for_sync)
+_dirty_groups: set[str] = set()
+_dirty_permissions: set[str] = set()
+_ssowat_conf_outdated = False
+
+
+def _sync_permissions(only_dirty):
+    global _ssowat_conf_outdated
+
     import os
 
     from yunohost.app import app_ssowatconf
-    from yunohost.user import user_group_list
     from yunohost.utils.ldap import _get_ldap_interface
 
     ldap = _get_ldap_interface()
+    snapshot = ldap.get_snapshot()
 
-    groups = user_group_list(full=True)["groups"]
-    permissions = user_permission_list(full=True)["permissions"]
+    if only_dirty:
+        permissions_to_sync = {
+            name
+            for name, allowed in snapshot.permission_allowed.items()
+            if name in _dirty_permissions or _dirty_groups & set(allowed)
+        }
+        # The portal ACL index generated along with the SSOwat conf contains
+        # the admins and the users mails, hence also depends on these groups
+        regen_ssowat_conf = _ssowat_conf_outdated or bool(
+            _dirty_groups & {"admins", "all_users"}
+        )
+        invalidate_nscd = bool(_dirty_groups)
+    else:
+        permissions_to_sync = set(snapshot.permissions)
+        regen_ssowat_conf = True
+        invalidate_nscd = True
 
-    for permission_name, permission_infos in permissions.items():
+    _dirty_groups.clear()
+    _dirty_permissions.clear()
+    _ssowat_conf_outdated = False
+
+    for permission_name in sorted(permissions_to_sync):
         # These are the users currently allowed because there's an 'inheritPermission' object corresponding to it
-        currently_allowed_users = set(permission_infos["corresponding_users"])
+        currently_allowed_users = set(snapshot.permission_inherited[permission_name])
 
         # These are the users that should be allowed because they are member of a group that is allowed for this permission ...
         should_be_allowed_users = {
             user
-            for group in permission_infos["allowed"]
-            for user in groups[group]["members"]
+            for group in snapshot.permission_allowed[permission_name]
+            for user in snapshot.group_members.get(group, [])
         }
 
         # Note that a LDAP operation with the same value that is in LDAP crash SLAP.
@@ -688,13 +728,18 @@ def permission_sync_to_user():
                 "permission_update_failed", permission=permission_name, error=e
             )
 
+        regen_ssowat_conf = True
+        invalidate_nscd = True
+
     logger.debug("The permission database has been resynchronized")
 
-    app_ssowatconf()
+    if regen_ssowat_conf:
+        app_ssowatconf()
 
-    # Reload unscd, otherwise the group ain't propagated to the LDAP database
-    os.system("nscd --invalidate=passwd")
-    os.system("nscd --invalidate=group")
+    if invalidate_nscd:
+        # Reload unscd, otherwise the group ain't propagated to the LDAP database
+        os.system("nscd --invalidate=passwd")
+        os.system("nscd --invalidate=group")
 
 
 def _update_ldap_group_permission(
@@ -763,10 +808,12 @@ def _update_ldap_group_permission(
     except Exception as e:
         raise YunohostError("permission_update_failed", permission=permission, error=e)
 
+    _mark_for_sync(permissions=[permission], ssowat=True)
+
     # Trigger permission sync if asked
 
     if sync_perm:
-        permission_sync_to_user()
+        _sync_dirty_permissions()
 
     new_permission = user_permission_info(permission)
 
@@ -51,6 +51,15 @@ else:
     logger = getLogger("yunohost.settings")
 
 SETTINGS_PATH = "/etc/yunohost/settings.yml"
+SETTINGS_CONFIG_PANEL_PATH = "/usr/share/yunohost/config_global.toml"
+
+# perf: settings_get(key) is called from many places (dns conf, diagnosers,
+# regen conf, backups, ...) and building the whole config panel each time is
+# costly (toml parsing, pydantic models, ldap search for passwordless_sudo...)
+# So the value of every (non-virtual) setting is computed once and cached,
+# using the modification date of the settings file and of the panel schema
+settings_cache: dict[str, Any] = {}
+settings_cache_timestamp: tuple = ()
 
 
 def settings_get(key="", full=False, export=False):
@@ -73,10 +82,55 @@ def settings_get(key="", full=False, export=False):
     else:
         mode = "classic"
 
+    if mode == "classic" and parse_filter_key(key)[2]:
+        settings = _get_settings_cache()
+        if key in settings:
+            return settings[key]
+
     settings = SettingsConfigPanel()
     return settings.get(key, mode)
 
 
+def _get_settings_cache() -> dict[str, Any]:
+    """
+    Return the values of all the settings (except the virtual ones), as
+    settings_get(key) would return them, indexed by the full
+    'panel.section.option' key
+    """
+    from yunohost.utils.form import BaseReadonlyOption
+
+    global settings_cache
+    global settings_cache_timestamp
+
+    timestamp = tuple(
+        os.path.getmtime(path) if os.path.exists(path) else None
+        for path in [SETTINGS_PATH, SETTINGS_CONFIG_PANEL_PATH]
+    )
+    if timestamp == settings_cache_timestamp:
+        return settings_cache
+
+    panel = SettingsConfigPanel()
+    config, form = panel._get_config_panel(prevalidate=False)
+
+    values = {}
+    for panel, section, option in config.iter_children():
+        if option.id in SettingsConfigPanel.virtual_settings:
+            continue
+        key = f"{panel.id}.{section.id}.{option.id}"
+        if isinstance(option, BaseReadonlyOption):
+            values[key] = None
+            continue
+        value = option.normalize(form[option.id], option)
+        # Same dirty hack as in SettingsConfigPanel.get()
+        if isinstance(value, str) and value in ["True", "False"]:
+            value = bool(value == "True")
+        values[key] = value
+
+    settings_cache = values
+    settings_cache_timestamp = timestamp
+    return settings_cache
+
+
 def settings_list(full=False):
     settings = settings_get(full=full)
 
@@ -251,6 +305,10 @@ class SettingsConfigPanel(ConfigPanel):
 
         # First save settings except virtual + default ones
         super()._apply(form, config, previous_settings, exclude=self.virtual_settings)
+
+        # Don't rely on the mtime only to invalidate the cache of settings_get()
+        global settings_cache_timestamp
+        settings_cache_timestamp = ()
         next_settings = {
             k: v
             for k, v in form.dict(exclude=self.virtual_settings).items()
@@ -35,9 +35,11 @@ from yunohost.app_catalog import (
     APPS_CATALOG_DEFAULT_URL,
     _actual_apps_catalog_api_url,
     _load_apps_catalog,
+    _load_apps_catalog_apps,
     _read_apps_catalog_list,
     _update_apps_catalog,
     app_catalog,
+    app_search,
     logger,
 )
 from yunohost.utils.error import YunohostError
@@ -126,6 +128,77 @@ def test_apps_catalog_update_nominal(mocker):
     assert [c["id"] for c in catalog["categories"]] == ["yolo", "swag"]
 
 
+def test_apps_catalog_update_not_modified():
+    cache_file = f"{APPS_CATALOG_CACHE}/default.json"
+
+    with requests_mock.Mocker() as m:
+        m.register_uri(
+            "GET",
+            APPS_CATALOG_DEFAULT_URL_FULL,
+            [
+                {"text": DUMMY_APP_CATALOG, "headers": {"ETag": '"v1"'}},
+                {"status_code": 304},
+            ],
+        )
+
+        stats = _update_apps_catalog()
+        assert stats["updated"] == ["default"]
+        assert stats["bytes"] == len(DUMMY_APP_CATALOG)
+        assert "If-None-Match" not in m.last_request.headers
+        mtime = os.path.getmtime(cache_file)
+
+        # The server says nothing changed : the cache is left as is
+        stats = _update_apps_catalog()
+        assert m.last_request.headers["If-None-Match"] == '"v1"'
+        assert stats["skipped"] == ["default"]
+        assert stats["bytes"] == 0
+        assert os.path.getmtime(cache_file) == mtime
+
+    assert set(app_catalog()["apps"].keys()) == {"foo", "bar"}
+
+
+def test_apps_catalog_update_repairs_broken_cache():
+    cache_file = f"{APPS_CATALOG_CACHE}/default.json"
+
+    with requests_mock.Mocker() as m:
+        m.register_uri(
+            "GET",
+            APPS_CATALOG_DEFAULT_URL_FULL,
+            text=DUMMY_APP_CATALOG,
+            headers={"ETag": '"v1"'},
+        )
+
+        _update_apps_catalog()
+
+        # The cache got truncated : don't ask whether it changed since then
+        with open(cache_file, "r+") as f:
+            f.truncate(10)
+
+        stats = _update_apps_catalog()
+        assert "If-None-Match" not in m.last_request.headers
+        assert stats["updated"] == ["default"]
+
+    assert set(app_catalog()["apps"].keys()) == {"foo", "bar"}
+
+
+def test_apps_catalog_index():
+    with requests_mock.Mocker() as m:
+        m.register_uri("GET", APPS_CATALOG_DEFAULT_URL_FULL, text=DUMMY_APP_CATALOG)
+        _update_apps_catalog()
+
+    assert app_catalog()["apps"] == {
+        "foo": {"description": "Foo", "level": 4},
+        "bar": {"description": "Bar", "level": 7},
+    }
+    assert app_search("^fo")["apps"] == {"foo": {"description": "Foo", "level": 4}}
+    assert set(app_search("A")["apps"].keys()) == {"bar"}
+
+    apps = _load_apps_catalog_apps(["bar", "unknown"])
+    assert list(apps.keys()) == ["bar"]
+    assert apps["bar"]["category"] == "swag"
+    assert apps["bar"]["repository"] == "default"
+
+
 def test_apps_catalog_update_404(mocker):
 
     with requests_mock.Mocker() as m:
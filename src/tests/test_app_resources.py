@@ -18,9 +18,11 @@
 # along with this program. If not, see <http://www.gnu.org/licenses/>.
 #
 
+import hashlib
 import os
 
 import pytest
+import requests_mock
 from moulinette.utils.process import check_output
 
 from yunohost.app import app_setting
@@ -78,6 +80,7 @@ def clean():
     os.system("rm -rf /etc/yunohost/apps/testapp")
     os.system("rm -rf /var/www/testapp")
     os.system("rm -rf /home/yunohost.app/testapp")
+    os.system("rm -rf /var/cache/yunohost/download/testapp")
     os.system("apt remove lolcat sl nyancat influxdb2 >/dev/null 2>/dev/null")
     os.system("userdel testapp 2>/dev/null")
 
@@ -148,6 +151,53 @@ def test_update_dummy_failwithrollback():
     assert open(dummyfile).read().strip() == "foo"
 
 
+def test_resource_sources(mocker, tmp_path):
+    mocker.patch("yunohost.utils.resources.SOURCES_DOWNLOAD_CACHE", str(tmp_path))
+
+    content = b"some upstream tarball"
+    sha256 = hashlib.sha256(content).hexdigest()
+    conf = {
+        "main": {"url": "https://example.tld/main.tar.gz", "sha256": sha256},
+        "mirror": {"url": "https://mirror.example.tld/main.tar.gz", "sha256": sha256},
+    }
+
+    r = AppResourceClassesByType["sources"]
+
+    with requests_mock.Mocker() as m:
+        m.get("https://example.tld/main.tar.gz", content=content)
+        m.get("https://mirror.example.tld/main.tar.gz", content=content)
+        r(conf, "testapp").provision_or_update()
+
+        # Both sources have the same checksum, hence are only downloaded once
+        assert m.call_count == 1
+
+    for source_id in ["main", "mirror"]:
+        with open(f"/var/cache/yunohost/download/testapp/{source_id}", "rb") as f:
+            assert f.read() == content
+    assert os.path.exists(f"{tmp_path}/{sha256}")
+
+    # Provisioning again is served by the download cache
+    with requests_mock.Mocker() as m:
+        r(conf, "testapp").provision_or_update()
+        assert m.call_count == 0
+
+
+def test_resource_sources_bad_checksum(mocker, tmp_path):
+    mocker.patch("yunohost.utils.resources.SOURCES_DOWNLOAD_CACHE", str(tmp_path))
+
+    conf = {"main": {"url": "https://example.tld/main.tar.gz", "sha256": "a" * 64}}
+
+    r = AppResourceClassesByType["sources"]
+
+    with requests_mock.Mocker() as m:
+        m.get("https://example.tld/main.tar.gz", content=b"not what was expected")
+        with pytest.raises(Exception):
+            r(conf, "testapp").provision_or_update()
+
+    assert not os.path.exists(f"{tmp_path}/{'a' * 64}")
+    assert not os.path.exists("/var/cache/yunohost/download/testapp/main")
+
+
 def test_resource_system_user():
     r = AppResourceClassesByType["system_user"]
 
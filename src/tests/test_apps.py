@@ -30,6 +30,7 @@ from yunohost.app import (
     _is_installed,
     app_info,
     app_install,
+    app_list,
     app_manifest,
     app_map,
     app_remove,
@@ -345,6 +346,101 @@ def test_manifestv2_app_info_preupgrade(monkeypatch):
     )
 
 
+def test_app_list_loads_catalog_and_permissions_once(mocker):
+    apps = [f"dummy_app__{i}" for i in range(1, 51)]
+    manifest = {"name": "Dummy", "description": {"en": "Dummy"}, "version": "1.0~ynh1"}
+
+    mocker.patch("yunohost.app._installed_apps", return_value=apps)
+    mocker.patch("yunohost.app._get_manifest_of_app", return_value=manifest)
+    mocker.patch("yunohost.app._get_app_settings", return_value={})
+    load_apps_catalog = mocker.patch(
+        "yunohost.app._load_apps_catalog",
+        return_value={
+            "apps": {
+                "dummy_app": {
+                    "level": 8,
+                    "state": "working",
+                    "manifest": {"version": "2.0~ynh1"},
+                }
+            }
+        },
+    )
+    permission_list = mocker.patch(
+        "yunohost.permission.user_permission_list",
+        return_value={
+            "permissions": {f"{app}.main": {"label": app.upper()} for app in apps}
+        },
+    )
+
+    result = app_list(upgradable=True)["apps"]
+
+    assert [app["id"] for app in result] == apps
+    assert all(app["upgradable"] == "yes" for app in result)
+    assert result[0]["name"] == "DUMMY_APP__1"
+    assert load_apps_catalog.call_count == 1
+    assert permission_list.call_count == 1
+
+
+def test_list_upgradable_apps_uses_cached_manifests(mocker, tmp_path):
+    import yunohost.app
+    from yunohost.app import _cache_manifest_of_revision, _list_upgradable_apps
+
+    mocker.patch.object(yunohost.app, "APP_MANIFESTS_CACHE", str(tmp_path))
+    mocker.patch(
+        "yunohost.app.app_list",
+        return_value={
+            "apps": [{"id": "foo__2", "current_version": "1.0~ynh1", "settings": {}}]
+        },
+    )
+    mocker.patch(
+        "yunohost.app._load_apps_catalog_apps",
+        return_value={"foo": {"git": {"url": "https://foo", "revision": "abcd"}}},
+    )
+    extract_app = mocker.patch("yunohost.app._extract_app")
+
+    _cache_manifest_of_revision(
+        "https://foo",
+        "abcd",
+        {"notifications": {"PRE_UPGRADE": {"main": {"en": "Hello"}}}},
+    )
+
+    apps = _list_upgradable_apps()
+
+    assert not extract_app.called
+    assert apps[0]["notifications"] == {"PRE_UPGRADE": {"main": "Hello"}}
+    assert "settings" not in apps[0]
+
+
+def test_extract_app_from_gitrepo_uses_sources_cache(mocker, tmp_path):
+    import subprocess
+
+    import yunohost.app
+    from yunohost.app import _extract_app_from_gitrepo
+
+    mocker.patch.object(yunohost.app, "APP_SOURCES_CACHE", str(tmp_path / "cache"))
+    mocker.patch.object(yunohost.app, "APP_MANIFESTS_CACHE", str(tmp_path / "mf"))
+
+    repo = str(tmp_path / "manifestv2_app_ynh")
+    shutil.copytree(os.path.join(get_test_apps_dir(), "manifestv2_app_ynh"), repo)
+    os.system(
+        f"cd {repo} && git init -q -b main && git add . "
+        "&& git -c user.name=test -c user.email=test@test.tld commit -q -m init"
+    )
+    revision = subprocess.check_output(["git", "-C", repo, "rev-parse", "HEAD"])
+    revision = revision.decode().strip()
+
+    manifest, folder = _extract_app_from_gitrepo(repo, branch="main", revision=revision)
+    assert manifest["id"] == "manifestv2_app"
+    shutil.rmtree(folder)
+
+    # The same revision can be extracted again without the remote
+    shutil.rmtree(repo)
+    manifest, folder = _extract_app_from_gitrepo(repo, branch="main", revision=revision)
+    assert manifest["id"] == "manifestv2_app"
+    assert os.path.exists(os.path.join(folder, "scripts", "install"))
+    shutil.rmtree(folder)
+
+
 def test_app_from_catalog():
     main_domain = _get_maindomain()
 
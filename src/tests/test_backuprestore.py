@@ -28,11 +28,17 @@ from moulinette.utils.text import random_ascii
 
 from yunohost.app import _is_installed, app_install, app_remove, app_ssowatconf
 from yunohost.backup import (
+    ARCHIVES_PATH,
+    _iter_dedup_archive,
+    _read_archive_index,
+    _read_dedup_manifest,
     _recursive_umount,
+    backup_check,
     backup_create,
     backup_delete,
     backup_info,
     backup_list,
+    backup_prune,
     backup_restore,
 )
 from yunohost.domain import _get_maindomain, domain_add, domain_list, domain_remove
@@ -270,6 +276,67 @@ def test_backup_only_ldap():
     assert "conf_ldap" in archives_info["system"].keys()
 
 
+def test_backup_archive_index():
+    name = random_ascii(8)
+    with message("backup_created", name=name):
+        backup_create(name=name, system=["conf_ldap"], apps=None)
+
+    archive_file = backup_info(name)["path"]
+    index = _read_archive_index(name, archive_file)
+    assert index is not None
+    assert "info.json" in [member[0] for member in index["members"]]
+
+    # The info.json can be retrieved from the archive using the index
+    os.remove(f"{ARCHIVES_PATH}/{name}.info.json")
+    assert "conf_ldap" in backup_info(name, with_details=True)["system"]
+
+    backup_delete(name)
+    assert not os.path.exists(f"{ARCHIVES_PATH}/{name}.index.json")
+
+
+def test_backup_and_restore_dedup():
+    names = [random_ascii(8), random_ascii(8)]
+    for name in names:
+        with message("backup_created", name=name):
+            backup_create(name=name, methods=["dedup"], system=["conf_ldap"], apps=None)
+
+    assert sorted(backup_list()["archives"]) == sorted(names)
+    assert "conf_ldap" in backup_info(names[1], with_details=True)["system"]
+    assert backup_check()["broken_chunks"] == []
+
+    # The data still used by the most recent backup is kept
+    assert backup_prune(keep_last=1)["deleted"] == [names[0]]
+    assert backup_list()["archives"] == [names[1]]
+    assert backup_check(names[1])["broken_chunks"] == []
+
+    with message("restore_complete"):
+        backup_restore(names[1], force=True, system=["conf_ldap"], apps=None)
+
+
+def test_backup_dedup_archive_download():
+    import io
+    import json
+    import tarfile
+
+    name = random_ascii(8)
+    with message("backup_created", name=name):
+        backup_create(name=name, methods=["dedup"], system=["conf_ldap"], apps=None)
+
+    manifest = _read_dedup_manifest(f"{ARCHIVES_PATH}/{name}.dedup")
+    archive = b"".join(_iter_dedup_archive(manifest))
+
+    # The generated tar is a regular backup archive
+    with tarfile.open(fileobj=io.BytesIO(archive)) as tar:
+        assert sorted(tar.getnames()) == sorted(e[0] for e in manifest["entries"])
+        info = json.load(tar.extractfile("info.json"))
+    assert "conf_ldap" in info["system"]
+
+    # Any range of it can be generated, e.g. to resume a download
+    start, end = 1000, len(archive) // 2
+    assert b"".join(_iter_dedup_archive(manifest, start, end)) == archive[start:end]
+    assert b"".join(_iter_dedup_archive(manifest, end)) == archive[end:]
+
+
 def test_backup_system_part_that_does_not_exists(mocker):
     # Create the backup
     with message("backup_hook_unknown", hook="doesnt_exist"):
@@ -362,14 +429,14 @@ def test_backup_script_failure_handling(monkeypatch, mocker):
 
 @pytest.mark.with_backup_recommended_app_installed
 def test_backup_not_enough_free_space(monkeypatch, mocker):
-    def custom_space_used_by_directory(path, *args, **kwargs):
-        return 99999999999999999
+    def custom_space_used_by_paths(paths, *args, **kwargs):
+        return {path: 99999999999999999 for path in paths}
 
     def custom_free_space_in_directory(dirpath):
         return 0
 
     monkeypatch.setattr(
-        "yunohost.backup.space_used_by_directory", custom_space_used_by_directory
+        "yunohost.backup.space_used_by_paths", custom_space_used_by_paths
     )
     monkeypatch.setattr(
         "yunohost.backup.free_space_in_directory", custom_free_space_in_directory
@@ -411,6 +478,29 @@ def test_backup_app_with_no_restore_script():
         backup_create(system=None, apps=["backup_recommended_app"])
 
 
+@pytest.mark.with_backup_recommended_app_installed
+@pytest.mark.with_permission_app_installed
+def test_backup_apps_concurrently():
+    from yunohost.settings import settings_set
+
+    apps = ["permissions_app", "backup_recommended_app"]
+
+    settings_set("misc.backup.backup_apps_concurrency", 2)
+    try:
+        name = random_ascii(8)
+        with message("backup_created", name=name):
+            backup_create(name=name, system=None, apps=apps)
+    finally:
+        settings_set("misc.backup.backup_apps_concurrency", 1)
+
+    archives_info = backup_info(name, with_details=True)
+    assert archives_info["system"] == {}
+    assert sorted(archives_info["apps"].keys()) == sorted(apps)
+    for app in apps:
+        assert archives_info["apps"][app]["size"] > 0
+        assert archives_info["apps"][app]["backup_duration"] >= 0
+
+
 @pytest.mark.clean_opt_dir
 def test_backup_with_different_output_directory():
     name = random_ascii(8)
@@ -695,3 +785,33 @@ def test_backup_binds_are_readonly(monkeypatch):
     name = random_ascii(8)
     with message("backup_created", name=name):
         backup_create(name=name, system=[])
+
+
+def test_backup_space_used_by_paths(tmp_path):
+    from yunohost.utils.system import space_used_by_paths
+
+    def du(*paths):
+        return int(subprocess.check_output(["du", "-scb", *paths]).split()[-2])
+
+    os.makedirs(tmp_path / "a/b/c")
+    os.makedirs(tmp_path / "x")
+    (tmp_path / "a/f").write_bytes(b"f" * 1000)
+    (tmp_path / "a/b/g").write_bytes(b"g" * 3000)
+    (tmp_path / "a/b/c/h").write_bytes(b"h" * 5000)
+    os.link(tmp_path / "a/b/g", tmp_path / "x/g")
+    os.symlink(tmp_path / "a/b", tmp_path / "x/b")
+
+    a, b, x = str(tmp_path / "a"), str(tmp_path / "a/b/"), str(tmp_path / "x")
+    missing = str(tmp_path / "missing")
+    sizes = space_used_by_paths([a, b, x, missing])
+
+    assert sizes[a] == du(a)
+    assert sizes[b] == du(b)
+    assert sizes[missing] == 0
+    # Nested paths and hardlinks are only accounted once overall
+    assert sizes[a] + sizes[x] == du(a, b, x)
+
+    # ... and hardlinks are charged to the first path containing them
+    sizes = space_used_by_paths([x, a])
+    assert sizes[x] == du(x)
+    assert sizes[a] == du(x, a) - du(x)
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+#
+# Copyright (c) 2024 YunoHost Contributors
+#
+# This file is part of YunoHost (see https://yunohost.org)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+
+import glob
+import os
+import re
+import threading
+
+import yunohost.diagnosis
+from yunohost.diagnosis import (
+    Diagnoser,
+    _list_diagnosis_categories,
+    _load_diagnoser,
+    _run_diagnosers,
+    diagnosis_get,
+    diagnosis_show,
+)
+
+
+class DummyDiagnoser(Diagnoser):
+    id_ = "ip"
+    cache_duration = 600
+    dependencies = []
+
+
+def test_diagnosis_report_store(mocker, tmp_path):
+    mocker.patch("yunohost.diagnosis.DIAGNOSIS_CACHE", str(tmp_path))
+
+    report = {
+        "id": "ip",
+        "cached_for": 600,
+        "items": [
+            {
+                "meta": {"test": "ipv4"},
+                "data": {"global": "1.2.3.4"},
+                "status": "SUCCESS",
+                "summary": "diagnosis_ip_connected_ipv4",
+                "details": [["diagnosis_ip_global", {}]],
+            },
+            {
+                "meta": {"test": "ipv6"},
+                "data": {"global": None},
+                "status": "WARNING",
+                "summary": "diagnosis_ip_no_ipv6",
+            },
+        ],
+    }
+    DummyDiagnoser().write_cache(report)
+
+    # Written atomically, no temporary file left behind
+    assert os.listdir(tmp_path) == ["ip.json"]
+
+    item = Diagnoser.get_cached_report("ip", item={"test": "ipv4"})
+    assert item["data"]["global"] == "1.2.3.4"
+    assert diagnosis_get("ip", ["test=ipv6"])["status"] == "WARNING"
+    assert Diagnoser.get_cached_report("ip", item={"test": "ipv5"}) == {}
+
+    shown = diagnosis_show(["ip"], full=True)["reports"][0]
+    assert "1.2.3.4" in shown["items"][0]["details"][0]
+
+    # Displaying the report doesn't alter the cached one
+    shown = diagnosis_show(["ip"])["reports"][0]
+    assert "meta" not in shown["items"][0]
+    cached = Diagnoser.get_cached_report("ip")
+    assert cached["items"][0]["meta"] == {"test": "ipv4"}
+    assert cached["items"][0]["details"] == [["diagnosis_ip_global", {}]]
+
+
+def test_diagnosers_run_after_the_reports_they_read(mocker):
+    categories = _list_diagnosis_categories()
+    diagnosers = {category: _load_diagnoser(category) for category in categories}
+
+    # Every report read by a diagnoser is done before it when run together
+    for path in glob.glob(
+        os.path.dirname(yunohost.diagnosis.__file__) + "/diagnosers/??-*.py"
+    ):
+        category = os.path.basename(path)[: -len(".py")].split("-")[1]
+        with open(path) as f:
+            read = set(re.findall(r"get_cached_report\(\s*\"(\w+)\"", f.read()))
+        before = diagnosers[category].dependencies + diagnosers[category].run_after
+        assert read - {category} <= set(before), category
+
+    lock = threading.Lock()
+    events = []
+
+    def diagnose(category):
+        def _diagnose(force=False):
+            with lock:
+                events.append(("start", category))
+            with lock:
+                events.append(("end", category))
+            return 0, {}
+
+        return _diagnose
+
+    for category, diagnoser in diagnosers.items():
+        mocker.patch.object(diagnoser, "diagnose", diagnose(category))
+    mocker.patch(
+        "yunohost.diagnosis._load_diagnoser", side_effect=diagnosers.__getitem__
+    )
+
+    results = _run_diagnosers(categories, concurrency=len(categories))
+    assert sorted(results) == sorted(categories)
+
+    for category in ["ports", "web"]:
+        assert events.index(("end", "dnsrecords")) < events.index(("start", category))
+        assert events.index(("end", "ip")) < events.index(("start", category))
+
+
+def test_run_diagnosers_doesnt_hang_when_a_diagnoser_run_crashes(mocker):
+    diagnoser = _load_diagnoser("ip")
+    mocker.patch.object(diagnoser, "diagnose", side_effect=Exception("Crashed"))
+    mocker.patch("yunohost.diagnosis._load_diagnoser", return_value=diagnoser)
+    # Reporting the failure itself fails the first time
+    mocker.patch.object(
+        yunohost.diagnosis.logger,
+        "error",
+        side_effect=[Exception("Failed to report"), None],
+    )
+
+    assert _run_diagnosers(["ip"]) == {"ip": None}
@@ -43,6 +43,32 @@ def clean():
 
 
 # DNS utils testing
+def test_dig_many_dedupes_and_fills_cache(mocker):
+    from yunohost.utils import dns as dns_utils
+
+    dns_utils.dig_cache.clear()
+    query = mocker.spy(dns_utils.dns.resolver.Resolver, "query")
+
+    results = dns_utils.dig_many(
+        [("yunohost.org", "A"), ("yunohost.org", "MX"), ("yunohost.org", "A")],
+        resolvers="force_external",
+    )
+    assert set(results) == {("yunohost.org", "A"), ("yunohost.org", "MX")}
+    assert results[("yunohost.org", "A")][0] == "ok"
+    assert query.call_count == 2
+
+    # Answers are then served from the cache
+    assert (
+        dns_utils.dig("yunohost.org", "A", resolvers="force_external", cache=True)
+        == results[("yunohost.org", "A")]
+    )
+    assert query.call_count == 2
+
+    # ... but not if the caller didn't ask for it
+    dns_utils.dig("yunohost.org", "A", resolvers="force_external")
+    assert query.call_count == 3
+
+
 def test_get_dns_zone_from_domain_existing():
     assert _get_dns_zone_for_domain("yunohost.org") == "yunohost.org"
     assert _get_dns_zone_for_domain("donate.yunohost.org") == "yunohost.org"
@@ -28,6 +28,7 @@ from moulinette.core import MoulinetteError
 
 from yunohost.domain import (
     DOMAIN_SETTINGS_DIR,
+    _get_domains_settings,
     _get_maindomain,
     domain_add,
     domain_config_get,
@@ -173,6 +174,48 @@ def test_domain_config_get_export():
     assert domain_config_get(TEST_DOMAINS[0], export=True)["mail_out"] == 1
 
 
+def test_domain_config_compiled_cache(mocker):
+    import yunohost.utils.configpanel
+
+    domain_add(TEST_DOMAINS[2])
+    domain_config_set(TEST_DOMAINS[2], "feature.mail.mail_out", "no")
+
+    yunohost.utils.configpanel.compiled_config_panel_cache.clear()
+    build_form = mocker.spy(yunohost.utils.configpanel, "build_form")
+
+    assert domain_config_get(TEST_DOMAINS[0], "feature", export=True)["mail_out"] == 1
+    assert domain_config_get(TEST_DOMAINS[2], "feature", export=True)["mail_out"] == 0
+    assert domain_config_get(TEST_DOMAINS[0], "feature", export=True)["mail_out"] == 1
+
+    # Both domains share the same schema, which is only compiled once
+    assert build_form.call_count == 1
+
+
+def test_domains_settings():
+    settings = _get_domains_settings()
+    assert set(settings.keys()) == set(domain_list()["domains"])
+    assert settings[TEST_DOMAINS[1]]["mail_out"] == 1
+    assert settings[TEST_DOMAINS[1]]["default_app"] == "_none"
+
+    domain_config_set(TEST_DOMAINS[1], "feature.mail.mail_out", "no")
+    assert _get_domains_settings([TEST_DOMAINS[1]])[TEST_DOMAINS[1]]["mail_out"] == 0
+    assert TEST_DOMAINS[1] not in domain_list(features=["mail_out"])["domains"]
+
+
+def test_domains_settings_skip_dns_and_cert_panels(mocker):
+    import yunohost.domain
+
+    yunohost.domain.domains_settings_cache.clear()
+    registrar = mocker.patch("yunohost.dns._get_registrar_config_section")
+    cert_status = mocker.patch("yunohost.certificate.certificate_status")
+
+    settings = _get_domains_settings()
+    assert settings[TEST_DOMAINS[0]]["mail_out"] == 1
+
+    registrar.assert_not_called()
+    cert_status.assert_not_called()
+
+
 def test_domain_config_set():
     assert domain_config_get(TEST_DOMAINS[1], "feature.mail.mail_out") == 1
     domain_config_set(TEST_DOMAINS[1], "feature.mail.mail_out", "no")
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+#
+# Copyright (c) 2024 YunoHost Contributors
+#
+# This file is part of YunoHost (see https://yunohost.org)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+
+import os
+import sqlite3
+from datetime import datetime
+
+import pytest
+
+import yunohost.log
+from yunohost.log import OperationLogger, log_list, log_rebuild_index
+
+#
+# Helpers
+#
+
+
+def indexed_operations():
+    db = sqlite3.connect(yunohost.log.OPERATIONS_INDEX_PATH)
+    try:
+        return {
+            name: (parent, success)
+            for name, parent, success in db.execute(
+                "SELECT name, parent, success FROM operations"
+            )
+        }
+    finally:
+        db.close()
+
+
+def fake_operation(name, success=None):
+    op = OperationLogger(name)
+    op.started_at = datetime.utcnow()
+    op.flush()
+    if success is not None:
+        op.close(None if success else "Something went wrong")
+    return op
+
+
+#
+# Setup
+#
+
+
+@pytest.fixture(autouse=True)
+def operations_path(tmp_path, monkeypatch):
+    # N.B. : the folder doesn't exist yet, like on a fresh install
+    path = str(tmp_path / "operations") + "/"
+    monkeypatch.setattr(yunohost.log, "OPERATIONS_PATH", path)
+    monkeypatch.setattr(yunohost.log, "OPERATIONS_INDEX_PATH", path + ".index.db")
+    return path
+
+
+#
+# Tests
+#
+
+
+def test_log_list_without_operations_folder(operations_path):
+    assert not os.path.exists(operations_path)
+
+    assert log_list()["operation"] == []
+    assert os.path.exists(yunohost.log.OPERATIONS_INDEX_PATH)
+
+
+def test_flush_upserts_the_index():
+    op = fake_operation("test_log_operation")
+    assert indexed_operations() == {op.name: (None, None)}
+    assert [o["success"] for o in log_list()["operation"]] == ["?"]
+
+    op.close()
+    assert indexed_operations() == {op.name: (None, 1)}
+    assert [o["success"] for o in log_list()["operation"]] == [True]
+
+
+def test_log_list_drops_stale_entries():
+    kept = fake_operation("test_log_kept", success=True)
+    removed = fake_operation("test_log_removed", success=False)
+    os.remove(removed.md_path)
+
+    assert [o["name"] for o in log_list()["operation"]] == [kept.name]
+    assert list(indexed_operations()) == [kept.name]
+
+
+def test_log_rebuild_index():
+    op = fake_operation("test_log_operation", success=False)
+    os.remove(yunohost.log.OPERATIONS_INDEX_PATH)
+
+    log_rebuild_index()
+    assert indexed_operations() == {op.name: (None, 0)}
+    assert [o["success"] for o in log_list()["operation"]] == [False]
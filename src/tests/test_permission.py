@@ -697,6 +697,26 @@ def test_permission_remove_group_already_not_allowed():
     assert res["blog.main"]["corresponding_users"] == ["alice"]
 
 
+def test_permission_sync_only_dirty_permissions(mocker):
+    from yunohost.permission import _sync_dirty_permissions, permission_sync_to_user
+
+    permission_sync_to_user()
+    app_ssowatconf = mocker.patch("yunohost.app.app_ssowatconf")
+
+    # Nothing was touched since the last sync, so nothing to do
+    _sync_dirty_permissions()
+    app_ssowatconf.assert_not_called()
+
+    user_permission_update("blog.main", add="bob", sync_perm=False)
+    res = user_permission_list(full=True)["permissions"]
+    assert res["blog.main"]["corresponding_users"] == ["alice"]
+
+    _sync_dirty_permissions()
+    app_ssowatconf.assert_called_once()
+    res = user_permission_list(full=True)["permissions"]
+    assert set(res["blog.main"]["corresponding_users"]) == {"alice", "bob"}
+
+
 def test_permission_reset():
     with message("permission_updated", permission="blog.main"):
         user_permission_reset("blog.main")
@@ -161,6 +161,29 @@ def test_settings_get_select():
 #    assert option.get('choices') == ["a", "b", "c"]
 
 
+def test_settings_get_cached(mocker):
+    import time
+
+    assert settings_get("example.example.number") == 42
+
+    # Once cached, getting a single setting doesn't build the config panel
+    panel = mocker.patch("yunohost.settings.SettingsConfigPanel")
+    start = time.time()
+    for _ in range(1000):
+        assert settings_get("example.example.number") == 42
+    assert (time.time() - start) / 1000 < 0.001
+    panel.assert_not_called()
+    mocker.stopall()
+
+    # ... and the cache is invalidated when a setting changes
+    settings_set("example.example.number", 21)
+    assert settings_get("example.example.number") == 21
+
+    # ... and only serves the actual keys, not any key ending with the option id
+    with pytest.raises(YunohostValidationError):
+        settings_get("foo.bar.number")
+
+
 def test_settings_get_doesnt_exists():
     with pytest.raises(YunohostValidationError):
         settings_get("doesnt.exists")
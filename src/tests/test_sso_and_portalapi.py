@@ -34,6 +34,7 @@ from yunohost.app import (
 )
 from yunohost.authenticators.ldap_ynhuser import (
     SESSION_FOLDER,
+    SESSION_VALIDITY,
     Authenticator,
     short_hash,
 )
@@ -229,6 +230,30 @@ def test_api_session_expired():
         assert r.status_code == 401
 
 
+def test_session_store_expiry_and_purge(tmp_path, mocker):
+    from yunohost.utils.sessions import SessionStore
+
+    store = SessionStore(str(tmp_path), SESSION_VALIDITY)
+    sessions = [short_hash("alice") + str(i) for i in range(1000)]
+    for session_id in sessions:
+        store.create(session_id)
+    store.create(short_hash("bob") + "0")
+
+    # Checking sessions doesn't scan the whole folder each time
+    scandir = mocker.spy(os, "scandir")
+    for session_id in sessions:
+        assert store.touch(session_id)
+    assert scandir.call_count <= 1
+
+    # Expiration is still checked on each request
+    os.utime(str(tmp_path / sessions[0]), (0, 0))
+    assert not store.touch(sessions[0])
+    assert not (tmp_path / sessions[0]).exists()
+
+    store.invalidate_all_with_prefix(short_hash("alice"))
+    assert os.listdir(str(tmp_path)) == [short_hash("bob") + "0"]
+
+
 def test_public_routes_not_blocked_by_ssowat():
 
     r = request(f"https://{maindomain}/yunohost/api/whatever")
@@ -306,6 +331,23 @@ def test_login_right_depending_on_app_access_and_mail():
     assert r.status_code == 200 and r.content.decode().strip() == "Hello world!"
 
 
+def test_portal_acl_index():
+    from yunohost.authenticators.ldap_ynhuser import user_is_allowed_on_domain
+
+    user_permission_update(
+        "hellopy.main", remove=["visitors", "all_users"], add="alice"
+    )
+
+    # Alice has access to the app (and is admin anyway)
+    assert user_is_allowed_on_domain("alice", maindomain)
+    # Bob doesn't have access to the app, but his mail is on the maindomain
+    assert user_is_allowed_on_domain("bob", maindomain)
+    # Subdomains without their own portal use their parent's one
+    assert user_is_allowed_on_domain("bob", f"foo.{maindomain}")
+    # ... but unknown domains are denied
+    assert not user_is_allowed_on_domain("bob", "not.a.yunohost.domain")
+
+
 def test_sso_basic_auth_header():
 
     r = request(f"https://{maindomain}/show-auth")
@@ -107,6 +107,27 @@ def test_list_groups():
         assert u in res["all_users"]["members"]
 
 
+def test_directory_snapshot_reused_and_invalidated():
+    from yunohost.utils.ldap import LDAPInterface, _get_ldap_interface
+
+    ldap = _get_ldap_interface()
+    snapshot = ldap.get_snapshot()
+
+    assert ldap.get_snapshot() is snapshot
+    assert snapshot.mail_owner[f"alice@{maindomain}"] == "alice"
+    assert "alice" in snapshot.group_members["dev"]
+
+    user_group_update("dev", add=["jack"])
+    assert ldap.get_snapshot() is not snapshot
+    assert "jack" in user_group_info("dev")["members"]
+
+    # Modifications done by someone else (e.g. another process) are detected too
+    snapshot = ldap.get_snapshot()
+    LDAPInterface().update("uid=jack,ou=users", {"loginShell": ["/bin/false"]})
+    assert ldap.get_snapshot() is not snapshot
+    assert user_list(["shell"])["users"]["jack"]["shell"] is True
+
+
 #
 # Create - Remove functions
 #
@@ -208,6 +229,69 @@ def test_import_user():
     assert "alice" not in group_res["apps"]["members"]
 
 
+def test_import_user_mail_already_used(mocker):
+    import csv
+    from io import StringIO
+
+    with StringIO() as csv_io:
+        writer = csv.DictWriter(
+            csv_io, list(FIELDS_FOR_IMPORT.keys()), delimiter=";", quotechar='"'
+        )
+        writer.writeheader()
+        writer.writerow(
+            {
+                "username": "albert",
+                "firstname": "Albert",
+                "lastname": "Good",
+                "password": "",
+                "mailbox-quota": "1G",
+                "mail": "albert@" + maindomain,
+                "mail-alias": "bob@" + maindomain,
+                "mail-forward": "",
+                "groups": "",
+            }
+        )
+        csv_io.seek(0)
+        with raiseYunohostError(mocker, "user_import_bad_file"):
+            user_import(csv_io)
+
+    assert "albert" not in user_list()["users"]
+
+
+def test_import_user_mail_of_skipped_deletion():
+    import csv
+    from io import StringIO
+
+    # alice is the last admin so she won't be deleted, and neither is her mail
+    # released even though the import was planned that way
+    with StringIO() as csv_io:
+        writer = csv.DictWriter(
+            csv_io, list(FIELDS_FOR_IMPORT.keys()), delimiter=";", quotechar='"'
+        )
+        writer.writeheader()
+        writer.writerow(
+            {
+                "username": "albert",
+                "firstname": "Albert",
+                "lastname": "Good",
+                "password": "",
+                "mailbox-quota": "1G",
+                "mail": "albert@" + maindomain,
+                "mail-alias": "alice@" + maindomain,
+                "mail-forward": "",
+                "groups": "",
+            }
+        )
+        csv_io.seek(0)
+        with message("user_import_partial_failed"):
+            user_import(csv_io, delete=True)
+
+    user_res = user_list(list(FIELDS_FOR_IMPORT.keys()))["users"]
+    assert "albert" not in user_res
+    assert "bob" not in user_res
+    assert user_res["alice"]["mail"] == "alice@" + maindomain
+
+
 def test_export_user():
     result = user_export()
     should_be = (
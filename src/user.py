@@ -100,26 +100,21 @@ def user_list(fields: list[str] | None = None) -> dict[str, dict[str, Any]]:
         and values[0].strip() == "/bin/false",
     }
 
-    attrs = {"uid"}
     users = {}
 
     if not fields:
         fields = ["username", "fullname", "mail", "mailbox-quota"]
 
     for field in fields:
-        if field in ldap_attrs:
-            attrs.add(ldap_attrs[field])
-        else:
+        if field not in ldap_attrs:
             raise YunohostError("field_invalid", field)
 
-    ldap = _get_ldap_interface()
-    result = ldap.search(
-        "ou=users",
-        "(&(objectclass=person)(!(uid=root))(!(uid=nobody)))",
-        attrs,
-    )
+    snapshot = _get_ldap_interface().get_snapshot()
+
+    for user in snapshot.users.values():
+        if user["uid"][0] in ["root", "nobody"]:
+            continue
 
-    for user in result:
         entry: dict[str, str] = {}
         for field in fields:
             values = []
@@ -163,24 +158,13 @@ def user_create(
         raise YunohostValidationError(
             "You should specify the fullname of the user using option -F"
         )
-    fullname = fullname.strip()
-    firstname = fullname.split()[0]
-    lastname = (
-        " ".join(fullname.split()[1:]) or " "
-    )  # Stupid hack because LDAP requires the sn/lastname attr, but it accepts a single whitespace...
+    fullname, firstname, lastname = _split_fullname(fullname)
 
     from yunohost.domain import _assert_domain_exists, _get_maindomain, domain_list
     from yunohost.hook import hook_callback
     from yunohost.utils.ldap import _get_ldap_interface
-    from yunohost.utils.password import (
-        _hash_user_password,
-        assert_password_is_compatible,
-        assert_password_is_strong_enough,
-    )
 
-    # Ensure compatibility and sufficiently complex password
-    assert_password_is_compatible(password)
-    assert_password_is_strong_enough("admin" if admin else "user", password)
+    _assert_user_password(password, admin=admin)
 
     # Validate domain used for email address account
     if domain is None:
@@ -228,19 +212,7 @@ def user_create(
         operation_logger.start()
 
     # Get random UID/GID
-    all_uid = {str(x.pw_uid) for x in pwd.getpwall()}
-    all_gid = {str(x.gr_gid) for x in grp.getgrall()}
-
-    # Prevent users from obtaining uid 1007 which is the uid of the legacy admin,
-    # and there could be a edge case where a new user becomes owner of an old, removed admin user
-    all_uid.add("1007")
-    all_gid.add("1007")
-
-    uid_guid_found = False
-    while not uid_guid_found:
-        # LXC uid number is limited to 65536 by default
-        uid: str = str(random.randint(1001, 65000))
-        uid_guid_found = uid not in all_uid and uid not in all_gid
+    uid = _pick_uid(*_used_uids_and_gids())
 
     if not loginShell:
         loginShell = "/bin/bash"
@@ -248,27 +220,16 @@ def user_create(
         if not shellexists(loginShell) or loginShell not in list_shells():
             raise YunohostValidationError("invalid_shell", shell=loginShell)
 
-    attr_dict = {
-        "objectClass": [
-            "mailAccount",
-            "inetOrgPerson",
-            "posixAccount",
-            "userPermissionYnh",
-        ],
-        "givenName": [firstname],
-        "sn": [lastname],
-        "displayName": [fullname],
-        "cn": [fullname],
-        "uid": [username],
-        "mail": mail,  # NOTE: this one seems to be already a list
-        "maildrop": [username],
-        "mailuserquota": [mailbox_quota],
-        "userPassword": [_hash_user_password(password)],
-        "gidNumber": [uid],
-        "uidNumber": [uid],
-        "homeDirectory": ["/home/" + username],
-        "loginShell": [loginShell],
-    }
+    attr_dict = _user_ldap_attrs(
+        username,
+        fullname,
+        mails=[mail],
+        maildrop=[username],
+        mailbox_quota=mailbox_quota,
+        password=password,
+        uid=uid,
+        loginShell=loginShell,
+    )
 
     try:
         ldap.add(f"uid={username},ou=users", attr_dict)
@@ -279,20 +240,7 @@ def user_create(
     subprocess.call(["nscd", "-i", "passwd"])
     subprocess.call(["nscd", "-i", "group"])
 
-    try:
-        # Attempt to create user home folder
-        subprocess.check_call(["mkhomedir_helper", username])
-    except subprocess.CalledProcessError:
-        home = f"/home/{username}"
-        if not os.path.isdir(home):
-            logger.warning(
-                m18n.n("user_home_creation_failed", home=home), exc_info=True
-            )
-
-    try:
-        subprocess.check_call(["setfacl", "-m", "g:all_users:---", f"/home/{username}"])
-    except subprocess.CalledProcessError:
-        logger.warning(f"Failed to protect /home/{username}", exc_info=True)
+    _create_user_home(username)
 
     # Create group for user and add to group 'all_users'
     user_group_create(groupname=username, gid=uid, primary_group=True, sync_perm=False)
@@ -301,15 +249,10 @@ def user_create(
         user_group_update(groupname="admins", add=username, sync_perm=True)
 
     # Trigger post_user_create hooks
-    env_dict = {
-        "YNH_USER_USERNAME": username,
-        "YNH_USER_MAIL": mail,
-        "YNH_USER_PASSWORD": password,
-        "YNH_USER_FIRSTNAME": firstname,
-        "YNH_USER_LASTNAME": lastname,
-    }
-
-    hook_callback("post_user_create", args=[username, mail], env=env_dict)
+    hook_callback(
+        "post_user_create",
+        **_post_user_create_hook_kwargs(username, mail, password, fullname),
+    )
 
     # TODO: Send a welcome mail to user
     if not from_import:
@@ -381,8 +324,7 @@ def user_delete(
     subprocess.call(["nscd", "-i", "passwd"])
 
     if purge:
-        subprocess.call(["rm", "-rf", f"/home/{username}"])
-        subprocess.call(["rm", "-rf", f"/var/mail/{username}"])
+        _purge_user_home(username)
 
     hook_callback("post_user_delete", args=[username, purge])
 
@@ -406,11 +348,7 @@ def user_update(
     loginShell: str | None = None,
 ):
     if fullname and fullname.strip():
-        fullname = fullname.strip()
-        firstname = fullname.split()[0]
-        lastname = (
-            " ".join(fullname.split()[1:]) or " "
-        )  # Stupid hack because LDAP requires the sn/lastname attr, but it accepts a single whitespace...
+        fullname, firstname, lastname = _split_fullname(fullname)
     else:
         firstname = None
         lastname = None
@@ -419,11 +357,7 @@ def user_update(
     from yunohost.domain import domain_list
     from yunohost.hook import hook_callback
     from yunohost.utils.ldap import _get_ldap_interface
-    from yunohost.utils.password import (
-        _hash_user_password,
-        assert_password_is_compatible,
-        assert_password_is_strong_enough,
-    )
+    from yunohost.utils.password import _hash_user_password
 
     domains = domain_list()["domains"]
 
@@ -474,12 +408,8 @@ def user_update(
                 ),
             )
 
-        # Ensure compatibility and sufficiently complex password
-        assert_password_is_compatible(change_password)
         is_admin = "cn=admins,ou=groups,dc=yunohost,dc=org" in user["memberOf"]
-        assert_password_is_strong_enough(
-            "admin" if is_admin else "user", change_password
-        )
+        _assert_user_password(change_password, admin=is_admin)
 
         new_attr_dict["userPassword"] = [_hash_user_password(change_password)]
         env_dict["YNH_USER_PASSWORD"] = change_password
@@ -608,19 +538,15 @@ def user_info(username: str) -> dict[str, str]:
     """
     from yunohost.utils.ldap import _get_ldap_interface
 
-    ldap = _get_ldap_interface()
-
-    user_attrs = ["cn", "mail", "uid", "maildrop", "mailuserquota", "loginShell"]
+    snapshot = _get_ldap_interface().get_snapshot()
 
     if len(username.split("@")) == 2:
-        filter = "mail=" + username
+        uid = snapshot.mail_owner.get(username)
     else:
-        filter = "uid=" + username
+        uid = username
 
-    result = ldap.search("ou=users", filter, user_attrs)
-
-    if result:
-        user = result[0]
+    if uid in snapshot.users:
+        user = snapshot.users[uid]
     else:
         raise YunohostValidationError("user_unknown", user=username)
 
@@ -741,9 +667,8 @@ def user_import(
 
     from moulinette.utils.text import random_ascii
 
-    from yunohost.app import app_ssowatconf
     from yunohost.domain import domain_list
-    from yunohost.permission import permission_sync_to_user
+    from yunohost.utils.ldap import _get_ldap_interface
 
     # Pre-validate data and prepare what should be done
     actions: dict[str, list[dict[str, Any]]] = {
@@ -758,9 +683,15 @@ def user_import(
         L = [element.strip() for element in L]
         return L
 
-    existing_users = user_list()["users"]
+    existing_users = user_list(list(FIELDS_FOR_IMPORT.keys()))["users"]
     existing_groups = user_group_list()["groups"]
     existing_domains = domain_list()["domains"]
+    existing_system_usernames = {x.pw_name for x in pwd.getpwall()}
+
+    # Groups that can't be managed through the import
+    # (the user's own primary group and all_users are silently ignored though)
+    forbidden_groups = set(existing_users) | {"visitors"}
+    lines: dict[str, int] = {}
 
     reader = csv.DictReader(csvfile, delimiter=";", quotechar='"')
     reader_fields = cast(list[str], reader.fieldnames)
@@ -788,13 +719,29 @@ def user_import(
         users_in_csv.append(user["username"])
 
         # Validate that groups exist
-        user["groups"] = to_list(user["groups"])
-        unknown_groups = [g for g in user["groups"] if g not in existing_groups]
+        user["groups"] = [
+            g
+            for g in to_list(user["groups"])
+            if g not in ["all_users", user["username"]]
+        ]
+        unknown_groups = [
+            g
+            for g in user["groups"]
+            if g not in existing_groups or g in forbidden_groups
+        ]
         if unknown_groups:
             format_errors.append(
                 f"username '{user['username']}': unknown groups {', '.join(unknown_groups)}"
             )
 
+        if (
+            user["username"] not in existing_users
+            and user["username"] in existing_system_usernames
+        ):
+            format_errors.append(
+                f"username '{user['username']}': {m18n.n('system_username_exists')}"
+            )
+
         # Validate that domains exist
         user["mail-alias"] = to_list(user["mail-alias"])
         user["mail-forward"] = to_list(user["mail-forward"])
@@ -816,6 +763,14 @@ def user_import(
                 f"username '{user['username']}': unknown domains {', '.join(unknown_domains)}"
             )
 
+        if any(
+            mail.split("@")[0] in ADMIN_ALIASES
+            for mail in [user["mail"]] + user["mail-alias"]
+        ):
+            format_errors.append(
+                f"username '{user['username']}': {m18n.n('mail_unavailable')}"
+            )
+
         if format_errors:
             logger.error(
                 m18n.n(
@@ -841,11 +796,36 @@ def user_import(
         elif update:
             actions["updated"].append(user)
 
+        lines[user["username"]] = reader.line_num
+
     if delete:
         actions["deleted"] = [
             {"username": user} for user in existing_users if user not in users_in_csv
         ]
 
+    # Validate that mails are available, against what's currently in LDAP
+    # (minus what's released by deleted/updated users) and the CSV itself
+    # N.B. : _user_import_apply checks again before each write, as deleted or
+    # updated users may be skipped in the end (last admin, failures...)
+    released = {user["username"] for user in actions["updated"] + actions["deleted"]}
+    claimed = {
+        mail: owner
+        for mail, owner in _get_ldap_interface().get_snapshot().mail_owner.items()
+        if owner not in released
+    }
+    for user in actions["updated"] + actions["created"]:
+        for mail in [user["mail"]] + user["mail-alias"]:
+            owner = claimed.setdefault(mail, user["username"])
+            if owner != user["username"]:
+                logger.error(
+                    m18n.n(
+                        "user_import_bad_line",
+                        line=lines[user["username"]],
+                        details=f"username '{user['username']}': mail '{mail}' is already used by '{owner}'",
+                    )
+                )
+                is_well_formatted = False
+
     if delete and not users_in_csv:
         logger.error(
             "You used the delete option with an empty csv file ... You probably did not really mean to do that, did you !?"
@@ -862,7 +842,69 @@ def user_import(
         return {}
 
     # Apply creation, update and deletion operation
+    operation_logger.start()
+    result, timings = _user_import_apply(actions, existing_users, total)
+    operation_logger.extra["timings"] = timings
+
+    if result["errors"]:
+        msg = m18n.n("user_import_partial_failed")
+        if result["created"] + result["updated"] + result["deleted"] == 0:
+            msg = m18n.n("user_import_failed")
+        logger.error(msg)
+        operation_logger.error(msg)
+    else:
+        logger.success(m18n.n("user_import_success"))
+        operation_logger.success()
+    return result
+
+
+def _user_import_apply(
+    actions: dict[str, list[dict[str, Any]]],
+    existing_users: dict[str, dict[str, Any]],
+    total: int,
+) -> tuple[dict[str, int], dict[str, float]]:
+    """
+    Apply the (already validated) actions of user_import in a few bulk phases,
+    instead of calling user_create/update/delete for each line (each of which
+    would re-read the directory, invalidate nscd, run the hooks, resync the
+    permissions and regen the SSOwat conf...)
+
+    - ldap: remove/modify/add the user entries, then one modify per group
+    - homes: create or purge home directories in a pool of workers
+    - hooks: run the post_user_* and post_app_*access hooks
+    - sync: a single resync of the permissions impacted by the group changes
+      (which also invalidates nscd and regen the SSOwat conf)
+
+    Returns the counters of created/updated/deleted/errors and the time
+    spent in each phase
+    """
+
+    import time
+    from collections import defaultdict
+    from contextlib import contextmanager
+    from multiprocessing.pool import ThreadPool
+
+    from yunohost.authenticators.ldap_admin import Authenticator as AdminAuth
+    from yunohost.authenticators.ldap_ynhuser import Authenticator as PortalAuth
+    from yunohost.hook import hook_callback
+    from yunohost.permission import _mark_for_sync, _sync_dirty_permissions
+    from yunohost.utils.ldap import _get_ldap_interface, _ldap_path_extract
+    from yunohost.utils.password import _hash_user_password
+
+    ldap = _get_ldap_interface()
+    # N.B. : this is the state *before* the import, and we keep using it all
+    # along even though the actual snapshot is dropped by the ldap writes
+    snapshot = ldap.get_snapshot()
+
     result = {"created": 0, "updated": 0, "deleted": 0, "errors": 0}
+    timings: dict[str, float] = {}
+
+    @contextmanager
+    def phase(name):
+        start = time.time()
+        yield
+        timings[name] = round(time.time() - start, 3)
+        logger.debug(f"User import: phase '{name}' took {timings[name]}s")
 
     def progress(info=""):
         progress.nb += 1
@@ -880,127 +922,269 @@ def user_import(
     progress.old = ""  # type: ignore[attr-defined]
 
     def _on_failure(user, exception):
-        if exception.key == "group_cannot_remove_last_admin":
+        result["errors"] += 1
+        logger.error(user + ": " + str(exception))
+
+    admins = set(snapshot.group_members.get("admins", []))
+
+    def _can_leave_admins(username):
+        if username in admins and not admins - {username}:
             logger.warning(
-                user
+                username
                 + ": "
-                + m18n.n("user_import_cannot_edit_or_delete_admins", user=user)
-            )
-        else:
-            result["errors"] += 1
-            logger.error(user + ": " + str(exception))
-
-    def _import_update(new_infos, old_infos=False):
-        remove_alias = None
-        remove_forward = None
-        remove_groups = []
-        add_groups = new_infos["groups"]
-        if old_infos:
-            new_infos["mail"] = (
-                None if old_infos["mail"] == new_infos["mail"] else new_infos["mail"]
-            )
-            remove_alias = list(
-                set(old_infos["mail-alias"]) - set(new_infos["mail-alias"])
-            )
-            remove_forward = list(
-                set(old_infos["mail-forward"]) - set(new_infos["mail-forward"])
-            )
-            new_infos["mail-alias"] = list(
-                set(new_infos["mail-alias"]) - set(old_infos["mail-alias"])
-            )
-            new_infos["mail-forward"] = list(
-                set(new_infos["mail-forward"]) - set(old_infos["mail-forward"])
+                + m18n.n("user_import_cannot_edit_or_delete_admins", user=username)
             )
+            return False
+        return True
+
+    # Who owns which mail, kept up to date along the ldap writes: a mail is
+    # only handed over to another user once its owner was actually deleted or
+    # updated (and not when the owner is skipped, e.g. because it's the last
+    # admin or because its update failed)
+    mail_owner = dict(snapshot.mail_owner)
+
+    def _assert_mails_available(username, mails, error_key):
+        for mail in mails:
+            owner = mail_owner.get(mail, username)
+            if owner != username:
+                raise YunohostError(
+                    error_key,
+                    user=username,
+                    error=f"mail '{mail}' is already used by '{owner}'",
+                )
 
-            remove_groups = list(set(old_infos["groups"]) - set(new_infos["groups"]))
-            add_groups = list(set(new_infos["groups"]) - set(old_infos["groups"]))
-
-            for group, infos in existing_groups.items():
-                # Loop only on groups in 'remove_groups'
-                # Ignore 'all_users' and primary group
-                if (
-                    group in ["all_users", new_infos["username"]]
-                    or group not in remove_groups
-                ):
-                    continue
-                # If the user is in this group (and it's not the primary group),
-                # remove the member from the group
-                if new_infos["username"] in infos["members"]:
-                    user_group_update(
-                        group,
-                        remove=new_infos["username"],
-                        sync_perm=False,
-                        from_import=True,
-                    )
+    def _set_mails(username, mails):
+        for mail in [m for m, owner in mail_owner.items() if owner == username]:
+            del mail_owner[mail]
+        for mail in mails:
+            mail_owner[mail] = username
 
-        user_update(
-            new_infos["username"],
-            fullname=(new_infos["firstname"] + " " + new_infos["lastname"]).strip(),
-            change_password=new_infos["password"],
-            mailbox_quota=new_infos["mailbox-quota"],
-            mail=new_infos["mail"],
-            add_mailalias=new_infos["mail-alias"],
-            remove_mailalias=remove_alias,
-            remove_mailforward=remove_forward,
-            add_mailforward=new_infos["mail-forward"],
-            from_import=True,
-        )
+    # Membership changes are accumulated to do a single modify per group
+    group_changes: dict[str, dict[str, set[str]]] = defaultdict(
+        lambda: {"add": set(), "remove": set()}
+    )
+    deleted: list[str] = []
+    created: list[dict[str, Any]] = []
+    hooks: list[tuple[str, dict[str, Any]]] = []
+
+    all_uid, all_gid = _used_uids_and_gids()
+    all_existing_groupnames = {x.gr_name for x in grp.getgrall()}
 
-        for group in add_groups:
-            if group in ["all_users", new_infos["username"]]:
+    with phase("ldap"):
+        # We do delete and update before to avoid mail uniqueness issues
+        # (the memberof overlay drops the deleted users from the groups' members)
+        for user in actions["deleted"]:
+            username = user["username"]
+            progress(f"Deleting {username}")
+            if not _can_leave_admins(username):
+                continue
+            try:
+                if username in snapshot.groups:
+                    ldap.remove(f"cn={username},ou=groups")
+                ldap.remove(f"uid={username},ou=users")
+            except Exception as e:
+                _on_failure(
+                    username,
+                    YunohostError("user_deletion_failed", user=username, error=e),
+                )
                 continue
-            user_group_update(
-                group, add=new_infos["username"], sync_perm=False, from_import=True
-            )
 
-    users = user_list(list(FIELDS_FOR_IMPORT.keys()))["users"]
-    operation_logger.start()
-    # We do delete and update before to avoid mail uniqueness issues
-    for user in actions["deleted"]:
-        progress(f"Deleting {user}")
-        try:
-            user_delete(user["username"], purge=True, from_import=True)
+            admins.discard(username)
+            _set_mails(username, [])
+            for group, members in snapshot.group_members.items():
+                if group != username and username in members:
+                    group_changes[group]["remove"].add(username)
+
+            PortalAuth.invalidate_all_sessions_for_user(username)
+            AdminAuth.invalidate_all_sessions_for_user(username)
+            hooks.append(("post_user_delete", {"args": [username, True]}))
+            deleted.append(username)
             result["deleted"] += 1
-        except YunohostError as e:
-            _on_failure(user, e)
 
-    for user in actions["updated"]:
-        progress(f"Updating {user['username']}")
-        try:
-            _import_update(user, users[user["username"]])
+        for user in actions["updated"]:
+            username = user["username"]
+            progress(f"Updating {username}")
+            old_infos = existing_users[username]
+            add_groups = set(user["groups"]) - set(old_infos["groups"])
+            remove_groups = set(old_infos["groups"]) - set(user["groups"])
+            if "admins" in remove_groups and not _can_leave_admins(username):
+                continue
+            fullname = user["firstname"] + " " + user["lastname"]
+            _, firstname, lastname = _split_fullname(fullname)
+            env_dict = {
+                "YNH_USER_USERNAME": username,
+                "YNH_USER_FIRSTNAME": firstname,
+                "YNH_USER_LASTNAME": lastname,
+                "YNH_USER_MAILQUOTA": user["mailbox-quota"],
+            }
+            new_attr_dict = {
+                **_fullname_ldap_attrs(fullname),
+                "mailuserquota": [user["mailbox-quota"]],
+            }
+            mails = [user["mail"]] + user["mail-alias"]
+            try:
+                if user["password"]:
+                    _assert_user_password(user["password"], admin=username in admins)
+                    new_attr_dict["userPassword"] = [
+                        _hash_user_password(user["password"])
+                    ]
+                    env_dict["YNH_USER_PASSWORD"] = user["password"]
+
+                if mails != [old_infos["mail"]] + old_infos["mail-alias"]:
+                    _assert_mails_available(username, mails, "user_update_failed")
+                    new_attr_dict["mail"] = mails
+                    env_dict["YNH_USER_MAILS"] = ",".join(mails)
+
+                maildrop = [username] + user["mail-forward"]
+                if set(user["mail-forward"]) != set(old_infos["mail-forward"]):
+                    new_attr_dict["maildrop"] = maildrop
+                    env_dict["YNH_USER_MAILFORWARDS"] = ",".join(maildrop)
+
+                try:
+                    ldap.update(f"uid={username},ou=users", new_attr_dict)
+                except Exception as e:
+                    raise YunohostError("user_update_failed", user=username, error=e)
+            except YunohostError as e:
+                _on_failure(username, e)
+                continue
+
+            if "mail" in new_attr_dict:
+                _set_mails(username, mails)
+            if "admins" in remove_groups:
+                admins.discard(username)
+            if "userPassword" in new_attr_dict:
+                PortalAuth.invalidate_all_sessions_for_user(username)
+
+            for group in add_groups:
+                group_changes[group]["add"].add(username)
+            for group in remove_groups:
+                group_changes[group]["remove"].add(username)
+
+            hooks.append(("post_user_update", {"env": env_dict}))
             result["updated"] += 1
-        except YunohostError as e:
-            _on_failure(user["username"], e)
 
-    for user in actions["created"]:
-        progress(f"Creating {user['username']}")
-        try:
-            user_create(
-                user["username"],
-                user["domain"],
-                user["password"],
-                mailbox_quota=user["mailbox-quota"],
-                from_import=True,
-                fullname=(user["firstname"] + " " + user["lastname"]).strip(),
+        for user in actions["created"]:
+            username = user["username"]
+            progress(f"Creating {username}")
+            fullname = user["firstname"] + " " + user["lastname"]
+            mails = [user["mail"]] + user["mail-alias"]
+
+            try:
+                _assert_user_password(user["password"])
+                _assert_mails_available(username, mails, "user_creation_failed")
+                uid = _pick_uid(all_uid, all_gid)
+                attr_dict = _user_ldap_attrs(
+                    username,
+                    fullname,
+                    mails=mails,
+                    maildrop=[username] + user["mail-forward"],
+                    mailbox_quota=user["mailbox-quota"],
+                    password=user["password"],
+                    uid=uid,
+                )
+                try:
+                    ldap.add(f"uid={username},ou=users", attr_dict)
+                except Exception as e:
+                    raise YunohostError("user_creation_failed", user=username, error=e)
+                _set_mails(username, mails)
+                if username in all_existing_groupnames:
+                    _remove_system_group(username)
+                # Primary group, which should only ever contain the user
+                try:
+                    ldap.add(
+                        f"cn={username},ou=groups",
+                        _group_ldap_attrs(username, uid, primary_group=True),
+                    )
+                except Exception as e:
+                    raise YunohostError(
+                        "group_creation_failed", group=username, error=e
+                    )
+            except YunohostError as e:
+                _on_failure(username, e)
+                continue
+
+            for group in ["all_users"] + user["groups"]:
+                group_changes[group]["add"].add(username)
+
+            hooks.append(
+                (
+                    "post_user_create",
+                    _post_user_create_hook_kwargs(
+                        username, user["mail"], user["password"], fullname
+                    ),
+                )
             )
-            _import_update(user)
+            created.append(user)
             result["created"] += 1
-        except YunohostError as e:
-            _on_failure(user["username"], e)
 
-    permission_sync_to_user()
-    app_ssowatconf()
+        # One modify per group for all the membership changes
+        for group, changes in group_changes.items():
+            current_members = set(snapshot.group_members.get(group, []))
+            new_members = (current_members | changes["add"]) - changes["remove"]
+            changes["add"] = new_members - current_members
+            changes["remove"] = current_members - new_members
+            if new_members == current_members:
+                continue
+            try:
+                ldap.update(
+                    f"cn={group},ou=groups",
+                    {
+                        "member": [
+                            "uid=" + u + ",ou=users,dc=yunohost,dc=org"
+                            for u in new_members
+                        ],
+                        "memberUid": list(new_members),
+                    },
+                )
+            except Exception as e:
+                _on_failure(
+                    group,
+                    YunohostError("group_update_failed", group=group, error=e),
+                )
+                continue
 
-    if result["errors"]:
-        msg = m18n.n("user_import_partial_failed")
-        if result["created"] + result["updated"] + result["deleted"] == 0:
-            msg = m18n.n("user_import_failed")
-        logger.error(msg)
-        operation_logger.error(msg)
-    else:
-        logger.success(m18n.n("user_import_success"))
-        operation_logger.success()
-    return result
+            permissions = [
+                _ldap_path_extract(p, "cn")
+                for p in snapshot.groups.get(group, {}).get("permission", [])
+            ]
+            for permission in permissions:
+                app, sub_permission = permission.split(".", 1)
+                for hook, users in [
+                    ("post_app_addaccess", changes["add"]),
+                    ("post_app_removeaccess", changes["remove"]),
+                ]:
+                    if users:
+                        hooks.append(
+                            (hook, {"args": [app, ",".join(users), sub_permission, ""]})
+                        )
+
+            if group == "admins":
+                for username in changes["remove"]:
+                    AdminAuth.invalidate_all_sessions_for_user(username)
+
+    # The new users have to be known by the system for mkhomedir_helper to work
+    subprocess.call(["nscd", "-i", "passwd"])
+    subprocess.call(["nscd", "-i", "group"])
+
+    with phase("homes"):
+        with ThreadPool(8) as pool:
+            pool.map(_create_user_home, [user["username"] for user in created])
+            pool.map(_purge_user_home, deleted)
+
+    with phase("hooks"):
+        for hook, kwargs in hooks:
+            hook_callback(hook, **kwargs)
+
+    with phase("sync"):
+        # Deleted users may already be gone from the inherited permissions
+        # (thanks to the memberof overlay) and updated users may have changed
+        # their mail (c.f. the portal ACL index) so make sure to regen SSOwat conf
+        _mark_for_sync(
+            groups=list(group_changes), ssowat=bool(deleted or result["updated"])
+        )
+        _sync_dirty_permissions()
+
+    return result, timings
 
 
 #
@@ -1024,28 +1208,18 @@ def user_group_list(
 
     from yunohost.utils.ldap import _get_ldap_interface, _ldap_path_extract
 
-    ldap = _get_ldap_interface()
-    groups_infos = ldap.search(
-        "ou=groups",
-        "(objectclass=groupOfNamesYnh)",
-        ["cn", "member", "permission"],
-    )
+    snapshot = _get_ldap_interface().get_snapshot()
 
     # Parse / organize information to be outputed
 
-    users = user_list()["users"]
     groups: dict[str, dict[str, Any]] = {}
-    for infos in groups_infos:
-        name = infos["cn"][0]
-
-        if not include_primary_groups and name in users:
+    for name, infos in snapshot.groups.items():
+        if not include_primary_groups and name in snapshot.users:
             continue
 
         groups[name] = {}
 
-        groups[name]["members"] = [
-            _ldap_path_extract(p, "uid") for p in infos.get("member", [])
-        ]
+        groups[name]["members"] = list(snapshot.group_members[name])
 
         if full:
             groups[name]["permissions"] = [
@@ -1070,7 +1244,7 @@ def user_group_create(
         groupname -- Must be unique
 
     """
-    from yunohost.permission import permission_sync_to_user
+    from yunohost.permission import _mark_for_sync, _sync_dirty_permissions
     from yunohost.utils.ldap import _get_ldap_interface
 
     ldap = _get_ldap_interface()
@@ -1084,12 +1258,7 @@ def user_group_create(
     all_existing_groupnames = {x.gr_name for x in grp.getgrall()}
     if groupname in all_existing_groupnames:
         if primary_group:
-            logger.warning(
-                m18n.n("group_already_exist_on_system_but_removing_it", group=groupname)
-            )
-            subprocess.check_call(
-                f"sed --in-place '/^{groupname}:/d' /etc/group", shell=True
-            )
+            _remove_system_group(groupname)
         else:
             raise YunohostValidationError(
                 "group_already_exist_on_system", group=groupname
@@ -1104,17 +1273,7 @@ def user_group_create(
             gid = str(random.randint(200, 99999))
             uid_guid_found = gid not in all_gid
 
-    attr_dict = {
-        "objectClass": ["top", "groupOfNamesYnh", "posixGroup"],
-        "cn": groupname,
-        "gidNumber": [gid],
-    }
-
-    # Here we handle the creation of a primary group
-    # We want to initialize this group to contain the corresponding user
-    # (then we won't be able to add/remove any user in this group)
-    if primary_group:
-        attr_dict["member"] = ["uid=" + groupname + ",ou=users,dc=yunohost,dc=org"]
+    attr_dict = _group_ldap_attrs(groupname, gid, primary_group=primary_group)
 
     operation_logger.start()
     try:
@@ -1122,8 +1281,10 @@ def user_group_create(
     except Exception as e:
         raise YunohostError("group_creation_failed", group=groupname, error=e)
 
+    _mark_for_sync(groups=[groupname])
+
     if sync_perm:
-        permission_sync_to_user()
+        _sync_dirty_permissions()
 
     if not primary_group:
         logger.success(m18n.n("group_created", group=groupname))
@@ -1147,8 +1308,8 @@ def user_group_delete(
         groupname -- Groupname to delete
 
     """
-    from yunohost.permission import permission_sync_to_user
-    from yunohost.utils.ldap import _get_ldap_interface
+    from yunohost.permission import _mark_for_sync, _sync_dirty_permissions
+    from yunohost.utils.ldap import _get_ldap_interface, _ldap_path_extract
 
     existing_groups = list(user_group_list()["groups"].keys())
     if groupname not in existing_groups:
@@ -1165,13 +1326,22 @@ def user_group_delete(
 
     operation_logger.start()
     ldap = _get_ldap_interface()
+
+    # The permissions this group was allowed on will have to be resynchronized
+    group_permissions = [
+        _ldap_path_extract(p, "cn")
+        for p in ldap.get_snapshot().groups[groupname].get("permission", [])
+    ]
+
     try:
         ldap.remove(f"cn={groupname},ou=groups")
     except Exception as e:
         raise YunohostError("group_deletion_failed", group=groupname, error=e)
 
+    _mark_for_sync(groups=[groupname], permissions=group_permissions)
+
     if sync_perm:
-        permission_sync_to_user()
+        _sync_dirty_permissions()
 
     if groupname not in existing_users:
         logger.success(m18n.n("group_deleted", group=groupname))
@@ -1192,7 +1362,7 @@ def user_group_update(
     from_import: bool = False,
 ) -> None | dict[str, Any]:
     from yunohost.hook import hook_callback
-    from yunohost.permission import permission_sync_to_user
+    from yunohost.permission import _mark_for_sync, _sync_dirty_permissions
     from yunohost.utils.ldap import _get_ldap_interface, _ldap_path_extract
 
     existing_users = list(user_list()["users"].keys())
@@ -1357,6 +1527,9 @@ def user_group_update(
         except Exception as e:
             raise YunohostError("group_update_failed", group=groupname, error=e)
 
+        if "member" in new_attr_dict:
+            _mark_for_sync(groups=[groupname])
+
     if groupname == "admins" and remove:
         from yunohost.authenticators.ldap_admin import Authenticator as AdminAuth
 
@@ -1364,7 +1537,7 @@ def user_group_update(
             AdminAuth.invalidate_all_sessions_for_user(user)
 
     if sync_perm:
-        permission_sync_to_user()
+        _sync_dirty_permissions()
 
     if add and users_to_add:
         for permission in current_group_permissions:
@@ -1411,24 +1584,17 @@ def user_group_info(groupname: str) -> dict[str, Any]:
 
     from yunohost.utils.ldap import _get_ldap_interface, _ldap_path_extract
 
-    ldap = _get_ldap_interface()
-
-    # Fetch info for this group
-    result = ldap.search(
-        "ou=groups",
-        "cn=" + groupname,
-        ["cn", "member", "permission", "mail"],
-    )
+    snapshot = _get_ldap_interface().get_snapshot()
 
-    if not result:
+    if groupname not in snapshot.groups:
         raise YunohostValidationError("group_unknown", group=groupname)
 
-    infos = result[0]
+    infos = snapshot.groups[groupname]
 
     # Format data
 
     return {
-        "members": [_ldap_path_extract(p, "uid") for p in infos.get("member", [])],
+        "members": list(snapshot.group_members[groupname]),
         "permissions": [
             _ldap_path_extract(p, "cn") for p in infos.get("permission", [])
         ],
@@ -1590,3 +1756,155 @@ def _update_admins_group_aliases(old_main_domain: str, new_main_domain: str) ->
     user_group_update(
         "admins", add_mailalias=aliases_to_add, remove_mailalias=aliases_to_remove
     )
+
+
+def _split_fullname(fullname: str) -> tuple[str, str, str]:
+    """Return the (stripped) fullname, the firstname and the lastname"""
+    fullname = fullname.strip()
+    firstname = fullname.split()[0]
+    lastname = (
+        " ".join(fullname.split()[1:]) or " "
+    )  # Stupid hack because LDAP requires the sn/lastname attr, but it accepts a single whitespace...
+    return fullname, firstname, lastname
+
+
+def _assert_user_password(password: str, admin: bool = False) -> None:
+    from yunohost.utils.password import (
+        assert_password_is_compatible,
+        assert_password_is_strong_enough,
+    )
+
+    # Ensure compatibility and sufficiently complex password
+    assert_password_is_compatible(password)
+    assert_password_is_strong_enough("admin" if admin else "user", password)
+
+
+def _used_uids_and_gids() -> tuple[set[str], set[str]]:
+    all_uid = {str(x.pw_uid) for x in pwd.getpwall()}
+    all_gid = {str(x.gr_gid) for x in grp.getgrall()}
+
+    # Prevent users from obtaining uid 1007 which is the uid of the legacy admin,
+    # and there could be a edge case where a new user becomes owner of an old, removed admin user
+    all_uid.add("1007")
+    all_gid.add("1007")
+
+    return all_uid, all_gid
+
+
+def _pick_uid(all_uid: set[str], all_gid: set[str]) -> str:
+    """
+    Pick a random uid (also used as the gid of the primary group) which isn't
+    in all_uid nor all_gid, and add it to them
+    """
+    while True:
+        # LXC uid number is limited to 65536 by default
+        uid = str(random.randint(1001, 65000))
+        if uid not in all_uid and uid not in all_gid:
+            all_uid.add(uid)
+            all_gid.add(uid)
+            return uid
+
+
+def _fullname_ldap_attrs(fullname: str) -> dict[str, list[str]]:
+    fullname, firstname, lastname = _split_fullname(fullname)
+    return {
+        "givenName": [firstname],
+        "sn": [lastname],
+        "displayName": [fullname],
+        "cn": [fullname],
+    }
+
+
+def _user_ldap_attrs(
+    username: str,
+    fullname: str,
+    mails: list[str],
+    maildrop: list[str],
+    mailbox_quota: str,
+    password: str,
+    uid: str,
+    loginShell: str = "/bin/bash",
+) -> dict[str, Any]:
+    from yunohost.utils.password import _hash_user_password
+
+    return {
+        "objectClass": [
+            "mailAccount",
+            "inetOrgPerson",
+            "posixAccount",
+            "userPermissionYnh",
+        ],
+        **_fullname_ldap_attrs(fullname),
+        "uid": [username],
+        "mail": mails,
+        "maildrop": maildrop,
+        "mailuserquota": [mailbox_quota],
+        "userPassword": [_hash_user_password(password)],
+        "gidNumber": [uid],
+        "uidNumber": [uid],
+        "homeDirectory": ["/home/" + username],
+        "loginShell": [loginShell],
+    }
+
+
+def _group_ldap_attrs(
+    groupname: str, gid: str, primary_group: bool = False
+) -> dict[str, Any]:
+    attr_dict = {
+        "objectClass": ["top", "groupOfNamesYnh", "posixGroup"],
+        "cn": groupname,
+        "gidNumber": [gid],
+    }
+
+    # Here we handle the creation of a primary group
+    # We want to initialize this group to contain the corresponding user
+    # (then we won't be able to add/remove any user in this group)
+    if primary_group:
+        attr_dict["member"] = ["uid=" + groupname + ",ou=users,dc=yunohost,dc=org"]
+
+    return attr_dict
+
+
+def _remove_system_group(groupname: str) -> None:
+    logger.warning(
+        m18n.n("group_already_exist_on_system_but_removing_it", group=groupname)
+    )
+    subprocess.check_call(f"sed --in-place '/^{groupname}:/d' /etc/group", shell=True)
+
+
+def _create_user_home(username: str) -> None:
+    home = f"/home/{username}"
+    try:
+        # Attempt to create user home folder
+        subprocess.check_call(["mkhomedir_helper", username])
+    except subprocess.CalledProcessError:
+        if not os.path.isdir(home):
+            logger.warning(
+                m18n.n("user_home_creation_failed", home=home), exc_info=True
+            )
+
+    try:
+        subprocess.check_call(["setfacl", "-m", "g:all_users:---", home])
+    except subprocess.CalledProcessError:
+        logger.warning(f"Failed to protect {home}", exc_info=True)
+
+
+def _purge_user_home(username: str) -> None:
+    subprocess.call(["rm", "-rf", f"/home/{username}"])
+    subprocess.call(["rm", "-rf", f"/var/mail/{username}"])
+
+
+def _post_user_create_hook_kwargs(
+    username: str, mail: str, password: str, fullname: str
+) -> dict[str, Any]:
+    _, firstname, lastname = _split_fullname(fullname)
+    return {
+        "args": [username, mail],
+        "env": {
+            "YNH_USER_USERNAME": username,
+            "YNH_USER_MAIL": mail,
+            "YNH_USER_PASSWORD": password,
+            "YNH_USER_FIRSTNAME": firstname,
+            "YNH_USER_LASTNAME": lastname,
+        },
+    }
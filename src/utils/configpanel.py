@@ -18,7 +18,10 @@
 # along with this program. If not, see <http://www.gnu.org/licenses/>.
 #
 
+import copy
 import glob
+import hashlib
+import json
 import os
 import re
 from collections import OrderedDict
@@ -393,6 +396,17 @@ if TYPE_CHECKING:
     RawSettings = dict[str, Any]
     ConfigPanelGetMode = Literal["classic", "full", "export"]
 
+# Parsed config panel toml files, keyed by path, c.f. ConfigPanel._get_raw_config
+raw_config_cache: dict[str, tuple[float, "RawConfig"]] = {}
+
+# Validated (untranslated) config panel models and their form class.
+# Keyed by config path + mtime + locale + a digest of the raw config, because
+# some panels (e.g. domains) alter the raw config depending on the entity.
+compiled_config_panel_cache: dict[
+    tuple[str, float, str, str], tuple[ConfigPanelModel, Type["FormModel"] | None]
+] = {}
+COMPILED_CONFIG_PANEL_CACHE_SIZE = 64
+
 
 def parse_filter_key(key: str | None = None) -> "FilterKey":
     if key and key.count(".") > 2:
@@ -707,7 +721,14 @@ class ConfigPanel:
         if not os.path.exists(self.config_path):
             raise YunohostValidationError("config_no_panel")
 
-        return read_toml(self.config_path)
+        mtime = os.path.getmtime(self.config_path)
+        cached = raw_config_cache.get(self.config_path)
+        if cached is None or cached[0] != mtime:
+            cached = (mtime, read_toml(self.config_path))
+            raw_config_cache[self.config_path] = cached
+
+        # Callers (and subclasses) are free to mutate the raw config
+        return copy.deepcopy(cached[1])
 
     def _get_raw_settings(self) -> "RawSettings":
         if not self.save_path or not os.path.exists(self.save_path):
@@ -757,6 +778,9 @@ class ConfigPanel:
         raw_settings = self._get_raw_settings()
         # Save `raw_settings` for diff at `_apply`
         self.raw_settings = raw_settings
+        # Whether some option attributes got overriden by the settings, in
+        # which case the cached form class can't be used
+        self.config_mutated = False
         values = {}
 
         for _, section, option in config.iter_children():
@@ -792,6 +816,7 @@ class ConfigPanel:
                 # Mutate other possible option attributes
                 for k, v in data.items():
                     setattr(option, k, v)
+                    self.config_mutated = True
 
             if isinstance(option, BaseInputOption):  # or option.bind == "null":
                 values[option.id] = value
@@ -802,10 +827,22 @@ class ConfigPanel:
         self, prevalidate: bool = False
     ) -> tuple[ConfigPanelModel, "FormModel"]:
         raw_config = self._get_partial_raw_config()
-        config = ConfigPanelModel(**raw_config)
+        cache_key = self._get_compiled_config_panel_cache_key(raw_config)
+        compiled, Settings = compiled_config_panel_cache.get(cache_key, (None, None))
+        if compiled is None:
+            compiled = ConfigPanelModel(**raw_config)
+            if len(compiled_config_panel_cache) >= COMPILED_CONFIG_PANEL_CACHE_SIZE:
+                compiled_config_panel_cache.clear()
+            compiled_config_panel_cache[cache_key] = (compiled, None)
+
+        # Values and option overrides are injected into a copy of the model
+        config = compiled.copy(deep=True)
         config, raw_settings = self._get_partial_raw_settings_and_mutate_config(config)
         config.translate()
-        Settings = build_form(config.options)
+        if Settings is None or self.config_mutated:
+            Settings = build_form(config.options)
+            if not self.config_mutated:
+                compiled_config_panel_cache[cache_key] = (compiled, Settings)
         settings = (
             Settings(**raw_settings)
             if prevalidate
@@ -821,6 +858,17 @@ class ConfigPanel:
 
         return (config, settings)
 
+    def _get_compiled_config_panel_cache_key(
+        self, raw_config: "RawConfig"
+    ) -> tuple[str, float, str, str]:
+        digest = hashlib.md5(json.dumps(raw_config, default=str).encode()).hexdigest()
+        return (
+            self.config_path,
+            os.path.getmtime(self.config_path),
+            m18n.locale,
+            digest,
+        )
+
     def _ask(
         self,
         config: ConfigPanelModel,
@@ -18,7 +18,8 @@
 # along with this program. If not, see <http://www.gnu.org/licenses/>.
 #
 
-from typing import List
+import time
+from typing import Any, Dict, List, Tuple
 
 from moulinette.utils.filesystem import read_file
 
@@ -32,6 +33,14 @@ YNH_DYNDNS_DOMAINS = ["nohost.me", "noho.st", "ynh.fr"]
 # dig() often during same yunohost operation
 external_resolvers_: List[str] = []
 
+# In-process cache of dig() answers (only used when called with cache=True)
+# keyed by the query parameters, and kept for the TTL of the answer
+dig_cache: Dict[Tuple, Tuple[float, Any]] = {}
+# How long to remember that a record doesn't exist (NXDOMAIN / no answer)
+DIG_NEGATIVE_CACHE_TTL = 60
+# Max number of queries running at the same time in dig_many()
+DIG_CONCURRENCY = 16
+
 
 def is_yunohost_dyndns_domain(domain):
     return any(
@@ -60,10 +69,20 @@ def external_resolvers():
 
 
 def dig(
-    qname, rdtype="A", timeout=5, resolvers="local", edns_size=1500, full_answers=False
+    qname,
+    rdtype="A",
+    timeout=5,
+    resolvers="local",
+    edns_size=1500,
+    full_answers=False,
+    cache=False,
 ):
     """
     Do a quick DNS request and avoid the "search" trap inside /etc/resolv.conf
+
+    With cache=True, the answer may come from (and is saved in) an in-process
+    cache honoring the TTL of the records. This is meant for the read-only
+    checks (diagnosis...) not for code waiting for a record to be updated.
     """
 
     # It's very important to do the request with a qname ended by .
@@ -79,6 +98,12 @@ def dig(
     else:
         assert isinstance(resolvers, list)
 
+    cache_key = (qname, rdtype, tuple(resolvers), edns_size, full_answers)
+    if cache:
+        expire, result = dig_cache.get(cache_key, (0, None))
+        if expire > time.time():
+            return result
+
     resolver = dns.resolver.Resolver(configure=False)
     resolver.use_edns(0, 0, edns_size)
     resolver.nameservers = resolvers
@@ -99,9 +124,43 @@ def dig(
         dns.resolver.NoAnswer,
         dns.exception.Timeout,
     ) as e:
-        return ("nok", (e.__class__.__name__, e))
+        result = ("nok", (e.__class__.__name__, e))
+        # Timeouts and failing nameservers are likely temporary, don't cache those
+        if isinstance(e, (dns.resolver.NXDOMAIN, dns.resolver.NoAnswer)):
+            ttl = DIG_NEGATIVE_CACHE_TTL
+        else:
+            ttl = 0
+    else:
+        ttl = answers.rrset.ttl
+        if not full_answers:
+            answers = [answer.to_text() for answer in answers]
+        result = ("ok", answers)
+
+    if cache and ttl > 0:
+        dig_cache[cache_key] = (time.time() + ttl, result)
+
+    return result
+
+
+def dig_many(queries, resolvers="local", concurrency=DIG_CONCURRENCY, **kwargs):
+    """
+    Run a bunch of dig() concurrently, for a list of (qname, rdtype). Identical
+    queries are only done once, and the answers are taken from / saved in the
+    dig() cache, such that they can later be fetched with dig(..., cache=True)
+
+    Returns a dict (qname, rdtype) -> what dig() returned for this query
+    """
+    from multiprocessing.pool import ThreadPool
+
+    queries = list(dict.fromkeys(queries))
+    if not queries:
+        return {}
+
+    def _dig(query):
+        qname, rdtype = query
+        return dig(qname, rdtype, resolvers=resolvers, cache=True, **kwargs)
 
-    if not full_answers:
-        answers = [answer.to_text() for answer in answers]
+    with ThreadPool(min(concurrency, len(queries))) as pool:
+        results = pool.map(_dig, queries)
 
-    return ("ok", answers)
+    return dict(zip(queries, results))
@@ -95,6 +95,7 @@ class LDAPInterface:
             self.userdn = USERDN.format(username=user)
             self._connect = lambda con: con.simple_bind_s(self.userdn, password)
 
+        self._snapshot = None
         self.connect()
 
     def connect(self):
@@ -191,6 +192,19 @@ class LDAPInterface:
 
         return result_list
 
+    def get_snapshot(self):
+        """
+        Get a (possibly cached) DirectorySnapshot of users, groups and permissions
+
+        The snapshot is dropped whenever this interface writes something, and
+        re-read if some entry was modified by someone else in the meantime.
+        """
+
+        if self._snapshot is None or self._snapshot.is_outdated(self):
+            self._snapshot = DirectorySnapshot(self)
+
+        return self._snapshot
+
     def add(self, rdn, attr_dict):
         """
         Add LDAP entry
@@ -203,6 +217,7 @@ class LDAPInterface:
             Boolean | MoulinetteError
 
         """
+        self._snapshot = None
         dn = f"{rdn},{BASEDN}"
         ldif = modlist.addModlist(attr_dict)
         for i, (k, v) in enumerate(ldif):
@@ -234,6 +249,7 @@ class LDAPInterface:
             Boolean | MoulinetteError
 
         """
+        self._snapshot = None
         dn = f"{rdn},{BASEDN}"
         try:
             self.con.delete_s(dn)
@@ -259,6 +275,7 @@ class LDAPInterface:
             Boolean | MoulinetteError
 
         """
+        self._snapshot = None
         dn = f"{rdn},{BASEDN}"
         actual_entry = self.search(rdn, attrs=None)
         ldif = modlist.modifyModlist(actual_entry[0], attr_dict, ignore_oldexistent=1)
@@ -333,3 +350,96 @@ class LDAPInterface:
             else:
                 return (attr, value)
         return None
+
+
+class DirectorySnapshot:
+    """
+    In-memory copy of the users, groups and permissions subtrees, with a few
+    indexes on top of it (uid -> user, group -> members, permission ->
+    allowed groups / inherited users, mail -> owner).
+
+    This is meant for the read-heavy code paths (user_list, user_group_list,
+    user_permission_list, permission_sync_to_user, ...) such that a single
+    command doesn't re-read the whole directory dozens of times. Entries are
+    shared between callers and should *not* be modified.
+    """
+
+    USER_ATTRS = [
+        "uid",
+        "cn",
+        "givenName",
+        "sn",
+        "mail",
+        "maildrop",
+        "mailuserquota",
+        "memberOf",
+        "loginShell",
+        "homeDirectory",
+    ]
+    GROUP_ATTRS = ["cn", "member", "permission", "mail"]
+    PERMISSION_ATTRS = [
+        "cn",
+        "groupPermission",
+        "inheritPermission",
+        "URL",
+        "additionalUrls",
+        "authHeader",
+        "label",
+        "showTile",
+        "isProtected",
+    ]
+
+    def __init__(self, ldap):
+        # Taken *before* reading, such that anything modified while we read is
+        # considered as more recent than the snapshot
+        self.timestamp = time.strftime("%Y%m%d%H%M%SZ", time.gmtime())
+
+        users = ldap.search("ou=users", "(objectclass=person)", self.USER_ATTRS)
+        groups = ldap.search(
+            "ou=groups", "(objectclass=groupOfNamesYnh)", self.GROUP_ATTRS
+        )
+        permissions = ldap.search(
+            "ou=permission", "(objectclass=permissionYnh)", self.PERMISSION_ATTRS
+        )
+
+        self.users = {user["uid"][0]: user for user in users}
+        self.groups = {group["cn"][0]: group for group in groups}
+        self.permissions = {perm["cn"][0]: perm for perm in permissions}
+
+        self.group_members = {
+            name: [_ldap_path_extract(p, "uid") for p in group.get("member", [])]
+            for name, group in self.groups.items()
+        }
+        self.permission_allowed = {
+            name: [_ldap_path_extract(p, "cn") for p in perm.get("groupPermission", [])]
+            for name, perm in self.permissions.items()
+        }
+        self.permission_inherited = {
+            name: [
+                _ldap_path_extract(p, "uid") for p in perm.get("inheritPermission", [])
+            ]
+            for name, perm in self.permissions.items()
+        }
+
+        self.mail_owner = {}
+        for name, group in self.groups.items():
+            for mail in group.get("mail", []):
+                self.mail_owner[mail] = name
+        for uid, user in self.users.items():
+            for mail in user.get("mail", []):
+                self.mail_owner[mail] = uid
+
+    def is_outdated(self, ldap):
+        """
+        Check if any user/group/permission was modified since the snapshot was
+        taken. Removals are caught too, because the memberof overlay updates
+        the entries that were pointing to the removed one.
+        """
+
+        return bool(
+            ldap.search(
+                filter="(&(|(objectclass=person)(objectclass=groupOfNamesYnh)(objectclass=permissionYnh))"
+                f"(modifyTimestamp>={self.timestamp}))",
+                attrs=["1.1"],
+            )
+        )
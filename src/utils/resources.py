@@ -19,11 +19,15 @@
 #
 
 import copy
+import fcntl
+import hashlib
 import os
 import random
+import re
 import shutil
 import subprocess
 import tempfile
+import time
 from logging import getLogger
 from typing import Any, Callable, Dict, List, Union
 
@@ -33,10 +37,21 @@ from moulinette.utils.process import check_output
 from moulinette.utils.text import random_ascii
 
 from yunohost.utils.error import YunohostError, YunohostValidationError
-from yunohost.utils.system import debian_version, debian_version_id, system_arch
+from yunohost.utils.system import (
+    binary_to_human,
+    debian_version,
+    debian_version_id,
+    system_arch,
+)
 
 logger = getLogger("yunohost.utils.resources")
 
+# Assets prefetched by SourcesResource, shared between apps and keyed by sha256
+SOURCES_DOWNLOAD_CACHE = "/var/cache/yunohost/download_cache"
+SOURCES_DOWNLOAD_CACHE_MAX_AGE = 24 * 3600
+SOURCES_DOWNLOAD_CACHE_MAX_SIZE = 1024 * 1024 * 1024
+SOURCES_PREFETCH_CONCURRENCY = 4
+
 
 class AppResourceManager:
     def __init__(self, app: str, current: Dict, wanted: Dict, workdir=None):
@@ -442,6 +457,7 @@ class SourcesResource(AppResource):
 
     ### Provision/Update
     - For elements with `prefetch = true`, will download the asset (for the appropriate architecture) and store them in `/var/cache/yunohost/download/$app/$source_id`, to be later picked up by `ynh_setup_source`. (NB: this only happens during install and upgrade, not restore)
+    - Assets are downloaded concurrently, and kept for a while in a cache shared by all apps, indexed by their sha256. Hence an asset used by several apps or instances is only downloaded once.
 
     ### Deprovision
     - Nothing (just cleanup the cache)
@@ -474,6 +490,7 @@ class SourcesResource(AppResource):
         if context.get("action") == "restore":
             return
 
+        to_prefetch = []
         for source_id, infos in self.sources.items():
             if not infos["prefetch"]:
                 continue
@@ -486,7 +503,9 @@ class SourcesResource(AppResource):
                     and isinstance(infos[arch].get("url"), str)
                     and isinstance(infos[arch].get("sha256"), str)
                 ):
-                    self.prefetch(source_id, infos[arch]["url"], infos[arch]["sha256"])
+                    to_prefetch.append(
+                        (source_id, infos[arch]["url"], infos[arch]["sha256"])
+                    )
                 else:
                     raise YunohostError(
                         f"In resources.sources: it looks like you forgot to define url/sha256 or {arch}.url/{arch}.sha256",
@@ -498,51 +517,132 @@ class SourcesResource(AppResource):
                         f"In resources.sources: it looks like the sha256 is missing for {source_id}",
                         raw_msg=True,
                     )
-                self.prefetch(source_id, infos["url"], infos["sha256"])
+                to_prefetch.append((source_id, infos["url"], infos["sha256"]))
+
+        if not to_prefetch:
+            return
+
+        from multiprocessing.pool import ThreadPool
+
+        with ThreadPool(SOURCES_PREFETCH_CONCURRENCY) as pool:
+            pool.starmap(self.prefetch, to_prefetch)
+
+        _prune_sources_download_cache()
 
     def prefetch(self, source_id, url, expected_sha256):
         logger.debug(f"Prefetching asset {source_id}: {url} ...")
 
-        if not os.path.isdir(f"/var/cache/yunohost/download/{self.app}/"):
-            mkdir(f"/var/cache/yunohost/download/{self.app}/", parents=True)
         filename = f"/var/cache/yunohost/download/{self.app}/{source_id}"
+        # N.B. : source_id may contain slashes
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
 
-        # NB: we use wget and not requests.get() because we want to output to a file (ie avoid ending up with the full archive in RAM)
-        # AND the nice --tries, --no-dns-cache, --timeout options ...
-        p = subprocess.Popen(
-            [
-                "/usr/bin/wget",
-                "--tries=3",
-                "--no-dns-cache",
-                "--timeout=900",
-                "--no-verbose",
-                "--output-document=" + filename,
-                url,
-            ],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.STDOUT,
-        )
-        out, _ = p.communicate()
-        returncode = p.returncode
-        if returncode != 0:
-            if os.path.exists(filename):
-                rm(filename)
+        expected_sha256 = expected_sha256.lower()
+        if not re.fullmatch(r"[0-9a-f]{64}", expected_sha256):
             raise YunohostError(
-                "app_failed_to_download_asset",
-                source_id=source_id,
-                url=url,
-                app=self.app,
-                out=out.decode(),
+                f"In resources.sources: {expected_sha256} doesn't look like a sha256sum for {source_id}",
+                raw_msg=True,
             )
 
-        assert os.path.exists(
-            filename
-        ), f"For some reason, wget worked but {filename} doesnt exists?"
+        os.makedirs(SOURCES_DOWNLOAD_CACHE, mode=0o700, exist_ok=True)
+        cached = f"{SOURCES_DOWNLOAD_CACHE}/{expected_sha256}"
 
-        computed_sha256 = check_output(f"sha256sum {filename}").split()[0]
+        if os.path.exists(cached):
+            logger.debug(f"Asset {source_id} was already downloaded")
+            os.utime(cached)
+        else:
+            # The partial download is locked such that the same asset isn't
+            # downloaded twice at the same time (by another app, or instance)
+            with open(f"{cached}.part", "ab") as part:
+                fcntl.flock(part, fcntl.LOCK_EX)
+                if not os.path.exists(cached):
+                    self._download(source_id, url, expected_sha256, part)
+                    os.rename(f"{cached}.part", cached)
+                else:
+                    # Someone else completed the download while we were
+                    # waiting for the lock, so the .part we opened is a new,
+                    # empty one (unless yet another process already got it)
+                    logger.debug(f"Asset {source_id} was already downloaded")
+                    os.utime(cached)
+                    ours = os.fstat(part.fileno())
+                    try:
+                        current = os.stat(f"{cached}.part")
+                        if os.path.samestat(current, ours) and not ours.st_size:
+                            os.remove(f"{cached}.part")
+                    except FileNotFoundError:
+                        pass
+
+        # N.B. : not a hardlink, because the helpers may move the file to
+        # the install dir, and then chown it or modify it
+        subprocess.run(
+            ["cp", "--reflink=auto", cached, filename],
+            check=True,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+
+    def _download(self, source_id, url, expected_sha256, part):
+        """
+        Download url into the (locked, opened in append mode) part file,
+        resuming a previous partial download if any, while computing the
+        sha256 of the content.
+        """
+
+        import requests
+
+        sha256 = hashlib.sha256()
+
+        def rewind():
+            part.seek(0)
+            part.truncate()
+            return hashlib.sha256()
+
+        for attempt in range(3):
+            # Resume where the previous attempt (or process) stopped, which
+            # implies hashing the part that was already downloaded
+            part.flush()
+            offset = os.fstat(part.fileno()).st_size
+            sha256 = hashlib.sha256()
+            if offset:
+                with open(part.name, "rb") as f:
+                    for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                        sha256.update(chunk)
+
+            headers = {"Range": f"bytes={offset}-"} if offset else {}
+            try:
+                with requests.get(
+                    url, headers=headers, stream=True, timeout=(30, 900)
+                ) as r:
+                    if r.status_code == 416 and offset:
+                        # Nothing left to download (or the part is bogus)
+                        if sha256.hexdigest() == expected_sha256:
+                            return
+                        sha256 = rewind()
+                        continue
+                    r.raise_for_status()
+                    if offset and r.status_code != 206:
+                        # The server doesn't support resuming
+                        sha256 = rewind()
+                    for chunk in r.iter_content(chunk_size=1024 * 1024):
+                        part.write(chunk)
+                        sha256.update(chunk)
+                    part.flush()
+                break
+            except Exception as e:
+                logger.debug(f"Failed to download {url} (attempt {attempt + 1}) : {e}")
+                if attempt == 2:
+                    raise YunohostError(
+                        "app_failed_to_download_asset",
+                        source_id=source_id,
+                        url=url,
+                        app=self.app,
+                        out=str(e),
+                    )
+
+        computed_sha256 = sha256.hexdigest()
         if computed_sha256 != expected_sha256:
-            size = check_output(f"du -hs {filename}").split()[0]
-            rm(filename)
+            size = binary_to_human(os.fstat(part.fileno()).st_size)
+            # Don't try to resume this one next time
+            rewind()
             raise YunohostError(
                 "app_corrupt_source",
                 source_id=source_id,
@@ -554,6 +654,36 @@ class SourcesResource(AppResource):
             )
 
 
+def _prune_sources_download_cache():
+    """
+    Remove the assets that weren't used recently, then the least recently
+    used ones until the cache fits in SOURCES_DOWNLOAD_CACHE_MAX_SIZE
+    """
+
+    now = time.time()
+    entries = []
+    for entry in os.scandir(SOURCES_DOWNLOAD_CACHE):
+        try:
+            stat = entry.stat()
+            if stat.st_mtime < now - SOURCES_DOWNLOAD_CACHE_MAX_AGE:
+                os.remove(entry.path)
+            # Partial downloads are only removed when old, as they may be resumed
+            elif not entry.name.endswith(".part"):
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        except FileNotFoundError:
+            pass
+
+    total_size = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total_size <= SOURCES_DOWNLOAD_CACHE_MAX_SIZE:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total_size -= size
+
+
 class PermissionsResource(AppResource):
     """
     Configure the SSO permissions/tiles. Typically, webapps are expected to have a 'main' permission mapped to '/', meaning that a tile pointing to the `$domain/$path` will be available in the SSO for users allowed to access that app.
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+#
+# Copyright (c) 2024 YunoHost Contributors
+#
+# This file is part of YunoHost (see https://yunohost.org)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+
+import logging
+import os
+import time
+
+logger = logging.getLogger("yunohost.utils.sessions")
+
+
+class SessionStore:
+    """
+    Server-side part of the admin and portal sessions : one empty file per
+    session id, whose mtime is the last time the session was used.
+
+    The layout is kept flat (<folder>/<session_id>) because SSOwat also checks
+    the portal session files directly. Session ids are prefixed with a hash
+    of the user, such that all the sessions of a user can be invalidated.
+
+    Checking a session only costs a stat, since the expiration is checked on
+    the session's own file. Expired files of sessions that are never used
+    again are cleaned up by a purge of the whole folder, which is done at most
+    once every 'purge_interval' seconds instead of on every request.
+    """
+
+    def __init__(self, folder, validity, purge_interval=3600):
+        self.folder = folder
+        self.validity = validity
+        self.purge_interval = purge_interval
+        self.last_purge = 0.0
+
+    def _path(self, session_id):
+        assert "/" not in session_id and not session_id.startswith(".")
+        return os.path.join(self.folder, session_id)
+
+    def _is_expired(self, mtime, now):
+        # abs() because the system clock may have changed
+        return abs(mtime - now) > self.validity
+
+    def create(self, session_id):
+        with open(self._path(session_id), "a"):
+            pass
+        os.utime(self._path(session_id))
+
+    def touch(self, session_id):
+        """
+        Check that a session exists and didn't expire, and if so, extend its
+        validity. Returns True if the session is valid.
+        """
+
+        now = time.time()
+        self.purge_expired(now=now)
+
+        path = self._path(session_id)
+        try:
+            mtime = os.stat(path).st_mtime
+        except FileNotFoundError:
+            return False
+
+        if self._is_expired(mtime, now):
+            self.delete(session_id)
+            return False
+
+        try:
+            os.utime(path, (now, now))
+        except FileNotFoundError:
+            # Deleted in the meantime (e.g. logout or invalidation)
+            return False
+        return True
+
+    def delete(self, session_id):
+        try:
+            os.remove(self._path(session_id))
+        except FileNotFoundError:
+            pass
+
+    def _entries(self):
+        try:
+            with os.scandir(self.folder) as it:
+                yield from it
+        except FileNotFoundError:
+            return
+
+    def invalidate_all_with_prefix(self, prefix):
+        for entry in self._entries():
+            if not entry.name.startswith(prefix):
+                continue
+            try:
+                os.remove(entry.path)
+            except Exception as e:
+                logger.debug(f"Failed to delete session file {entry.path} ? {e}")
+
+    def purge_expired(self, now=None, force=False):
+        now = now or time.time()
+        if not force and abs(now - self.last_purge) < self.purge_interval:
+            return
+        self.last_purge = now
+
+        for entry in self._entries():
+            try:
+                if self._is_expired(entry.stat().st_mtime, now):
+                    os.remove(entry.path)
+            except FileNotFoundError:
+                pass
+            except Exception as e:
+                logger.debug(f"Failed to delete session file {entry.path} ? {e}")
@@ -203,7 +203,7 @@ def sse_stream():
     # Check if there's any ongoing operation right now
     _, current_operation_id, _ = get_current_operation()
 
-    # Log list metadata is cached so it shouldnt be a bit deal to ask for "details" (which loads the metadata yaml for every operation)
+    # Log list is answered from the operation log index, so asking for "details" (success, started_by) is cheap
     recent_operation_history = log_list(since_days_ago=2, limit=20, with_details=True)[
         "operation"
     ]
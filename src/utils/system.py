@@ -95,6 +95,149 @@ def space_used_by_directory(dirpath, follow_symlinks=True):
     )  # FIXME : this doesnt do what the function name suggest this does ...
 
 
+def space_used_by_paths(paths, concurrency=None):
+    """
+    Return a dict with the space used by each of the given paths, as
+    `du -sb` would compute it (apparent size, symlinks not followed), but
+    without forking and in a single pass:
+
+    - paths nested in another one aren't walked again, their size is
+      accounted while walking the parent one
+    - files with several hardlinks are only counted once, and charged to
+      the first of the given paths (in the given order) containing them, like
+      `du -sb path1 path2 ...` would
+    - the outermost paths are walked in a pool of threads (os.scandir and
+      os.lstat release the GIL)
+
+    Paths which don't exist use no space.
+    """
+    import stat
+    from multiprocessing.pool import ThreadPool
+
+    normalized = {path: os.path.normpath(path) for path in paths}
+    wanted = set(normalized.values())
+    order = list(dict.fromkeys(normalized.values()))
+
+    def is_nested(path):
+        parent = os.path.dirname(path)
+        while parent != path:
+            if parent in wanted:
+                return True
+            path, parent = parent, os.path.dirname(parent)
+        return False
+
+    totals = {}
+    # Files with several hardlinks met by each walk, which are accounted once
+    # all walks are done, such that which path they are charged to doesn't
+    # depend on which thread was faster
+    hardlinked = {}
+
+    def walk(root):
+        try:
+            stack = [(root, os.lstat(root), ())]
+        except FileNotFoundError:
+            totals[root] = 0
+            return
+
+        while stack:
+            path, st, ancestors = stack.pop()
+            if path in wanted:
+                ancestors += (path,)
+                totals[path] = 0
+
+            if st.st_nlink > 1 and not stat.S_ISDIR(st.st_mode):
+                hardlinked.setdefault(root, []).append(
+                    ((st.st_dev, st.st_ino), st.st_size, ancestors)
+                )
+            else:
+                for ancestor in ancestors:
+                    totals[ancestor] += st.st_size
+
+            if not stat.S_ISDIR(st.st_mode):
+                continue
+
+            try:
+                with os.scandir(path) as it:
+                    entries = list(it)
+            except OSError as e:
+                logger.warning(f"Could not compute the size of {path} : {e}")
+                continue
+
+            for entry in entries:
+                try:
+                    stack.append(
+                        (entry.path, entry.stat(follow_symlinks=False), ancestors)
+                    )
+                except FileNotFoundError:
+                    # Deleted in the meantime
+                    pass
+
+    roots = [path for path in wanted if not is_nested(path)]
+    with ThreadPool(concurrency or min(len(roots), 8) or 1) as pool:
+        pool.map(walk, roots)
+        # Nested paths which weren't reached, i.e. behind a symlink
+        pool.map(walk, [path for path in wanted if path not in totals])
+
+    seen_inodes = set()
+    for root in sorted(hardlinked, key=order.index):
+        for inode, size, ancestors in hardlinked[root]:
+            if inode in seen_inodes:
+                continue
+            seen_inodes.add(inode)
+            for ancestor in ancestors:
+                totals[ancestor] += size
+
+    return {
+        path: totals.get(normalized_path, 0)
+        for path, normalized_path in normalized.items()
+    }
+
+
+def write_to_json_if_changed(file_path, data, sort_keys=True, indent=4):
+    """
+    Write data as json to file_path, but only if the resulting content differs
+    from what's already there (such that consumers watching the file, e.g.
+    nginx/SSOwat, don't reload it for nothing).
+
+    The file is written to a temporary file in the same directory then moved
+    into place, such that readers never see a half-written file. The mode and
+    owner of the existing file (if any) are preserved.
+
+    Returns True if the file was (re)written, False otherwise
+    """
+    import json
+    import tempfile
+
+    content = json.dumps(data, sort_keys=sort_keys, indent=indent)
+
+    try:
+        with open(file_path) as f:
+            if f.read() == content:
+                return False
+        current = os.stat(file_path)
+    except FileNotFoundError:
+        current = None
+
+    fd, tmp_path = tempfile.mkstemp(
+        dir=os.path.dirname(file_path), prefix=f".{os.path.basename(file_path)}."
+    )
+    try:
+        with os.fdopen(fd, "w") as f:
+            f.write(content)
+        if current:
+            os.chmod(tmp_path, current.st_mode & 0o7777)
+            os.chown(tmp_path, current.st_uid, current.st_gid)
+        else:
+            os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, file_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+    return True
+
+
 def human_to_binary(size: str) -> int:
     symbols = ("K", "M", "G", "T", "P", "E", "Z", "Y")
     factor = {}